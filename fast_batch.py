@@ -12,7 +12,6 @@ import subprocess
 import argparse
 import platform
 import shutil
-import pynvml
 import signal
 import queue
 import time
@@ -20,107 +19,182 @@ import json
 import sys
 import os
 
+from src.folder_watch import DEFAULT_SETTLE_SECONDS, FolderWatcher
+from src.gpu_telemetry import GpuTelemetry, NvmlProvider, SyntheticProvider
+from src.job_journal import TRANSCRIBED, JobJournal, commit_outputs, pending_job, queue_pending_jobs, recover_jobs, restore_source, scratch_folder
+from src.media_probe import MakespanReport, ProbeCache, plan_longest_first
+from src.subtitles import DEFAULT_FORMATS, convert_files, parse_formats
+from src.transcript_cache import DEFAULT_CACHE_DIR, CachingTranscriber, TranscriptCache
+from src.transcription_backends import BACKENDS, DEFAULT_BATCH_SIZE
+from src.window_batcher import CrossFileBatcher
+from src.worker_pool import TranscriptionPool
 
-def get_gpu_memory_info():
+
+# How often watch mode converts finished transcripts while it waits for new files
+WATCH_CONVERT_INTERVAL = 5.0
+# Watch mode gives up on a file after this many failed attempts
+WATCH_MAX_ATTEMPTS = 3
+
+# Files staged at once when windows from several files share inference batches,
+# enough 30 second clips to fill one batch
+BATCHED_STAGING_WORKERS = DEFAULT_BATCH_SIZE
+
+
+def open_gpu_telemetry(backend_name):
     """
-    Retrieves the total and free GPU memory information.
+    Starts background sampling of GPU memory and utilization.
 
-    This function initializes the NVIDIA Management Library (NVML), gets the memory
-    information for the first GPU device (index 0), and then shuts down NVML.
+    The stub backend needs no GPU, so it gets a synthetic device and runs on machines without an NVIDIA driver.
 
-    Returns:
-        tuple: A tuple containing:
-            - total (int): The total memory of the GPU in bytes.
-            - free (int): The free memory of the GPU in bytes.
+    Args:
+        backend_name (str): The transcription backend that will run.
 
-    Raises:
-        pynvml.NVMLError: If there is an issue with NVML initialization or querying the GPU memory info.
+    Returns:
+        GpuTelemetry: The started sampler. Close it when done.
     """
-    pynvml.nvmlInit()
-    handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-    info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-    pynvml.nvmlShutdown()
-    return info.total, info.free
+    provider = SyntheticProvider() if backend_name == "stub" else NvmlProvider()
+    return GpuTelemetry(provider).start()
 
-def process_file(file_to_process, video_folder_name):
+def process_file(job, transcribe, journal):
     """
-    Processes a video file by moving it to a processing directory, running a transcription task, 
-    and then organizing the processed files into a new directory.
+    Processes a video file by moving it to its own working directory, running a transcription task there,
+    and then renaming the directory to 'Videos/<video name>'.
 
     Args:
-        file_to_process (str): The name of the file to be processed.
-        video_folder_name (str): The name of the folder to store the processed video and related files.
+        job (dict): The journal entry of the file to be processed.
+        transcribe (callable): Takes the file and the output JSON path and returns a future for the transcript,
+                               e.g. `TranscriptionPool.submit`, `CrossFileBatcher.add_file` or `CachingTranscriber.add_file`.
+        journal (JobJournal): Records the progress of the file.
+
+    Returns:
+        bool: True if the file was transcribed.
 
     Raises:
-        Exception: If there is any issue during the file processing, it will print an error message 
-                  and attempt to reverse any file operations.
+        Exception: If there is any issue during the file processing, it will print an error message, 
+                  return the file to 'Input-Videos' and mark the job as failed so the next run retries it.
     """
+    file_to_process = job['source']
+    filenamestatic = os.path.splitext(file_to_process)[0]
+    scratch_path = scratch_folder(job)
+    journal.mark_running(job['id'], scratch_path)
     try:
-        # Move the file to the processing directory
-        shutil.move(os.path.join('Input-Videos', file_to_process), file_to_process)
+        # Each job works in its own directory, so files with similar names never mix
+        os.makedirs(scratch_path, exist_ok=True)
+        source_path = os.path.join(scratch_path, file_to_process)
+        shutil.move(os.path.join('Input-Videos', file_to_process), source_path)
         print(f"Processing file: {file_to_process}")
-        filenamestatic = os.path.splitext(file_to_process)[0]
-        print(filenamestatic)
         
-        subprocess.run(f'insanely-fast-whisper --file-name "{file_to_process}" --model-name openai/whisper-large-v3 --task transcribe --language en --device-id 0 --transcript-path "{filenamestatic}".json', shell=True)
+        transcribe(source_path, os.path.join(scratch_path, f"{filenamestatic}.json")).result()
         
-        # Create a new directory for the processed video and move all related files
-        new_folder_path = os.path.join('Videos', video_folder_name)
-        os.mkdir(new_folder_path)
-
-        # Move the original file and all related output files
-        shutil.move(file_to_process, new_folder_path)
-        output_file_base = os.path.splitext(file_to_process)[0]
-        for filename in os.listdir('.'):
-            if filename.startswith(output_file_base):
-                shutil.move(filename, new_folder_path)
+        # Publish the video and its outputs under the video's name in one rename
+        new_folder_path = commit_outputs(scratch_path, filenamestatic)
+        journal.mark_transcribed(job['id'], new_folder_path, os.path.join(new_folder_path, f"{filenamestatic}.json"))
+        return True
 
     except Exception as e:
         print(f"Processing failed with error: {e}")
-        print("Reversing the file operations...")
-        if os.path.exists(os.path.join('Videos', video_folder_name, file_to_process)):
-            shutil.move(os.path.join('Videos', video_folder_name, file_to_process), '.')
-        if os.path.exists(os.path.join('Videos', video_folder_name)):
-            shutil.rmtree(os.path.join('Videos', video_folder_name))
-        move_and_clear_videos()
-
-def worker(file_queue):
+        print("Returning the file to 'Input-Videos' so the next run retries it...")
+        restore_source(file_to_process, scratch_path)
+        journal.mark_failed(job['id'], e)
+        return False
+
+def worker(file_queue, transcribe, journal, report=None):
     """
     Worker function to process files from a queue.
 
-    Continuously retrieves files from the queue and processes them until the queue is empty.
+    Continuously retrieves files from the queue and processes them until it takes a None from the queue.
 
     Args:
-        file_queue (queue.Queue): A queue containing files to be processed. Each item in the queue
-                                  should be a tuple where the first element is the file name and 
-                                  the second element is an identifier used to create a folder name.
-    
-    Raises:
-        queue.Empty: If the queue is empty when attempting to retrieve a file, the function breaks the loop.
+        file_queue (queue.Queue): A queue containing the journal entries of the files to be processed.
+        transcribe (callable): Starts the transcription of one file, see `process_file`.
+        journal (JobJournal): Records the progress of every file.
+        report (MakespanReport, optional): Told how long each transcribed file took.
     """
-    while not file_queue.empty():
-        try:
-            file_to_process = file_queue.get_nowait()
-        except queue.Empty:
+    while True:
+        job = file_queue.get()
+        if job is None:
             break
 
-        video_folder_name = f'Video - {file_to_process[1]}'
-        process_file(file_to_process[0], video_folder_name)
+        started = time.time()
+        if process_file(job, transcribe, journal) and report:
+            report.job_done(job.get('duration'), time.time() - started)
         file_queue.task_done()
 
-def process_files_LMT2_batch():
+def watch_input_folder(journal, file_queue, settle_seconds=DEFAULT_SETTLE_SECONDS, formats=DEFAULT_FORMATS):
+    """
+    Feeds files dropped into 'Input-Videos' to the running workers until interrupted with Ctrl+C.
+
+    A file is queued once it has stopped growing for `settle_seconds`, so partial copies are never picked up.
+    Transcripts are converted to subtitles as their jobs finish. A file that keeps failing is given up on after
+    `WATCH_MAX_ATTEMPTS` tries instead of being retried forever.
+
+    Args:
+        journal (JobJournal): Records the progress of every file.
+        file_queue (queue.Queue): The queue the workers take jobs from.
+        settle_seconds (float): How long a file must stay unchanged before it is queued.
+        formats (tuple[str]): The subtitle formats to write for every transcript.
+    """
+    recover_jobs(journal)
+    with FolderWatcher('Input-Videos', settle_seconds) as watcher:
+        mode = "inotify" if watcher.uses_inotify else f"polling every {watcher.poll_interval:.0f}s"
+        print(f"Watching 'Input-Videos' for new files ({mode}). Press Ctrl+C to stop.")
+        try:
+            while True:
+                for file_to_process in watcher.poll(timeout=WATCH_CONVERT_INTERVAL):
+                    job = pending_job(journal, file_to_process, WATCH_MAX_ATTEMPTS)
+                    if job is not None:
+                        file_queue.put(job)
+                process_json_files_in_videos(journal, formats)
+        except KeyboardInterrupt:
+            print("Stopping watch mode. Files not yet started stay in 'Input-Videos' for the next run.")
+
+    # Drop the jobs no worker has taken yet
+    while True:
+        try:
+            file_queue.get_nowait()
+        except queue.Empty:
+            break
+
+def process_files_LMT2_batch(journal, backend_name='transformers', use_cache=True, vad=False, watch=False, settle_seconds=DEFAULT_SETTLE_SECONDS, formats=DEFAULT_FORMATS):
     """
     Processes video files in batches, utilizing available GPU memory to determine the number of concurrent processes.
 
     This function retrieves the total and free GPU memory, calculates the maximum number of processes that can 
     run concurrently based on the VRAM per process, and then processes files from the 'Input-Videos' directory 
-    using a thread pool executor.
+    using a thread pool executor. The model is loaded once per pool worker and reused for every file.
+
+    When the backend can transcribe decoded audio, several files are staged at once and their 30 second
+    windows are packed into shared inference batches, so short clips no longer leave the batch mostly empty.
+
+    Transcripts are looked up in the content-addressed cache first, so a file that has been transcribed
+    before (under any name) skips decoding and the GPU.
+
+    Every input is probed for its duration first (cached across runs) and files are dispatched longest
+    first. The predicted and actual makespan are printed at the end.
+
+    Progress is recorded in the job journal, so files finished by an earlier run are skipped and
+    failed or interrupted files are retried.
+
+    In watch mode the function does not return when 'Input-Videos' is empty. It keeps the loaded model
+    and feeds it every new file that arrives, until interrupted with Ctrl+C.
+
+    Args:
+        journal (JobJournal): Records the progress of every file.
+        backend_name (str): The transcription backend to use ("transformers", "cli" or "stub").
+        use_cache (bool): If False, bypass the transcript cache and transcribe every file.
+        vad (bool): If True, strip silence and music on the CPU before inference. Needs a backend that
+                    accepts decoded audio.
+        watch (bool): If True, keep running and process files as they arrive. See `watch_input_folder`.
+        settle_seconds (float): In watch mode, how long a new file must stop growing before it is processed.
+        formats (tuple[str]): In watch mode, the subtitle formats written as transcripts finish.
 
     Raises:
         Exception: If there is an issue with retrieving GPU memory info or processing files, it will print an error message.
     """
 
-    total_memory, free_memory = get_gpu_memory_info()
+    with open_gpu_telemetry(backend_name) as telemetry:
+        print(telemetry.summary())
+        total_memory, free_memory = telemetry.memory_info(0)
 
     minimum_mem_ofset = 8 * 1024**3
 
@@ -131,194 +205,113 @@ def process_files_LMT2_batch():
         if max_processes > 1:
             max_processes = 1
 
-        input_dir = 'Input-Videos'
-        files_to_process = os.listdir(input_dir)
-        num_files = len(files_to_process)
-
         file_queue = queue.Queue()
-        for i, file_to_process in enumerate(files_to_process, 1):
-            file_queue.put((file_to_process, i))
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_processes) as executor:
-            futures = [executor.submit(worker, file_queue) for _ in range(max_processes)]
-            concurrent.futures.wait(futures)
-
-
-def cleanup_filenames():
+        report = None
+
+        with TranscriptionPool(backend_name, device_ids=[0], workers_per_device=max_processes) as pool:
+            if BACKENDS[backend_name].supports_windows:
+                batcher = CrossFileBatcher(pool, vad=vad)
+                transcribe, staging_workers = batcher.add_file, BATCHED_STAGING_WORKERS
+            else:
+                if vad:
+                    print(f"The '{backend_name}' backend transcribes whole files, so the VAD pre-pass is skipped.")
+                batcher = None
+                transcribe, staging_workers = pool.submit, max_processes
+
+            caching = None
+            if use_cache:
+                caching = CachingTranscriber(TranscriptCache(DEFAULT_CACHE_DIR), pool, batcher)
+                transcribe = caching.add_file
+
+            if not watch:
+                # Start the longest files first, so no long file is left running alone at the end
+                probe_cache = ProbeCache()
+                jobs = queue_pending_jobs(journal)
+                jobs, durations = plan_longest_first(jobs, [os.path.join('Input-Videos', job['source']) for job in jobs], probe_cache)
+                for job, duration in zip(jobs, durations):
+                    job['duration'] = duration
+                    file_queue.put(job)
+                report = MakespanReport(durations, staging_workers, probe_cache.get_speed(backend_name))
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=staging_workers) as executor:
+                futures = [executor.submit(worker, file_queue, transcribe, journal, report) for _ in range(staging_workers)]
+                if watch:
+                    watch_input_folder(journal, file_queue, settle_seconds, formats)
+                # One stop marker per worker, behind the queued files
+                for _ in futures:
+                    file_queue.put(None)
+                concurrent.futures.wait(futures)
+
+            if batcher:
+                batcher.close()
+
+            if report:
+                report.finish()
+                # Cache hits finish instantly and would overstate the speed of the model
+                if report.speed and not (caching and caching.hits):
+                    probe_cache.put_speed(backend_name, report.speed)
+                probe_cache.close()
+
+
+def process_json_files_in_videos(journal, formats=DEFAULT_FORMATS, verbose=False):
     """
-    Renames subdirectories in the 'Videos' folder based on the largest file within each subdirectory.
+    Converts the transcript of every transcribed job in the journal to subtitle files.
 
-    This function iterates over all subdirectories in the 'Videos' folder, finds the largest file in each
-    subdirectory, and renames the subdirectory to match the name (without extension) of the largest file.
-
-    Raises:
-        Exception: If there is any issue with reading directories or renaming files, an exception is raised.
-    """
-    videos_folder = "./Videos"
-
-    for subdir in os.listdir(videos_folder):
-        subdir_path = os.path.join(videos_folder, subdir)
-        if os.path.isdir(subdir_path):
-            files = os.listdir(subdir_path)
-            if files:
-                largest_file = max(files, key=lambda f: os.path.getsize(os.path.join(subdir_path, f)))
-                new_name = os.path.splitext(largest_file)[0]
-                os.rename(subdir_path, os.path.join(videos_folder, new_name))
-
-def move_and_clear_videos():
-    """
-    Moves all .mp4 files from the current directory to the 'Input-Videos' directory and clears specified file types 
-    and the files within the 'Videos' directory.
-
-    This function performs the following steps:
-    1. Creates the 'Input-Videos' directory if it does not exist.
-    2. Moves all .mp4 files from the current directory to the 'Input-Videos' directory.
-    3. Removes specified file types from the current directory.
-    4. Clears all files within the 'Videos' directory.
-
-    Raises:
-        Exception: If there is any issue with file operations, an exception will be raised.
-    """
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    target_directory = os.path.join(current_directory, 'Input-Videos')
-    extensions_to_remove = ['.json', '.srt', '.tsv', '.txt', '.vtt']
-
-    # Create 'Input-Videos' directory if it doesn't exist
-    if not os.path.exists(target_directory):
-        os.makedirs(target_directory)
-
-    # Find and move all .mp4 files
-    for root, dirs, files in os.walk(current_directory):
-        for file in files:
-            if file.endswith('.mp4'):
-                source_path = os.path.join(root, file)
-                destination_path = os.path.join(target_directory, file)
-                print(f"Moving {source_path} to {destination_path}")
-                shutil.move(source_path, destination_path)
-        
-        # Only process the top directory (current directory)
-        break
-
-    # Remove specified files in the current directory
-    for file in os.listdir(current_directory):
-        if any(file.endswith(ext) for ext in extensions_to_remove):
-            file_path = os.path.join(current_directory, file)
-            print(f"Removing file {file_path}")
-            os.remove(file_path)
-
-    # Clear the files within the 'Videos' directory
-    videos_directory = os.path.join(current_directory, 'Videos')
-    if os.path.exists(videos_directory):
-        for root, dirs, files in os.walk(videos_directory, topdown=False):
-            for file in files:
-                file_path = os.path.join(root, file)
-                print(f"Removing file {file_path}")
-                os.remove(file_path)
-            for dir in dirs:
-                dir_path = os.path.join(root, dir)
-                print(f"Checking Location: {dir_path}")
-
-
-def format_seconds(seconds):
-    """
-    Formats a duration given in seconds into a string with the format "HH:MM:SS,mmm".
-
-    If the input is None, returns a default string "00:00:00,000".
+    Only jobs that are transcribed but not yet converted are touched, so a resumed run does not
+    redo earlier conversions. Files are converted in parallel on a process pool. Each transcript is
+    parsed once for all formats, and the subtitle files are saved next to its JSON file.
 
     Args:
-        seconds (float or None): The duration in seconds to format. If None, returns the default time string.
-
-    Returns:
-        str: The formatted time string in the format "HH:MM:SS,mmm".
+        journal (JobJournal): Records the transcript of every job and is updated as each one is converted.
+        formats (tuple[str]): The subtitle formats to write, any of srt, vtt, tsv and txt.
+        verbose (bool, optional): If True, prints each subtitle entry during the conversion process.
     """
-    if seconds is None:
-        return "00:00:00,000"
-    whole_seconds = int(seconds)
-    milliseconds = int((seconds - whole_seconds) * 1000)
-
-    hours = whole_seconds // 3600
-    minutes = (whole_seconds % 3600) // 60
-    seconds = whole_seconds % 60
-
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-
-def convert_to_srt(input_path, output_path, verbose):
-    """
-    Formats a duration given in seconds into a string with the format "HH:MM:SS,mmm".
-
-    If the input is None, returns a default string "00:00:00,000".
-
-    Args:
-        seconds (float or None): The duration in seconds to format. If None, returns the default time string.
-
-    Returns:
-        str: The formatted time string in the format "HH:MM:SS,mmm".
-    """
-    with open(input_path, 'r') as file:
-        data = json.load(file)
-
-    rst_string = ''
-    for index, chunk in enumerate(data['chunks'], 1):
-        text = chunk['text']
-        start, end = chunk.get('timestamp', [None, None])
-        if start is None or end is None:
-            print(f"Warning: Chunk {index} has missing timestamps. Skipping...")
+    jobs = {job['json_path']: job for job in journal.jobs(TRANSCRIBED)}
+    for json_path, paths, error in convert_files(list(jobs), formats, verbose=verbose):
+        if error:
+            print(f"Failed to convert {json_path}: {error}")
+            journal.mark_failed(jobs[json_path]['id'], error)
             continue
-        start_format, end_format = format_seconds(start), format_seconds(end)
-        srt_entry = f"{index}\n{start_format} --> {end_format}\n{text}\n\n"
-
-        if verbose:
-            print(srt_entry)
-
-        rst_string += srt_entry
-
-    with open(output_path, 'w', encoding='utf-8') as file:
-        file.write(rst_string)
-
-def process_json_files_in_videos(verbose=False):
-    """
-    Processes all JSON files in the 'Videos' directory by converting them to SRT subtitle files.
-
-    This function searches through all subdirectories in the 'Videos' folder, converts each JSON file
-    to an SRT file using the `convert_to_srt` function, and saves the SRT files in the same subdirectory.
-
-    Args:
-        verbose (bool, optional): If True, prints each SRT entry during the conversion process.
-
-    Raises:
-        FileNotFoundError: If the 'Videos' directory does not exist.
-        json.JSONDecodeError: If there is an error decoding the JSON file during conversion.
-    """
-    videos_folder = "./Videos"
-    
-    for subdir in os.listdir(videos_folder):
-        subdir_path = os.path.join(videos_folder, subdir)
-        if os.path.isdir(subdir_path):
-            for file in os.listdir(subdir_path):
-                if file.endswith('.json'):
-                    json_path = os.path.join(subdir_path, file)
-                    srt_path = os.path.join(subdir_path, os.path.splitext(file)[0] + '.srt')
-                    convert_to_srt(json_path, srt_path, verbose)
-                    print(f"Converted {json_path} to {srt_path}")
+        # The journal keeps the SRT file, or the first format written when SRT was not asked for
+        journal.mark_converted(jobs[json_path]['id'], paths.get('srt') or next(iter(paths.values())))
+        print(f"Converted {json_path} to {', '.join(paths.values())}")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch transcribe every file in 'Input-Videos'.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="transformers", help="Transcription backend (default: transformers)")
+    parser.add_argument("--no-cache", action="store_true", help="Transcribe every file even if a cached transcript exists")
+    parser.add_argument("--watch", action="store_true", help="Keep running and transcribe files as they are dropped into 'Input-Videos'")
+    parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS, help="Watch mode: how long a new file must stop growing before it is picked up")
+    parser.add_argument("--vad", action="store_true", help="Skip silence and music before inference (timestamps stay on the original timeline)")
+    parser.add_argument("--formats", type=parse_formats, default=DEFAULT_FORMATS, help="Comma-separated subtitle formats to write: srt, vtt, tsv, txt (default: srt)")
+    args = parser.parse_args()
+
     # Create the directories if they don't exist
     if not os.path.exists('Videos'):
         os.mkdir('Videos')
         
+    journal = JobJournal()
     try:
         start_time = time.time()  # Record the start time
         
-        process_files_LMT2_batch()
-        cleanup_filenames()
-        process_json_files_in_videos()
+        process_files_LMT2_batch(journal, args.backend, use_cache=not args.no_cache, vad=args.vad, watch=args.watch, settle_seconds=args.settle_seconds, formats=args.formats)
+        process_json_files_in_videos(journal, args.formats)
         
         end_time = time.time()  # Record the end time
         elapsed_time = end_time - start_time  # Calculate the elapsed time
         
         print(f"Script completed in {elapsed_time:.2f} seconds")
+        print(f"Jobs by state: {journal.counts()}")
     except Exception as e:
-        move_and_clear_videos() # Basic cleanup on error
+        # Finished results are kept, and the journal lets the next run carry on from here
+        print(f"Batch run stopped with error: {e}")
+        print("Run the script again to resume.")
+    finally:
+        journal.close()
 
     # Example Useage
     # python fast_batch.py
+    # python fast_batch.py --backend cli
+    # python fast_batch.py --vad
+    # python fast_batch.py --watch
+    # python fast_batch.py --formats srt,vtt,txt
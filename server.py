@@ -4,25 +4,71 @@ import subprocess
 import json
 import time
 import re
+import uuid
 import gradio as gr
+import uvicorn
 import yt_dlp
 import threading
-from datetime import datetime, timedelta
+from datetime import datetime
+from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import FileResponse
+
+from src.enhancement import DEFAULT_ENHANCED_CACHE_DIR, DemucsSeparator, EnhancementCache, SelectiveEnhancer
+from src.job_manager import DONE, FAILED, JobManager
+from src.lifecycle import DEFAULT_LIFECYCLE_DB_PATH, LifecycleManager
+from src.media_probe import DEFAULT_PROBE_CACHE_PATH, ProbeCache, inspect_media
+from src.ranged_download import RangedDownload
+from src.repetition_filter import RepetitionDetector, write_decisions
+from src.subtitle_postprocess import postprocess
+from src.subtitles import FORMATS, iter_chunks, subtitle_paths, write_formats
+from src.transcript_cache import DEFAULT_CACHE_DIR, CachingTranscriber, TranscriptCache
+from src.transcription_backends import BACKENDS
+from src.url_cache import DEFAULT_RESULT_CACHE_PATH, ResultCache, result_key
+from src.usage_store import DEFAULT_USAGE_DB_PATH, UsageStore
+from src.window_batcher import CrossFileBatcher
+from src.worker_pool import TranscriptionPool
 
 # Define global variables and paths
 TEMP_DIR = "temp"
 OUTPUT_DIR = "output"
-PROCESSED_URLS_FILE = "processed_urls.json"
+RESULT_CACHE_FILE = DEFAULT_RESULT_CACHE_PATH
+PROBE_CACHE_FILE = DEFAULT_PROBE_CACHE_PATH
+ARTIFACT_DB_FILE = DEFAULT_LIFECYCLE_DB_PATH  # Size and last access of every file in temp/ and output/
+RESULT_CACHE_TTL_DAYS = 30  # A URL is transcribed again once its cached result is this old
+RESULT_CACHE_MAX_GB = 20  # Disk budget of the output files behind cached URL results
 LOG_FILE = "transcription.log"
 WHITELIST_FILE = "whitelist.json"
-USER_ACTIVITY_FILE = "user_activity.json"
-
-# Load processed URLs
-if os.path.exists(PROCESSED_URLS_FILE):
-    with open(PROCESSED_URLS_FILE, "r") as f:
-        processed_urls = json.load(f)
-else:
-    processed_urls = {}
+USER_ACTIVITY_FILE = "user_activity.json"  # Old usage file, imported into USAGE_DB_FILE once
+USAGE_DB_FILE = DEFAULT_USAGE_DB_PATH
+TRANSCRIPT_CACHE_DIR = DEFAULT_CACHE_DIR
+ENHANCED_CACHE_DIR = DEFAULT_ENHANCED_CACHE_DIR  # Demucs output, reused across jobs and force_reprocess
+TRANSCRIPTION_BACKEND = "transformers"  # "transformers" keeps the model loaded, "cli" runs insanely-fast-whisper per file
+TRANSCRIPTION_WORKERS = 1
+VAD_PREPASS = False  # Strip silence/music before inference; needs a backend that accepts decoded audio
+REPETITION_FILTER = True  # Collapse phrases Whisper loops over several lines; removed lines are listed in <name>.repetitions.json
+SUBTITLE_FORMATS = ("srt",)  # Any of "srt", "vtt", "tsv", "txt"; written side by side in output/ from one pass
+JOB_DOWNLOAD_WORKERS = 4  # Concurrent downloads of queued jobs
+JOB_DECODE_WORKERS = 2  # Concurrent jobs in ffmpeg/Demucs decoding, hashing and probing
+JOB_INFERENCE_WORKERS = 2  # Concurrent jobs handing windows to the GPU batcher and writing subtitles
+PREFETCH_DEPTH = 3  # Jobs downloaded and decoded ahead of the ones on the GPU
+TEMP_DISK_BUDGET_GB = 10  # No further job is prefetched while temp/ holds more than this; least recently used files beyond it are deleted
+OUTPUT_DISK_BUDGET_GB = 25  # Least recently used outputs beyond this are deleted
+ORPHAN_TEMP_HOURS = 6  # Files in temp/ not used by any job and untouched this long are left over from failed jobs
+DISK_GC_INTERVAL_SECONDS = 300  # Time between background cleanup passes
+AUDIO_ONLY_DOWNLOAD = True  # Fetch only the audio stream and decode it while it downloads
+DOWNLOAD_PARTS_IN_FLIGHT = 4  # Concurrent range requests (or DASH/HLS fragments) per download
+
+# Probe results keyed on content hash, so a file seen before under any name is not probed again
+media_cache = ProbeCache(PROBE_CACHE_FILE)
+
+# Background cleanup of temp/ and output/; files of running jobs are pinned so they are never removed
+lifecycle = LifecycleManager(
+    {TEMP_DIR: int(TEMP_DISK_BUDGET_GB * 1024**3), OUTPUT_DIR: int(OUTPUT_DISK_BUDGET_GB * 1024**3)}, ARTIFACT_DB_FILE,
+    scratch_dirs=[TEMP_DIR], orphan_seconds=ORPHAN_TEMP_HOURS * 3600, interval_seconds=DISK_GC_INTERVAL_SECONDS
+).start()
+
+# Results of earlier URLs, keyed on the canonical video ID and processing options
+result_cache = ResultCache(RESULT_CACHE_FILE, RESULT_CACHE_TTL_DAYS * 24 * 3600, int(RESULT_CACHE_MAX_GB * 1024**3))
 
 # Load whitelist
 if os.path.exists(WHITELIST_FILE):
@@ -31,22 +77,70 @@ if os.path.exists(WHITELIST_FILE):
 else:
     whitelist = {}
 
-# Load user activity
-if os.path.exists(USER_ACTIVITY_FILE):
-    with open(USER_ACTIVITY_FILE, "r") as f:
-        user_activity = json.load(f)
-else:
-    user_activity = {}
-
-# Save processed URLs
-def save_processed_urls():
-    with open(PROCESSED_URLS_FILE, "w") as f:
-        json.dump(processed_urls, f)
-
-# Save user activity
-def save_user_activity():
-    with open(USER_ACTIVITY_FILE, "w") as f:
-        json.dump(user_activity, f)
+# Usage log with per-key totals; history from the old JSON file is carried over on first start
+usage_store = UsageStore(USAGE_DB_FILE)
+usage_store.import_json(USER_ACTIVITY_FILE)
+
+# Warm transcription worker pool, created on first use and shared by every request
+transcription_pool = None
+transcription_pool_lock = threading.Lock()
+
+def get_transcription_pool():
+    global transcription_pool
+    with transcription_pool_lock:
+        if transcription_pool is None:
+            transcription_pool = TranscriptionPool(TRANSCRIPTION_BACKEND, device_ids=[0], workers_per_device=TRANSCRIPTION_WORKERS).start()
+        return transcription_pool
+
+# Transcript cache in front of the pool; misses go through a shared window batcher when the backend
+# supports it, so windows are batched across concurrent requests
+transcriber = None
+
+def get_transcriber():
+    global transcriber
+    pool = get_transcription_pool()
+    with transcription_pool_lock:
+        if transcriber is None:
+            batcher = CrossFileBatcher(pool, vad=VAD_PREPASS) if BACKENDS[TRANSCRIPTION_BACKEND].supports_windows else None
+            transcriber = CachingTranscriber(TranscriptCache(TRANSCRIPT_CACHE_DIR), pool, batcher)
+        return transcriber
+
+# Selective Demucs enhancement; the separation model stays loaded once the first job has used it
+enhancer = None
+
+def get_enhancer():
+    global enhancer
+    with transcription_pool_lock:
+        if enhancer is None:
+            enhancer = SelectiveEnhancer(DemucsSeparator(), EnhancementCache(ENHANCED_CACHE_DIR))
+        return enhancer
+
+# Background job manager, so request handlers only queue work and return a job ID
+job_manager = None
+
+def get_job_manager():
+    global job_manager
+    with transcription_pool_lock:
+        if job_manager is None:
+            job_manager = JobManager(
+                {"download": JOB_DOWNLOAD_WORKERS, "decode": JOB_DECODE_WORKERS, "inference": JOB_INFERENCE_WORKERS},
+                prefetch_depth=PREFETCH_DEPTH, prefetch_until="inference", admit=temp_disk_available
+            )
+        return job_manager
+
+# Total size of the files under a directory
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Removed while walking
+    return total
+
+def temp_disk_available():
+    return directory_size(TEMP_DIR) < TEMP_DISK_BUDGET_GB * 1024**3
 
 # Check if ffmpeg is installed
 def check_ffmpeg():
@@ -59,165 +153,100 @@ def check_ffmpeg():
 def sanitize_filename(filename):
     return re.sub(r'[^\w\s-]', '', filename)
 
+# Temp and output files are named per job, so two videos with the same title never share a file
+def job_file_name(title, tag, ext):
+    return f"{sanitize_filename(title)} [{tag}].{sanitize_filename(ext)}"
+
 # Function to download video using yt-dlp
-def download_video(url, progress_callback=None):
+def download_video(url, tag, progress_callback=None, audio_only=False):
     ydl_opts = {
-        'outtmpl': os.path.join(TEMP_DIR, '%(title)s.%(ext)s'),
-        'format': 'bestvideo[height<=144]+bestaudio/best',  # lowest video quality and best audio quality
+        # Tagged from the start, so jobs for two videos with the same title never download to the same path
+        'outtmpl': os.path.join(TEMP_DIR, f'%(title)s [{tag}].%(ext)s'),
+        # lowest video quality and best audio quality, or the audio stream alone
+        'format': 'bestaudio/best' if audio_only else 'bestvideo[height<=144]+bestaudio/best',
+        'concurrent_fragment_downloads': DOWNLOAD_PARTS_IN_FLIGHT,  # DASH/HLS fragments
         'progress_hooks': [progress_callback] if progress_callback else []
     }
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         info = ydl.extract_info(url, download=True)
-        sanitized_title = sanitize_filename(info['title'])
-        new_file_path = os.path.join(TEMP_DIR, f"{sanitized_title}.{info['ext']}")
+        new_file_path = os.path.join(TEMP_DIR, job_file_name(info['title'], tag, info['ext']))
         os.rename(ydl.prepare_filename(info), new_file_path)
         return new_file_path, info['duration']
 
-# Function to convert video to audio
-def convert_video_to_audio(video_path, audio_format='wav'):
-    audio_path = os.path.splitext(video_path)[0] + f'.{audio_format}'
-    if not os.path.exists(audio_path):
-        try:
-            subprocess.run(
-                ["ffmpeg", "-i", video_path, "-vn", "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "2", audio_path],
-                check=True
-            )
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"ffmpeg failed to convert video to audio: {e}")
-    return audio_path
-
-# Function to enhance input quality using Demucs
-def enhance_input_quality(video_path):
-    output_dir = os.path.join(TEMP_DIR, "htdemucs")
-    base_name = os.path.splitext(os.path.basename(video_path))[0]
-    try:
-        subprocess.run(
-            ["demucs", video_path, "-o", output_dir],
-            check=True
-        )
-        enhanced_audio_dir = os.path.join(output_dir, "htdemucs", base_name)
-        enhanced_audio_path = os.path.join(enhanced_audio_dir, "vocals.wav")
-        if os.path.exists(enhanced_audio_path):
-            return enhanced_audio_path, enhanced_audio_dir
-        else:
-            raise RuntimeError(f"Enhanced audio file not found at path: {enhanced_audio_path}")
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Demucs failed to enhance audio quality: {e}")
-
-# Function to process the video and generate transcription
-def process_video(file_path, force_reprocess=False, enhance_input=False, progress_callback=None):
+# Start an audio-only download that can be decoded while it runs
+def download_audio(url, tag, progress_callback=None):
+    """
+    Returns (path, duration, download). `download` is a running RangedDownload whose bytes can be piped into
+    the decoder, or None when the stream is not plain HTTP and yt-dlp has already fetched the whole file.
+    """
+    with yt_dlp.YoutubeDL({'format': 'bestaudio/best', 'quiet': True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+        # Segmented (e.g. HLS) formats: yt-dlp fetches the fragments concurrently
+        video_path, duration = download_video(url, tag, progress_callback, audio_only=True)
+        return video_path, duration, None
+    audio_path = os.path.join(TEMP_DIR, job_file_name(info['title'], tag, info['ext']))
+    download = RangedDownload(info['url'], audio_path, headers=info.get('http_headers'), workers=DOWNLOAD_PARTS_IN_FLIGHT).start()
+    return audio_path, info.get('duration') or 0, download
+
+# Decode step of processing a video: everything before the model runs, so it can overlap another file's inference
+def prepare_video(file_path, force_reprocess=False, enhance_input=False, source_hash=None, stream=None):
     file_name = os.path.basename(file_path)
+    # The source is named per job (see job_file_name), so its outputs never belong to another video;
+    # repeated work is reused through the URL and transcript caches instead
     file_base = os.path.splitext(file_name)[0]
     output_json = os.path.join(OUTPUT_DIR, f"{file_base}.json")
     output_srt = os.path.join(OUTPUT_DIR, f"{file_base}.srt")
-
-    if force_reprocess:
-        # Delete existing JSON and SRT files if they exist
-        if os.path.exists(output_json):
-            os.remove(output_json)
-        if os.path.exists(output_srt):
-            os.remove(output_srt)
-
-    # Check if JSON and SRT files already exist
-    if os.path.exists(output_json) and os.path.exists(output_srt):
-        return output_json, output_srt
-
-    # Convert video to audio
-    audio_path = convert_video_to_audio(file_path)
+    state = {'output_json': output_json, 'output_srt': output_srt, 'prepared': None}
 
     if enhance_input:
-        # Enhance input quality using Demucs
-        audio_path, enhanced_audio_dir = enhance_input_quality(file_path)
+        # Enhance input quality using Demucs, on the noisy or music-backed segments only; the result is
+        # cached by content hash, so a reprocessed file is not separated again
+        audio_path, segments = get_enhancer().enhance_file(file_path, source_hash)
+        if segments:
+            log_message(f"Separated {len(segments)} noisy segments ({sum(end - start for start, end in segments):.0f} s) of {file_name}")
+        # The caller's hash is of the original file, not the enhanced audio
+        source_hash = None
     else:
-        enhanced_audio_dir = None
+        audio_path = file_path
 
-    # Run the transcription command
+    # The same audio seen before under any name is served from the transcript cache; a miss is decoded
+    # once, straight to 16 kHz mono windows (no WAV on disk) that are batched for inference as they arrive
     try:
-        subprocess.run(
-            f'insanely-fast-whisper --file-name "{audio_path}" --model-name openai/whisper-large-v3 --task transcribe --language en --device-id 0 --transcript-path "{output_json}"',
-            shell=True,
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
+        state['prepared'] = get_transcriber().prepare(audio_path, use_cache=not force_reprocess, source_hash=source_hash, stream=stream)
+    except Exception as e:
         raise RuntimeError(f"Transcription failed: {e}")
+    return state
 
-    # Convert JSON to SRT with adjustments
-    convert_to_srt(output_json, output_srt)
+# Inference step of processing a video: run the model on the warm worker pool and write the subtitles
+def finish_video(state):
+    if state['prepared'] is not None:
+        try:
+            get_transcriber().complete(state['prepared'], state['output_json'])
+        except Exception as e:
+            raise RuntimeError(f"Transcription failed: {e}")
 
-    # Delete original video file to save space
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    
-    # Delete enhanced audio files to save space
-    if enhanced_audio_dir:
-        shutil.rmtree(enhanced_audio_dir, ignore_errors=True)
+        # Convert JSON to SRT (and any other SUBTITLE_FORMATS) with adjustments
+        convert_to_srt(state['output_json'], state['output_srt'])
 
-    return output_json, output_srt
+    return state['output_json'], state['output_srt']
 
 # Function to convert JSON to SRT
 def convert_to_srt(input_path, output_path):
-    def format_seconds(seconds):
-        if seconds is None:
-            return "00:00:00,000"
-        whole_seconds = int(seconds)
-        milliseconds = int((seconds - whole_seconds) * 1000)
-
-        hours = whole_seconds // 3600
-        minutes = (whole_seconds % 3600) // 60
-        seconds = whole_seconds % 60
-
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-
-    def adjust_timestamps(subtitles):
-        adjusted_subtitles = []
-        for i, subtitle in enumerate(subtitles):
-            if i > 0:
-                prev_end = datetime.strptime(subtitles[i-1]['end'], '%H:%M:%S,%f')
-                curr_start = datetime.strptime(subtitle['start'], '%H:%M:%S,%f')
-                if prev_end >= curr_start:
-                    curr_start = prev_end + timedelta(milliseconds=1)
-                    subtitle['start'] = curr_start.strftime('%H:%M:%S,%f')[:-3]
-            adjusted_subtitles.append(subtitle)
-        return adjusted_subtitles
-
-    def is_similar(a, b, threshold=0.8):
-        from difflib import SequenceMatcher
-        return SequenceMatcher(None, a, b).ratio() > threshold
-
-    def remove_duplicates(subtitles, min_time_diff=1.0):
-        unique_subtitles = []
-        for i, subtitle in enumerate(subtitles):
-            if i > 0:
-                previous_subtitle = unique_subtitles[-1]
-                prev_start = datetime.strptime(previous_subtitle['start'], '%H:%M:%S,%f')
-                curr_start = datetime.strptime(subtitle['start'], '%H:%M:%S,%f')
-                start_time_diff = (curr_start - prev_start).total_seconds()
-                if is_similar(subtitle['text'], previous_subtitle['text']) and start_time_diff < min_time_diff:
-                    continue
-            unique_subtitles.append(subtitle)
-        return unique_subtitles
-
-    with open(input_path, 'r') as file:
-        data = json.load(file)
-
-    subtitles = []
-    for index, chunk in enumerate(data['chunks'], 1):
-        text = chunk['text']
-        start, end = chunk.get('timestamp', [None, None])
-        if start is None or end is None:
-            print(f"Warning: Chunk {index} has missing timestamps. Skipping...")
-            continue
-        start_format, end_format = format_seconds(start), format_seconds(end)
-        subtitles.append({'index': index, 'start': start_format, 'end': end_format, 'text': text})
-
-    # Adjust timestamps and remove duplicates
-    subtitles = adjust_timestamps(subtitles)
-    subtitles = remove_duplicates(subtitles)
-
-    with open(output_path, 'w', encoding='utf-8') as file:
-        for subtitle in subtitles:
-            srt_entry = f"{subtitle['index']}\n{subtitle['start']} --> {subtitle['end']}\n{subtitle['text']}\n\n"
-            file.write(srt_entry)
+    # Overlaps are fixed and near-duplicates removed on integer millisecond timings; chunks are
+    # read one at a time and times are formatted only once, when each format is written
+    timeline = postprocess(iter_chunks(input_path))
+    if REPETITION_FILTER:
+        detector = RepetitionDetector()
+        timeline, decisions = detector.collapse(timeline)
+        write_decisions(decisions, os.path.splitext(output_path)[0] + ".repetitions.json", detector.settings)
+        if decisions:
+            log_message(f"Collapsed {len(decisions)} repeated subtitle lines in {output_path}")
+
+    # Every format is written from the same adjusted subtitles in one pass
+    paths = subtitle_paths(os.path.splitext(output_path)[0], SUBTITLE_FORMATS)
+    paths['srt'] = output_path
+    write_formats(timeline.chunks(), paths)
 
 # Function to count words in SRT file
 def count_words_str_file(rst_string):
@@ -234,19 +263,6 @@ def log_message(message):
 def validate_key(key):
     return key in whitelist
 
-def get_audio_metrics(audio_path):
-    try:
-        result = subprocess.run(
-            ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=bit_rate,sample_rate", "-of", "default=noprint_wrappers=1:nokey=1", audio_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        bit_rate, sample_rate = result.stdout.strip().split()
-        return int(bit_rate) // 1000, int(sample_rate)  # Convert bit_rate to kbps
-    except Exception as e:
-        raise RuntimeError(f"Failed to get audio metrics: {e}")
-
 # Function to track user activity
 def track_user_activity(key, file_name, url, force_reprocess, enhance_input, duration, output_srt, output_json, TEMP_DIR, message, video_path, total_characters, total_words, processing_time, video_format, file_size, transcription_model, audio_bitrate, audio_sample_rate):
     entry = {
@@ -271,27 +287,13 @@ def track_user_activity(key, file_name, url, force_reprocess, enhance_input, dur
         "audio_sample_rate_hz": audio_sample_rate
     }
 
-    if key not in user_activity:
-        user_activity[key] = {
-            "total_videos": 0,
-            "total_hours": 0.0,
-            "total_characters": 0,
-            "total_words": 0,
-            "entries": []
-        }
-    
-    user_activity[key]["total_videos"] += 1
-    user_activity[key]["total_hours"] += duration
-    user_activity[key]["total_characters"] += total_characters
-    user_activity[key]["total_words"] += total_words
-    user_activity[key]["entries"].append(entry)
-    
-    save_user_activity()
+    # One appended row and one totals update; earlier history is never rewritten
+    usage_store.record(key, entry)
 
 # Function to get user stats
 def get_user_stats(key):
-    if key in user_activity:
-        stats = user_activity[key]
+    stats = usage_store.stats(key)
+    if stats:
         return (
             f"Total Videos: {stats['total_videos']}\n"
             f"Total Hours: {stats['total_hours']}\n"
@@ -301,44 +303,91 @@ def get_user_stats(key):
     else:
         return "No activity found for this key."
 
-# Function to handle the Gradio interface
-def transcribe_video(key, url, uploaded_file=None, force_reprocess=False, enhance_input=False, audio_format='wav'):
-    if not validate_key(key):
-        return "Wrong Access Key - Check Key", "", ""
+# Every output file written for one transcription
+def output_files(json_file, srt_file):
+    base = os.path.splitext(srt_file)[0]
+    extra = list(subtitle_paths(base, FORMATS).values()) + [base + ".repetitions.json"]
+    return [json_file, srt_file] + [path for path in extra if path != srt_file and os.path.exists(path)]
+
+# Download step of a transcription job: fetch the video behind a URL
+def fetch_source(job, request):
+    if request['video_path'] is not None:
+        return request
+
+    def progress_hook(d):
+        if d['status'] == 'downloading':
+            job.report(f"Downloading: {d.get('_percent_str', '').strip()} - {d.get('_eta_str', '').strip()} remaining")
+
+    if not AUDIO_ONLY_DOWNLOAD:
+        video_path, duration = download_video(request['url'], request['file_tag'], progress_hook)
+        lifecycle.pin(video_path)
+        return dict(request, video_path=video_path, duration=duration, video_format=os.path.splitext(video_path)[1][1:])
+
+    # The download keeps running after this step; the decode step decodes it as the bytes arrive
+    audio_path, duration, download = download_audio(request['url'], request['file_tag'], progress_hook)
+    lifecycle.pin(audio_path)
+    return dict(request, video_path=audio_path, duration=duration, video_format=os.path.splitext(audio_path)[1][1:], download=download)
+
+# Wraps a job step so a failure releases the job's source file, which the cleanup then removes as an orphan
+def releasing_source(step):
+    def run(job, request):
+        try:
+            return step(job, request)
+        except Exception:
+            lifecycle.unpin(request['video_path'])
+            raise
+    return run
+
+# Decode step of a transcription job: hash, probe and decode the source while other jobs use the GPU
+def decode_source(job, request):
+    video_path = request['video_path']
+
+    download = request.get('download')
+    if download is not None and request['enhance_input']:
+        # Segments are scored on the whole file
+        job.report("Downloading")
+        download.wait()
+        download = None
+
+    if download is None:
+        # Hash and probe the source once; the record is reused by every later stage
+        job.report("Inspecting media")
+        info, content_hash = inspect_media(video_path, media_cache)
+        job.report("Decoding")
+        state = prepare_video(video_path, request['force_reprocess'], request['enhance_input'], source_hash=content_hash)
+    else:
+        # Decode the audio as it downloads, then inspect the finished file; the download hashed its bytes
+        # on the way, so the file is not read again to look up its probe record or to alias its transcript
+        job.report("Downloading and decoding")
+        try:
+            state = prepare_video(video_path, request['force_reprocess'], request['enhance_input'], stream=download.iter_bytes())
+            download.wait()
+        finally:
+            download.close()
+        info, content_hash = inspect_media(video_path, media_cache, download.content_hash)
+        get_transcriber().add_source(state['prepared'], content_hash)
 
-    check_ffmpeg()  # Ensure ffmpeg is installed
+    # Delete original video file to save space, as soon as the decoded audio is all that is needed
+    needs_source = state['prepared'] is not None and state['prepared']['needs_file'] and state['prepared']['audio_path'] == video_path
+    if not needs_source and os.path.exists(video_path):
+        os.remove(video_path)
 
-    if not os.path.exists(TEMP_DIR):
-        os.makedirs(TEMP_DIR)
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+    job.report("Decoded, waiting for the transcript")
+    return dict(request, download=None, state=state, media_info=info)
 
-    api_call_timestamp = datetime.now().isoformat()
-    start_time = time.time()
-    video_format = None
-    file_size = None
+# Inference step of a transcription job: transcribe and convert
+def transcribe_source(job, request):
+    video_path, info = request['video_path'], request['media_info']
+    duration = info.duration if info.duration is not None else request['duration']
 
-    if uploaded_file is not None:
-        video_path = uploaded_file
-        sanitized_file_name = sanitize_filename(os.path.basename(uploaded_file))
-        sanitized_path = os.path.join(TEMP_DIR, sanitized_file_name)
-        shutil.copy(uploaded_file, sanitized_path)
-        video_path = sanitized_path
-        duration = 0  # Unable to calculate duration for uploaded files
-        video_format = os.path.splitext(uploaded_file)[1][1:]
-        file_size = os.path.getsize(uploaded_file)
-    else:
-        # Check if the URL has been processed before
-        if url in processed_urls and not force_reprocess:
-            json_file, srt_file = processed_urls[url]
-            return "Success", json_file, srt_file
+    job.report("Transcribing")
+    json_file, srt_file = finish_video(request['state'])
 
-        video_path, duration = download_video(url)
-        video_format = os.path.splitext(video_path)[1][1:]
-        file_size = os.path.getsize(video_path)
-
-    json_file, srt_file = process_video(video_path, force_reprocess, enhance_input)
-    processing_time = time.time() - start_time
+    # Delete original video file to save space
+    if os.path.exists(video_path):
+        os.remove(video_path)
+    lifecycle.unpin(video_path)
+    lifecycle.touch(*output_files(json_file, srt_file))
 
     # Read the SRT file to get the text
     with open(srt_file, 'r', encoding='utf-8') as f:
@@ -347,21 +396,116 @@ def transcribe_video(key, url, uploaded_file=None, force_reprocess=False, enhanc
     # Calculate total characters and total words
     total_characters, total_words = count_words_str_file(srt_content)
 
-    # Get audio metrics
-    audio_path = convert_video_to_audio(video_path)
-    audio_bitrate, audio_sample_rate = get_audio_metrics(audio_path)
+    if request.get('cache_key'):
+        result_cache.put(request['cache_key'], request['url'], (json_file, srt_file), output_files(json_file, srt_file))
+        result_cache.evict()
+    return {
+        "json_file": json_file, "srt_file": srt_file, "video_path": video_path, "duration": duration,
+        "video_format": request['video_format'], "file_size": info.size,
+        "audio_bitrate": info.audio_bit_rate // 1000 if info.audio_bit_rate else None,  # Convert bit_rate to kbps
+        "audio_sample_rate": info.sample_rate,
+        "total_characters": total_characters, "total_words": total_words,
+    }
 
-    # Track user activity
+# Record the usage of every finished job, including jobs that shared another job's work
+def record_usage(job, request):
+    result = job.result
     track_user_activity(
-        key, os.path.basename(video_path), url, force_reprocess, enhance_input, duration / 3600.0,  # Convert duration to hours
-        output_srt=srt_file, output_json=json_file, TEMP_DIR=TEMP_DIR, 
-        message="Transcription successful", video_path=video_path, 
-        total_characters=total_characters, total_words=total_words,
-        processing_time=processing_time, video_format=video_format, 
-        file_size=file_size, transcription_model="openai/whisper-large-v3",
-        audio_bitrate=audio_bitrate, audio_sample_rate=audio_sample_rate
+        request['key'], os.path.basename(result['video_path']), request['url'], request['force_reprocess'], request['enhance_input'], result['duration'] / 3600.0,  # Convert duration to hours
+        output_srt=result['srt_file'], output_json=result['json_file'], TEMP_DIR=TEMP_DIR,
+        message="Transcription successful", video_path=result['video_path'],
+        total_characters=result['total_characters'], total_words=result['total_words'],
+        processing_time=time.time() - request['submitted'], video_format=result['video_format'],
+        file_size=result['file_size'], transcription_model="openai/whisper-large-v3",
+        audio_bitrate=result['audio_bitrate'], audio_sample_rate=result['audio_sample_rate']
     )
 
+# Queue a transcription and return its job ID straight away; the work runs on the job manager's pools
+def submit_transcription(key, url, uploaded_file=None, force_reprocess=False, enhance_input=False):
+    check_ffmpeg()  # Ensure ffmpeg is installed
+
+    if not os.path.exists(TEMP_DIR):
+        os.makedirs(TEMP_DIR)
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    request = {
+        'key': key, 'url': url, 'force_reprocess': force_reprocess, 'enhance_input': enhance_input,
+        'submitted': time.time(), 'file_tag': uuid.uuid4().hex[:12], 'cache_key': None, 'video_path': None, 'duration': 0, 'video_format': None, 'file_size': None,
+    }
+    if uploaded_file is not None:
+        # Copy the upload now, the web server may remove its temporary file once the request returns
+        file_base, file_ext = os.path.splitext(os.path.basename(uploaded_file))
+        sanitized_path = os.path.join(TEMP_DIR, job_file_name(file_base, request['file_tag'], file_ext[1:]))
+        shutil.copy(uploaded_file, sanitized_path)
+        lifecycle.pin(sanitized_path)
+        request.update(
+            video_path=sanitized_path,
+            duration=0,  # Probed with the rest of the media record when the job runs
+            video_format=os.path.splitext(uploaded_file)[1][1:],
+            file_size=os.path.getsize(uploaded_file),
+        )
+        source = os.path.basename(uploaded_file)
+    elif url:
+        source = url
+        request['cache_key'] = result_key(url, enhance_input=enhance_input, repetition_filter=REPETITION_FILTER)
+        cached = None if force_reprocess else result_cache.get(request['cache_key'])
+        if cached:
+            # Processed before, so the job finishes without any work
+            lifecycle.touch(*cached)
+            return get_job_manager().submit([], source=url, owner=key, result_files=tuple(cached))
+    else:
+        raise ValueError("Enter a video URL or upload a file")
+
+    # Identical URL requests share one download and one transcription; each submitter gets the result and is billed for it
+    # Download, decode and inference run on separate pools, so the GPU is not kept waiting on slow sources
+    steps = [("download", lambda job, _: fetch_source(job, request)), ("decode", releasing_source(decode_source)), ("inference", releasing_source(transcribe_source))]
+    return get_job_manager().submit(steps, flight_key=request['cache_key'], on_done=lambda job: record_usage(job, request), source=source, owner=key)
+
+# Look up a job for its owner; None if the ID is unknown or belongs to another key
+def find_job(key, job_id):
+    job = get_job_manager().get((job_id or "").strip())
+    if job is None or job.info.get('owner') != key:
+        return None
+    return job
+
+def job_result_files(job):
+    if job.result:
+        return job.result['json_file'], job.result['srt_file']
+    return job.info.get('result_files', (None, None))
+
+def job_status(job):
+    status = job.to_dict()
+    del status['owner']
+    status.pop('result_files', None)
+    status['result'] = dict(zip(("json_file", "srt_file"), job_result_files(job))) if job.state == DONE else None
+    return status
+
+# Function to handle the Gradio interface: queue the work and hand back a job ID to poll
+def transcribe_video(key, url, uploaded_file=None, force_reprocess=False, enhance_input=False, audio_format='wav'):
+    if not validate_key(key):
+        return "Wrong Access Key - Check Key", ""
+    try:
+        job_id = submit_transcription(key, url, uploaded_file, force_reprocess, enhance_input)
+    except Exception as e:
+        return f"Could not queue the job: {e}", ""
+    return "Queued - check progress in the Job Status tab", job_id
+
+# Function to show the status of a job in the Gradio interface
+def get_job_status(key, job_id):
+    if not validate_key(key):
+        return "Wrong Access Key - Check Key", None, None
+    job = find_job(key, job_id)
+    if job is None:
+        return "Unknown job ID", None, None
+    if job.state == FAILED:
+        return f"Failed during {job.stage}: {job.error}", None, None
+    if job.state != DONE:
+        return f"{job.state.capitalize()} ({job.stage}): {job.progress}", None, None
+    json_file, srt_file = job_result_files(job)
+    if not (os.path.exists(json_file) and os.path.exists(srt_file)):
+        return "The files of this job have been removed to free disk space - submit it again", None, None
+    lifecycle.touch(json_file, srt_file)
     return "Success", json_file, srt_file
 
 # Function to handle video download progress
@@ -384,23 +528,38 @@ iface = gr.Interface(
     ],
     outputs=[
         gr.Textbox(label="Status"),
-        gr.File(label="JSON File"),
-        gr.File(label="SRT File")
+        gr.Textbox(label="Job ID")
     ],
     live=False,
     title="Fast LMT2 - Fast Transcription to Caption Format (SRT)",
     description="""Version 1.1.151 - Recent Updates:
 
+    - Transcriptions now run in the background - Submit returns a Job ID, collect the files in the Job Status tab
+
     - Introduction to User Stats - Check in the Tab Above ^ Make sure you have a valid Access Key
     
     - Added Enhancements AI to improve audio quality (Experimental) - Select the checkbox to enable. Its quite slow but can improve the quality of the audio.
     
-    - Enhancements = Complete Vocal Isolation using Demucs
+    - Enhancements = Vocal Isolation using Demucs, on noisy or music-backed segments
 
     Created by S.Hibbs @
     """
 )
 
+# Gradio interface for polling a job and fetching its files
+status_interface = gr.Interface(
+    fn=get_job_status,
+    inputs=[gr.Textbox(label="Enter Access Key"), gr.Textbox(label="Enter Job ID")],
+    outputs=[
+        gr.Textbox(label="Status"),
+        gr.File(label="JSON File"),
+        gr.File(label="SRT File")
+    ],
+    live=False,
+    title="Job Status",
+    description="Enter the Job ID you got when submitting to see its progress and download the files once it has finished."
+)
+
 # Add a new Gradio interface for showing user stats
 stats_interface = gr.Interface(
     fn=get_user_stats,
@@ -411,11 +570,52 @@ stats_interface = gr.Interface(
     description="Enter your access key to view your usage statistics."
 )
 
-# Combine both interfaces
-combined_interface = gr.TabbedInterface([iface, stats_interface], ["Transcribe Video", "Show User Stats"])
+# Combine the interfaces
+combined_interface = gr.TabbedInterface([iface, status_interface, stats_interface], ["Transcribe Video", "Job Status", "Show User Stats"])
+
+# Plain HTTP/JSON API next to the UI: POST a job, then poll it and download its files
+api = FastAPI(title="Fast LMT2 Jobs")
+
+@api.post("/api/jobs")
+def api_submit_job(key: str = Body(...), url: str = Body(...), force_reprocess: bool = Body(False), enhance_input: bool = Body(False)):
+    if not validate_key(key):
+        raise HTTPException(status_code=403, detail="Wrong Access Key")
+    try:
+        job_id = submit_transcription(key, url, None, force_reprocess, enhance_input)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job_id}
+
+@api.get("/api/jobs/{job_id}")
+def api_job_status(job_id: str, key: str):
+    job = find_job(key, job_id) if validate_key(key) else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job ID")
+    return job_status(job)
+
+@api.get("/api/jobs/{job_id}/files/{kind}")
+def api_job_file(job_id: str, kind: str, key: str):
+    job = find_job(key, job_id) if validate_key(key) else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job ID")
+    if job.state != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.state}")
+    files = dict(zip(("json", "srt"), job_result_files(job)))
+    if kind not in files:
+        raise HTTPException(status_code=404, detail="File kind must be json or srt")
+    if not os.path.exists(files[kind]):
+        raise HTTPException(status_code=410, detail="File has been removed to free disk space")
+    lifecycle.touch(files[kind])
+    return FileResponse(files[kind], filename=os.path.basename(files[kind]))
+
+app = gr.mount_gradio_app(api, combined_interface, path="/")
 
 if __name__ == "__main__":
-    combined_interface.launch(server_name="0.0.0.0", server_port=8080, share=False)
+    uvicorn.run(app, host="0.0.0.0", port=8080)
+    # Example API usage:
+    #   curl -X POST localhost:8080/api/jobs -H "Content-Type: application/json" -d '{"key": "...", "url": "https://..."}'
+    #   curl "localhost:8080/api/jobs/<job_id>?key=..."
+    #   curl -OJ "localhost:8080/api/jobs/<job_id>/files/srt?key=..."
     #iface.launch(server_name="0.0.0.0", server_port=8080, share=False)
     #   Use for local testing.
     # iface.launch(share=True) 
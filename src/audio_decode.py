@@ -0,0 +1,187 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import subprocess
+import threading
+import queue
+
+import numpy as np
+
+
+SAMPLE_RATE = 16000  # Whisper works on 16 kHz mono audio
+BYTES_PER_SAMPLE = 4  # float32
+
+_END_OF_STREAM = object()
+
+
+def load_audio(file_path, sample_rate=SAMPLE_RATE):
+    """
+    Decodes any audio or video file ffmpeg can read into a mono float32 array.
+
+    Args:
+        file_path (str): The file to decode.
+        sample_rate (int): The sample rate to resample to.
+
+    Returns:
+        numpy.ndarray: The decoded samples in the range [-1.0, 1.0].
+
+    Raises:
+        RuntimeError: If ffmpeg fails to decode the file.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", file_path,
+        "-vn", "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "-"
+    ]
+    try:
+        output = subprocess.run(command, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg failed to decode audio: {e.stderr.decode(errors='ignore')}")
+    return np.frombuffer(output, np.float32)
+
+
+class StreamingDecoder:
+    """
+    Streams a file through ffmpeg as 16 kHz mono float32 blocks while it is still being decoded.
+
+    A producer thread reads ffmpeg's stdout one block at a time and puts each block on a bounded
+    queue, so the consumer (normally the inference batcher) can start on the first block while the
+    rest of the file is still being decoded. Nothing is written to disk. The queue bound keeps memory
+    flat when decoding runs ahead of inference.
+
+    The source can also be an iterable of bytes, e.g. a download that is still in progress. It is
+    then piped into ffmpeg's stdin by a feeder thread, so decoding starts with the first bytes.
+
+    Args:
+        source (str | iterable[bytes]): Any path or URL ffmpeg can read, or the file's bytes in order.
+        sample_rate (int): The sample rate to resample to.
+        block_seconds (float): The length of each yielded block. Use the inference window length.
+        max_buffered_blocks (int): How many decoded blocks may wait for the consumer before ffmpeg is throttled.
+    """
+    def __init__(self, source, sample_rate=SAMPLE_RATE, block_seconds=30, max_buffered_blocks=8):
+        self.source = source
+        self.sample_rate = sample_rate
+        self.block_bytes = int(block_seconds * sample_rate) * BYTES_PER_SAMPLE
+        self.samples_decoded = 0
+        self._blocks = queue.Queue(maxsize=max_buffered_blocks)
+        self._process = None
+        self._thread = None
+        self._feeder = None
+        self._feed_error = None
+        self._stopped = threading.Event()
+
+    @property
+    def _piped(self):
+        return not isinstance(self.source, str)
+
+    def _command(self):
+        if self._piped:
+            return [
+                "ffmpeg", "-loglevel", "error", "-threads", "0", "-i", "pipe:0",
+                "-vn", "-f", "f32le", "-ac", "1", "-ar", str(self.sample_rate), "-"
+            ]
+        return [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0", "-i", self.source,
+            "-vn", "-f", "f32le", "-ac", "1", "-ar", str(self.sample_rate), "-"
+        ]
+
+    def start(self):
+        """
+        Starts ffmpeg and the producer thread. Called automatically when iteration begins.
+        """
+        if self._thread is None:
+            stdin = subprocess.PIPE if self._piped else None
+            self._process = subprocess.Popen(self._command(), stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if self._piped:
+                self._feeder = threading.Thread(target=self._feed, daemon=True)
+                self._feeder.start()
+            self._thread = threading.Thread(target=self._produce, daemon=True)
+            self._thread.start()
+        return self
+
+    def _feed(self):
+        try:
+            for data in self.source:
+                if self._stopped.is_set():
+                    break
+                self._process.stdin.write(data)
+        except BrokenPipeError:
+            # ffmpeg exited early; its own error is reported by the producer
+            pass
+        except Exception as e:
+            self._feed_error = e
+            self._process.kill()
+        finally:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._blocks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            while True:
+                data = self._process.stdout.read(self.block_bytes)
+                if not data:
+                    break
+                # ffmpeg always writes whole samples, but a killed process can leave a partial one
+                data = data[:len(data) - len(data) % BYTES_PER_SAMPLE]
+                block = np.frombuffer(data, np.float32)
+                self.samples_decoded += len(block)
+                if not self._put(block):
+                    return
+            stderr = self._process.stderr.read().decode(errors='ignore')
+            if self._feeder:
+                self._feeder.join()
+            if self._feed_error is not None and not self._stopped.is_set():
+                self._put(self._feed_error)
+                return
+            if self._process.wait() != 0 and not self._stopped.is_set():
+                self._put(RuntimeError(f"ffmpeg failed to decode audio: {stderr}"))
+                return
+            self._put(_END_OF_STREAM)
+        except Exception as e:
+            self._put(e)
+
+    def __iter__(self):
+        self.start()
+        while True:
+            item = self._blocks.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        """
+        Stops decoding early and releases the ffmpeg process.
+        """
+        self._stopped.set()
+        if self._process and self._process.poll() is None:
+            self._process.kill()
+        if self._process:
+            self._process.wait()
+        if self._feeder:
+            self._feeder.join()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,321 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import threading
+import hashlib
+import sqlite3
+import wave
+import json
+import time
+import os
+
+import numpy as np
+
+from src.audio_decode import SAMPLE_RATE, load_audio
+from src.media_probe import file_fingerprint
+
+
+DEFAULT_ENHANCED_CACHE_DIR = "enhanced_cache"
+DEFAULT_ENHANCED_CACHE_MAX_BYTES = 5 * 1024**3  # 5 GB of enhanced WAV
+DEFAULT_DEMUCS_MODEL = "htdemucs"
+DEFAULT_SEGMENT_SECONDS = 5
+# Segments whose loud frames stand less than this far above their quiet frames are separated
+DEFAULT_SNR_THRESHOLD_DB = 20.0
+# Speech pauses between words; segments with fewer near-silent frames than this (music, crowd noise) are separated
+DEFAULT_PAUSE_THRESHOLD = 0.1
+DEFAULT_CONTEXT_SECONDS = 1.0
+CROSSFADE_SECONDS = 0.05
+FRAME_MS = 30
+
+
+def segment_noise(audio, sample_rate=SAMPLE_RATE, segment_seconds=DEFAULT_SEGMENT_SECONDS):
+    """
+    Estimates how noisy each fixed-length segment of a recording is, on the CPU.
+
+    Returns:
+        tuple: A tuple containing:
+            - snr_db (numpy.ndarray): Per segment, the 95th minus the 10th percentile of frame energy in dB.
+              Clean speech drops to the noise floor between words; music and steady noise fill the gaps.
+            - pause_ratio (numpy.ndarray): Per segment, the fraction of frames at least 25 dB below the loud frames.
+            - level_db (numpy.ndarray): Per segment, the 95th percentile of frame energy in dB.
+    """
+    frame_samples = sample_rate * FRAME_MS // 1000
+    frames_per_segment = max(1, int(segment_seconds * 1000 / FRAME_MS))
+    num_frames = len(audio) // frame_samples
+    frames = audio[:num_frames * frame_samples].reshape(num_frames, frame_samples)
+    energy_db = 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+
+    snr_db, pause_ratio, level_db = [], [], []
+    for start in range(0, num_frames, frames_per_segment):
+        segment = energy_db[start:start + frames_per_segment]
+        loud = np.percentile(segment, 95)
+        snr_db.append(loud - np.percentile(segment, 10))
+        pause_ratio.append(np.mean(segment < loud - 25.0))
+        level_db.append(loud)
+    return np.array(snr_db), np.array(pause_ratio), np.array(level_db)
+
+
+def flag_segments(audio, sample_rate=SAMPLE_RATE, segment_seconds=DEFAULT_SEGMENT_SECONDS, snr_threshold_db=DEFAULT_SNR_THRESHOLD_DB,
+                  pause_threshold=DEFAULT_PAUSE_THRESHOLD, min_level_db=-50.0):
+    """
+    Finds the parts of a recording that are worth running source separation on.
+
+    A segment is flagged when its speech does not stand clear of the background (low SNR) or when
+    it has almost no pauses (music or crowd noise under the voice). Silent segments are never flagged.
+
+    Returns:
+        list[tuple[int, int]]: Sorted, non-overlapping (start, end) sample ranges; adjacent flagged segments are merged.
+    """
+    snr_db, pause_ratio, level_db = segment_noise(audio, sample_rate, segment_seconds)
+    flagged = ((snr_db < snr_threshold_db) | (pause_ratio < pause_threshold)) & (level_db > min_level_db)
+    segment_samples = max(1, int(segment_seconds * 1000 / FRAME_MS)) * (sample_rate * FRAME_MS // 1000)
+    regions = []
+    for index in np.flatnonzero(flagged):
+        start = int(index) * segment_samples
+        # The last segment also takes the samples after the last whole frame
+        end = len(audio) if index == len(flagged) - 1 else start + segment_samples
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+class DemucsSeparator:
+    """
+    Keeps a Demucs model loaded and extracts the vocals of 16 kHz mono audio with it.
+
+    The model is loaded on first use and shared by every caller; separations run one at a time.
+    Needs the optional `demucs` package (and PyTorch).
+
+    Args:
+        model_name (str): The pretrained Demucs model.
+        device (str, optional): The torch device. Defaults to CUDA when it is available.
+    """
+    def __init__(self, model_name=DEFAULT_DEMUCS_MODEL, device=None):
+        self.model_name = model_name
+        self.device = device
+        self.model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        import torch
+        from demucs.pretrained import get_model
+
+        if self.device is None:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = get_model(self.model_name).to(self.device).eval()
+
+    def separate(self, audio, sample_rate=SAMPLE_RATE):
+        """
+        Returns the vocals of `audio`, at the same sample rate and length.
+
+        Raises:
+            RuntimeError: If Demucs is not installed or the separation fails.
+        """
+        with self._lock:
+            try:
+                import torch
+                import torchaudio.functional
+                from demucs.apply import apply_model
+
+                if self.model is None:
+                    self.load()
+                mix = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))
+                mix = torchaudio.functional.resample(mix, sample_rate, self.model.samplerate)
+                mix = mix.expand(self.model.audio_channels, -1)
+                # Normalised the same way as the demucs command line
+                mean, std = mix.mean(), mix.std() + 1e-8
+                with torch.no_grad():
+                    sources = apply_model(self.model, ((mix - mean) / std)[None], device=self.device, split=True, overlap=0.25)[0]
+                vocals = sources[self.model.sources.index("vocals")].mean(0) * std + mean
+                vocals = torchaudio.functional.resample(vocals.cpu(), self.model.samplerate, sample_rate)
+            except Exception as e:
+                raise RuntimeError(f"Demucs failed to enhance audio quality: {e}")
+        vocals = vocals.numpy().astype(np.float32)
+        if len(vocals) < len(audio):
+            vocals = np.pad(vocals, (0, len(audio) - len(vocals)))
+        return vocals[:len(audio)]
+
+
+def splice(audio, replacement, offset, start, end, crossfade_samples):
+    """
+    Replaces `audio[start:end]` in place with the same span of `replacement`, which holds `audio[offset:offset + len(replacement)]`.
+
+    Inner edges are crossfaded over `crossfade_samples`, as far as `replacement` reaches.
+    """
+    lo_limit, hi_limit = max(0, offset), min(len(audio), offset + len(replacement))
+    audio[start:end] = replacement[start - offset:end - offset]
+    for edge, rising in ((start, True), (end, False)):
+        if 0 < edge < len(audio):
+            lo, hi = max(lo_limit, edge - crossfade_samples // 2), min(hi_limit, edge + crossfade_samples // 2)
+            ramp = np.linspace(0.0, 1.0, hi - lo, dtype=np.float32)
+            weight = ramp if rising else 1.0 - ramp
+            audio[lo:hi] = weight * replacement[lo - offset:hi - offset] + (1.0 - weight) * audio[lo:hi]
+
+
+def write_wav(audio, output_path, sample_rate=SAMPLE_RATE):
+    """
+    Saves mono float32 samples as a 16-bit PCM WAV file.
+    """
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(output_path, 'wb') as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(sample_rate)
+        file.writeframes(pcm.tobytes())
+
+
+class EnhancementCache:
+    """
+    A size-bounded, least-recently-used store of enhanced audio, keyed by the source file's content and the settings.
+
+    Each entry records which segments were separated. Entries where nothing needed separating
+    have no file. The SQLite index works as in `transcript_cache.TranscriptCache`.
+
+    Args:
+        cache_dir (str): The directory holding the WAV files and the index.
+        max_bytes (int): The total WAV size to keep before the least recently used entries are evicted.
+    """
+    def __init__(self, cache_dir=DEFAULT_ENHANCED_CACHE_DIR, max_bytes=DEFAULT_ENHANCED_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, segments TEXT, size INTEGER, last_access REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_by_access ON entries (last_access)")
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def get(self, key):
+        """
+        Returns the entry for `key` as a dict with `path` (None when nothing was separated) and `segments`, or None on a miss.
+        """
+        with self._lock, self._db:
+            row = self._db.execute("SELECT segments, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = self.path(key) if row[1] else None
+            if path and not os.path.exists(path):
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= row[1]
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return {'path': path, 'segments': json.loads(row[0])}
+
+    def put(self, key, segments, audio=None):
+        """
+        Stores the enhanced audio of a source (or just its segments when `audio` is None), then evicts down to `max_bytes`.
+
+        Returns:
+            dict: The entry, as `get` returns it.
+        """
+        path = None
+        size = 0
+        if audio is not None:
+            path = self.path(key)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            write_wav(audio, temp_path)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        with self._lock, self._db:
+            previous = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, json.dumps(segments), size, time.time()))
+            self._evict_locked(keep=key)
+        return {'path': path, 'segments': segments}
+
+    def _evict_locked(self, keep):
+        while self._total_bytes > self.max_bytes:
+            row = self._db.execute("SELECT key, size FROM entries WHERE key != ? AND size > 0 ORDER BY last_access LIMIT 1", (keep,)).fetchone()
+            if row is None:
+                break
+            key, size = row
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class SelectiveEnhancer:
+    """
+    Runs source separation only on the segments of a file that need it, and remembers the result.
+
+    The file is decoded to 16 kHz mono and every segment is scored on the CPU (see `flag_segments`).
+    Only flagged segments, with a little context on either side, go through the separator, and the
+    vocals are crossfaded back into the original audio. The result is cached under the file's
+    content hash and the settings, so the same file is never separated twice, even when its
+    transcript is forced to be redone.
+
+    Args:
+        separator (DemucsSeparator): Extracts the vocals of a segment.
+        cache (EnhancementCache): Where enhanced audio is kept.
+        segment_seconds (float): The length of each scored segment.
+        snr_threshold_db (float): See `flag_segments`.
+        pause_threshold (float): See `flag_segments`.
+        context_seconds (float): Audio on either side of a flagged region that is separated with it and then dropped.
+    """
+    def __init__(self, separator, cache, segment_seconds=DEFAULT_SEGMENT_SECONDS, snr_threshold_db=DEFAULT_SNR_THRESHOLD_DB,
+                 pause_threshold=DEFAULT_PAUSE_THRESHOLD, context_seconds=DEFAULT_CONTEXT_SECONDS):
+        self.separator = separator
+        self.cache = cache
+        self.segment_seconds = segment_seconds
+        self.snr_threshold_db = snr_threshold_db
+        self.pause_threshold = pause_threshold
+        self.context_seconds = context_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, source_hash):
+        settings = f"{self.separator.model_name}|{self.segment_seconds}|{self.snr_threshold_db}|{self.pause_threshold}|{self.context_seconds}"
+        return hashlib.sha256(f"{source_hash}|{settings}".encode()).hexdigest()
+
+    def enhance_file(self, file_path, source_hash=None):
+        """
+        Returns the audio to transcribe for a file.
+
+        Args:
+            file_path (str): Any audio or video file ffmpeg can read.
+            source_hash (str, optional): The file's `file_fingerprint`, if the caller has already computed it.
+
+        Returns:
+            tuple: A tuple containing:
+                - audio_path (str): The enhanced WAV in the cache, or `file_path` itself when no segment needed separating.
+                - segments (list[tuple[float, float]]): The separated regions, in seconds.
+        """
+        key = self._key(source_hash or file_fingerprint(file_path))
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            audio = load_audio(file_path)
+            regions = flag_segments(audio, SAMPLE_RATE, self.segment_seconds, self.snr_threshold_db, self.pause_threshold)
+            segments = [(round(start / SAMPLE_RATE, 2), round(end / SAMPLE_RATE, 2)) for start, end in regions]
+            entry = self.cache.put(key, segments, self._separate(audio, regions) if regions else None)
+        return entry['path'] or file_path, [tuple(segment) for segment in entry['segments']]
+
+    def _separate(self, audio, regions):
+        enhanced = audio.copy()
+        context = int(self.context_seconds * SAMPLE_RATE)
+        crossfade = int(CROSSFADE_SECONDS * SAMPLE_RATE)
+        for start, end in regions:
+            lo, hi = max(0, start - context), min(len(audio), end + context)
+            splice(enhanced, self.separator.separate(audio[lo:hi]), lo, start, end, crossfade)
+        return enhanced
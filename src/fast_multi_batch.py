@@ -12,7 +12,6 @@ import subprocess
 import argparse
 import platform
 import shutil
-import pynvml
 import signal
 import queue
 import time
@@ -21,203 +20,171 @@ import sys
 import os
 import threading
 
-def get_gpu_memory_info():
-    pynvml.nvmlInit()
-    gpu_info = []
-    for i in range(pynvml.nvmlDeviceGetCount()):
-        handle = pynvml.nvmlDeviceGetHandleByIndex(i)
-        info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-        gpu_info.append((info.total, info.free))
-    pynvml.nvmlShutdown()
-    return gpu_info
-
-# Dictionary to keep track of jobs per GPU
-jobs_per_gpu = {i: 0 for i in range(4)}  # Adjust the range based on the number of GPUs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.gpu_scheduler import GpuSlotScheduler
+from src.gpu_telemetry import GpuTelemetry, NvmlProvider
+from src.job_journal import TRANSCRIBED, JobJournal, commit_outputs, queue_pending_jobs, restore_source, scratch_folder
+from src.media_probe import MakespanReport, ProbeCache, plan_longest_first
+from src.segmenter import SegmentedTranscriber
+from src.subtitles import DEFAULT_FORMATS, convert_files, convert_transcript, parse_formats
+from src.transcription_backends import BACKENDS
+from src.worker_pool import TranscriptionPool
+
+# Maximum number of concurrent jobs on each GPU
 max_jobs_per_gpu = 7
-gpu_lock = threading.Lock()
-
-def select_gpu():
-    with gpu_lock:
-        gpu_info = get_gpu_memory_info()
-        # Select GPU based on least jobs and enough memory
-        for gpu_id, (total_mem, free_mem) in enumerate(gpu_info):
-            if jobs_per_gpu[gpu_id] < max_jobs_per_gpu and free_mem > 11 * 1024**3:
-                jobs_per_gpu[gpu_id] += 1
-                return gpu_id
-        return None
-
-def release_gpu(gpu_id):
-    with gpu_lock:
-        jobs_per_gpu[gpu_id] -= 1
-
-def worker(file_queue):
-    while not file_queue.empty():
-        file_to_process = None
+# Free memory a GPU needs before the CLI backend starts another process on it
+cli_memory_per_job = 11 * 1024**3
+# Memory one resident model copy of a warm backend needs, with room for its batches
+warm_memory_per_worker = 11 * 1024**3
+# Subtitle formats written next to every transcript
+subtitle_formats = DEFAULT_FORMATS
+
+def warm_workers_per_device(telemetry, device_ids, max_workers=max_jobs_per_gpu, memory_per_worker=warm_memory_per_worker):
+    """
+    Returns how many resident model copies to load on each device, from the free memory of the tightest device.
+
+    Throughput comes from batching windows on each copy, so one copy per device is the floor and
+    more are only loaded when every device has the memory for them.
+    """
+    free = min(telemetry.memory_info(device_id)[1] for device_id in device_ids)
+    return max(1, min(max_workers, free // memory_per_worker))
+
+def worker(file_queue, transcribe, scheduler, journal, report):
+    while True:
         try:
-            file_to_process = file_queue.get_nowait()
+            job = file_queue.get_nowait()
         except queue.Empty:
             break
 
-        gpu_id = select_gpu()
-        if gpu_id is not None:
-            video_folder_name = f'Video - {file_to_process[1]}'
-            process_file(file_to_process[0], video_folder_name, gpu_id)
-            release_gpu(gpu_id)
-        else:
-            print("No GPU currently available with sufficient memory and job capacity.")
-            if file_to_process:
-                file_queue.put(file_to_process)  # Requeue the job
-
-        file_queue.task_done()
-
-
-def process_file(file_to_process, video_folder_name, gpu_id):
+        # Blocks until a GPU slot is released instead of requeueing the job. Without a scheduler the
+        # pool places the work itself (e.g. segments spread over every device)
+        gpu_id = scheduler.acquire() if scheduler else None
+        try:
+            started = time.time()
+            if process_file(job, gpu_id, transcribe, journal):
+                report.job_done(job['duration'], time.time() - started)
+        finally:
+            if scheduler:
+                scheduler.release(gpu_id)
+            file_queue.task_done()
+
+
+def process_file(job, gpu_id, transcribe, journal):
+    file_to_process = job['source']
+    output_file_base = os.path.splitext(file_to_process)[0]
+    scratch_path = scratch_folder(job)
+    journal.mark_running(job['id'], scratch_path)
     try:
-        # Move the file to the processing directory
-        shutil.move(os.path.join('Input-Videos', file_to_process), file_to_process)
+        # Each job works in its own directory, so concurrent jobs never touch each other's files
+        os.makedirs(scratch_path, exist_ok=True)
+        source_path = os.path.join(scratch_path, file_to_process)
+        shutil.move(os.path.join('Input-Videos', file_to_process), source_path)
         print(f"Processing file: {file_to_process}")
-        filenamestatic = os.path.splitext(file_to_process)[0]
-        print(filenamestatic)
 
-        subprocess.run(f'insanely-fast-whisper --file-name "{file_to_process}" --model-name openai/whisper-large-v3 --task transcribe --language en --device-id {gpu_id} --transcript-path "{filenamestatic}".json', shell=True)
+        json_filename = f"{output_file_base}.json"
+        transcribe(source_path, os.path.join(scratch_path, json_filename), gpu_id)
 
-        # Create a new directory for the processed video and move all related files
-        new_folder_path = os.path.join('Videos', video_folder_name)
-        os.mkdir(new_folder_path)
-        shutil.move(file_to_process, new_folder_path)
-        output_file_base = os.path.splitext(file_to_process)[0]
-        for filename in os.listdir('.'):
-            if filename.startswith(output_file_base):
-                shutil.move(filename, new_folder_path)
+        # Publish the video and its outputs under the video's name in one rename
+        new_folder_path = commit_outputs(scratch_path, output_file_base)
+        journal.mark_transcribed(job['id'], new_folder_path, os.path.join(new_folder_path, json_filename))
 
         # After moving, process JSON for this specific task
-        json_filename = f"{output_file_base}.json"
-        process_json_file(new_folder_path, json_filename)
+        subtitle_path = process_json_file(new_folder_path, json_filename)
+        journal.mark_converted(job['id'], subtitle_path)
+        return True
 
     except Exception as e:
         print({e})
-        #move_and_clear_videos()
-
-def process_files_LMT2_batch():
-    input_dir = 'Input-Videos'
-    files_to_process = os.listdir(input_dir)
+        # Only this job's working directory is removed; the next run retries it
+        restore_source(file_to_process, scratch_path)
+        journal.mark_failed(job['id'], e)
+        return False
+
+def process_files_LMT2_batch(journal, backend_name='transformers'):
+    # Files finished by an earlier run are skipped, failed and interrupted ones are retried
+    jobs = queue_pending_jobs(journal)
+    # Longest files first, so no long file is left running alone on one GPU at the end
+    probe_cache = ProbeCache()
+    jobs, durations = plan_longest_first(jobs, [os.path.join('Input-Videos', job['source']) for job in jobs], probe_cache)
     file_queue = queue.Queue()
-    for i, file_to_process in enumerate(files_to_process, 1):
-        file_queue.put((file_to_process, i))
-
-    max_workers = sum(1 for _ in range(max_jobs_per_gpu * len(jobs_per_gpu)))  # Total possible number of concurrent jobs
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(worker, file_queue) for _ in range(max_workers)]
-        concurrent.futures.wait(futures)
-
-
-def cleanup_filenames():
-    videos_folder = "./Videos"
-
-    for subdir in os.listdir(videos_folder):
-        subdir_path = os.path.join(videos_folder, subdir)
-        if os.path.isdir(subdir_path):
-            files = os.listdir(subdir_path)
-            if files:
-                largest_file = max(files, key=lambda f: os.path.getsize(os.path.join(subdir_path, f)))
-                new_name = os.path.splitext(largest_file)[0]
-                os.rename(subdir_path, os.path.join(videos_folder, new_name))
-
-"""def move_and_clear_videos():
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    target_directory = os.path.join(current_directory, 'Input-Videos')
-    videos_directory = os.path.join(current_directory, 'Videos')
-    extensions_to_remove = ['.json', '.srt', '.tsv', '.txt', '.vtt']
-
-    # Create 'Input-Videos' directory if it doesn't exist
-    if not os.path.exists(target_directory):
-        os.makedirs(target_directory)
-
-    # Find and move all .mp4 files
-    for root, dirs, files in os.walk(current_directory):
-        for file in files:
-            if file.endswith('.mp4'):
-                source_path = os.path.join(root, file)
-                destination_path = os.path.join(target_directory, file)
-                print(f"Moving {source_path} to {destination_path}")
-                shutil.move(source_path, destination_path)
-        # Only process the top directory (current directory)
-        break
-
-    # Remove specified files in the current directory
-    for file in os.listdir(current_directory):
-        if any(file.endswith(ext) for ext in extensions_to_remove):
-            file_path = os.path.join(current_directory, file)
-            print(f"Removing file {file_path}")
-            os.remove(file_path)
-
-    # Clear the 'Videos' directory
-    if os.path.exists(videos_directory):
-        for root, dirs, files in os.walk(videos_directory, topdown=False):
-            for file in files:
-                file_path = os.path.join(root, file)
-                print(f"Removing file {file_path}")
-                os.remove(file_path)
-            for dir in dirs:
-                dir_path = os.path.join(root, dir)
-                print(f"Removing directory {dir_path}")
-                os.rmdir(dir_path)
-        #os.rmdir(videos_directory)  # Remove the 'Videos' directory itself"""
-
-def format_seconds(seconds):
-    if seconds is None:
-        return "00:00:00,000"
-    whole_seconds = int(seconds)
-    milliseconds = int((seconds - whole_seconds) * 1000)
-
-    hours = whole_seconds // 3600
-    minutes = (whole_seconds % 3600) // 60
-    seconds = whole_seconds % 60
-
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-
-def convert_to_srt(input_path, output_path, verbose):
-    with open(input_path, 'r') as file:
-        data = json.load(file)
-
-    rst_string = ''
-    for index, chunk in enumerate(data['chunks'], 1):
-        text = chunk['text']
-        start, end = chunk.get('timestamp', [None, None])
-        if start is None or end is None:
-            print(f"Warning: Chunk {index} has missing timestamps. Skipping...")
-            continue
-        start_format, end_format = format_seconds(start), format_seconds(end)
-        srt_entry = f"{index}\n{start_format} --> {end_format}\n{text}\n\n"
-
-        if verbose:
-            print(srt_entry)
-
-        rst_string += srt_entry
-
-    with open(output_path, 'w', encoding='utf-8') as file:
-        file.write(rst_string)
+    for job, duration in zip(jobs, durations):
+        job['duration'] = duration
+        file_queue.put(job)
+
+    # NVML is sampled in the background, so scheduling decisions never wait on the driver
+    with GpuTelemetry(NvmlProvider()) as telemetry:
+        print(telemetry.summary())
+        # Warm in-process models already hold their memory, so only the CLI backend needs the free memory check
+        memory_per_job = 0 if BACKENDS[backend_name].supports_windows else cli_memory_per_job
+        scheduler = GpuSlotScheduler(telemetry, max_jobs_per_gpu, memory_per_job)
+        max_workers = scheduler.total_slots  # Total possible number of concurrent jobs
+        if BACKENDS[backend_name].supports_windows:
+            # Warm models stay loaded, so only as many copies as fit in free memory; the job slots share them
+            workers_per_device = warm_workers_per_device(telemetry, scheduler.device_ids)
+        else:
+            # One CLI process per job slot, each started only once the scheduler has seen the memory free
+            workers_per_device = max_jobs_per_gpu
+        print(f"Starting {workers_per_device} transcription workers per GPU")
+        with TranscriptionPool(backend_name, device_ids=scheduler.device_ids, workers_per_device=workers_per_device) as pool:
+            if BACKENDS[backend_name].supports_windows:
+                # Long files are cut into overlapping segments that run on every GPU at once, so a file
+                # holds no slot on any one GPU; the transcriber bounds the segments decoded ahead instead
+                transcribe = SegmentedTranscriber(pool).transcribe
+                job_scheduler = None
+            else:
+                def transcribe(file_path, output_path, gpu_id):
+                    return pool.submit(file_path, output_path, device_id=gpu_id).result()
+                job_scheduler = scheduler
+
+            report = MakespanReport(durations, max_workers, probe_cache.get_speed(backend_name))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(worker, file_queue, transcribe, job_scheduler, journal, report) for _ in range(max_workers)]
+                concurrent.futures.wait(futures)
+            report.finish()
+            if report.speed:
+                probe_cache.put_speed(backend_name, report.speed)
+    probe_cache.close()
+
 
 def process_json_file(subdir_path, json_filename, verbose=False):
-    """ Convert a specific JSON file to an SRT file within its directory. """
+    """ Convert a specific JSON file to every subtitle format in `subtitle_formats`, in one pass, within its directory. """
     json_path = os.path.join(subdir_path, json_filename)
-    srt_path = os.path.join(subdir_path, os.path.splitext(json_filename)[0] + '.srt')
-    convert_to_srt(json_path, srt_path, verbose)
-    print(f"Converted {json_path} to {srt_path}")
+    paths = convert_transcript(json_path, subtitle_formats, verbose=verbose)
+    print(f"Converted {json_path} to {', '.join(paths.values())}")
+    return paths.get('srt') or next(iter(paths.values()))
+
+def process_json_files_in_videos(journal, verbose=False):
+    """ Convert the transcripts a previous run left unconverted, in parallel. """
+    jobs = {job['json_path']: job for job in journal.jobs(TRANSCRIBED)}
+    for json_path, paths, error in convert_files(list(jobs), subtitle_formats, verbose=verbose):
+        if error:
+            print(f"Failed to convert {json_path}: {error}")
+            journal.mark_failed(jobs[json_path]['id'], error)
+        else:
+            journal.mark_converted(jobs[json_path]['id'], paths.get('srt') or next(iter(paths.values())))
+            print(f"Converted {json_path} to {', '.join(paths.values())}")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch transcribe every file in 'Input-Videos' across all GPUs.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="transformers", help="Transcription backend (default: transformers)")
+    parser.add_argument("--formats", type=parse_formats, default=DEFAULT_FORMATS, help="Comma-separated subtitle formats to write: srt, vtt, tsv, txt (default: srt)")
+    args = parser.parse_args()
+    subtitle_formats = args.formats
+
+    journal = JobJournal()
     try:
         start_time = time.time()  # Record the start time
         
-        process_files_LMT2_batch()
-        cleanup_filenames()
-        process_json_files_in_videos()
+        process_files_LMT2_batch(journal, args.backend)
+        process_json_files_in_videos(journal)
         
         end_time = time.time()  # Record the end time
         elapsed_time = end_time - start_time  # Calculate the elapsed time
         
         print(f"Script completed in {elapsed_time:.2f} seconds")
+        print(f"Jobs by state: {journal.counts()}")
     except Exception as e:
         print({e})
-        #move_and_clear_videos() # Basic cleanup on error
-
+        print("Run the script again to resume.")
+    finally:
+        journal.close()
@@ -0,0 +1,132 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import threading
+import time
+import os
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_INTERVAL = 2.0
+# Names browsers and copy tools give files that are still being written
+PARTIAL_SUFFIXES = ('.part', '.partial', '.tmp', '.crdownload', '.download')
+
+
+class FolderWatcher:
+    """
+    Reports files that appear in a directory once they have stopped growing.
+
+    On Linux with the optional `inotify_simple` package, the watcher sleeps until the kernel reports
+    a change. Elsewhere it rescans every `poll_interval` seconds. Either way, a file is only reported
+    after its size and modification time have stayed the same for `settle_seconds`. A copy that is
+    still in progress is therefore never picked up.
+
+    Every file is reported once for as long as it stays in the directory. A file that is moved out
+    and later comes back is reported again.
+
+    Args:
+        directory (str): The directory to watch.
+        settle_seconds (float): How long a file must stay unchanged before it is reported.
+        poll_interval (float): The longest time between scans.
+    """
+    def __init__(self, directory, settle_seconds=DEFAULT_SETTLE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self._candidates = {}  # name -> (size, mtime, unchanged since)
+        self._reported = set()
+        self._stopped = threading.Event()
+        self._inotify = None
+        if inotify_simple is not None:
+            flags = inotify_simple.flags
+            self._inotify = inotify_simple.INotify()
+            self._inotify.add_watch(directory, flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE)
+
+    @property
+    def uses_inotify(self):
+        return self._inotify is not None
+
+    def _scan(self):
+        now = time.monotonic()
+        present = set()
+        ready = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.startswith('.') or entry.name.lower().endswith(PARTIAL_SUFFIXES):
+                continue
+            present.add(entry.name)
+            if entry.name in self._reported:
+                continue
+            stat = entry.stat()
+            previous = self._candidates.get(entry.name)
+            if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+                self._candidates[entry.name] = (stat.st_size, stat.st_mtime, now)
+            elif now - previous[2] >= self.settle_seconds:
+                del self._candidates[entry.name]
+                self._reported.add(entry.name)
+                ready.append(entry.name)
+
+        # Forget files that have left the directory so they are reported again if they come back
+        self._reported &= present
+        for name in set(self._candidates) - present:
+            del self._candidates[name]
+        return sorted(ready)
+
+    def _wait(self, timeout):
+        if self._candidates:
+            # A file is settling, so wake up in time to report it
+            timeout = min(timeout, self.settle_seconds)
+        if self._inotify is not None:
+            self._inotify.read(timeout=int(timeout * 1000))
+        else:
+            self._stopped.wait(timeout)
+
+    def poll(self, timeout=None):
+        """
+        Waits for at least one file to settle, up to `timeout` seconds.
+
+        Args:
+            timeout (float, optional): The longest time to wait. None waits until a file settles or `stop()` is called.
+
+        Returns:
+            list[str]: The names of the files that settled, oldest first. Empty on timeout or stop.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stopped.is_set():
+            ready = self._scan()
+            if ready:
+                return ready
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    break
+            self._wait(wait)
+        return []
+
+    def stop(self):
+        """
+        Makes `poll()` return. With inotify this takes effect at the next wake-up, at most `poll_interval` later.
+        """
+        self._stopped.set()
+
+    def close(self):
+        self.stop()
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
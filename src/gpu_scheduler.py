@@ -0,0 +1,111 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import contextlib
+import threading
+import time
+
+
+class GpuSlotScheduler:
+    """
+    Hands out per-device job slots and blocks callers until one is free.
+
+    Each device has `max_jobs_per_device` slots. A slot is only handed out on a device that also
+    reports at least `memory_per_job` bytes free. Among the devices that qualify, the job goes to the
+    best fit (the one with the least free memory left over), which keeps whole devices free for
+    later jobs instead of fragmenting every device. Without a memory check there is nothing to fit,
+    so jobs are spread instead: each goes to the device running the fewest jobs. Callers with
+    nothing to run wait on a condition and are woken when a slot is released, rather than polling.
+
+    Args:
+        telemetry (GpuTelemetry): Supplies the device count and each device's latest (total, free) memory.
+        max_jobs_per_device (int): The number of concurrent jobs allowed on each device.
+        memory_per_job (int): Free bytes a device needs to accept another job. 0 disables the memory check.
+        recheck_interval (float): How often a waiting caller re-reads free memory, which other processes can change.
+                                  Best kept close to the telemetry sample interval.
+    """
+    def __init__(self, telemetry, max_jobs_per_device=7, memory_per_job=11 * 1024**3, recheck_interval=1.0):
+        self.telemetry = telemetry
+        self.device_ids = list(range(telemetry.device_count()))
+        self.max_jobs_per_device = max_jobs_per_device
+        self.memory_per_job = memory_per_job
+        self.recheck_interval = recheck_interval
+        self.jobs = {device_id: 0 for device_id in self.device_ids}
+        self._condition = threading.Condition()
+
+        if not self.device_ids:
+            raise RuntimeError("No GPUs found to schedule jobs on")
+        if memory_per_job and all(telemetry.memory_info(d)[0] < memory_per_job for d in self.device_ids):
+            raise RuntimeError(f"No GPU has the {memory_per_job / 1024**3:.1f} GB a job needs")
+
+    @property
+    def total_slots(self):
+        return self.max_jobs_per_device * len(self.device_ids)
+
+    def _best_fit_locked(self):
+        best = None
+        for device_id in self.device_ids:
+            if self.jobs[device_id] >= self.max_jobs_per_device:
+                continue
+            if self.memory_per_job:
+                _, free = self.telemetry.memory_info(device_id)
+                if free < self.memory_per_job:
+                    continue
+                candidate = (free - self.memory_per_job, self.jobs[device_id], device_id)
+            else:
+                candidate = (self.jobs[device_id], device_id)
+            if best is None or candidate < best:
+                best = candidate
+        return None if best is None else best[-1]
+
+    def acquire(self, timeout=None):
+        """
+        Reserves a slot, waiting until one is available.
+
+        Args:
+            timeout (float, optional): Give up after this many seconds.
+
+        Returns:
+            int: The device the slot is on.
+
+        Raises:
+            TimeoutError: If no slot became available within `timeout`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                device_id = self._best_fit_locked()
+                if device_id is not None:
+                    self.jobs[device_id] += 1
+                    return device_id
+                wait = self.recheck_interval
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        raise TimeoutError("No GPU slot became available")
+                self._condition.wait(wait)
+
+    def release(self, device_id):
+        """
+        Returns a slot and wakes one waiting caller.
+        """
+        with self._condition:
+            self.jobs[device_id] -= 1
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def slot(self, timeout=None):
+        """
+        Context manager form of `acquire()` / `release()`.
+        """
+        device_id = self.acquire(timeout)
+        try:
+            yield device_id
+        finally:
+            self.release(device_id)
@@ -0,0 +1,161 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import collections
+import threading
+import time
+
+
+DEFAULT_SAMPLE_INTERVAL = 1.0  # seconds
+
+GpuSample = collections.namedtuple('GpuSample', ['total', 'free', 'utilization'])
+TelemetrySnapshot = collections.namedtuple('TelemetrySnapshot', ['timestamp', 'devices'])
+
+
+class NvmlProvider:
+    """
+    Reads memory and utilization of the local NVIDIA GPUs through NVML.
+
+    NVML is initialised once and the device handles are kept open until `close()`.
+    """
+    def __init__(self):
+        import pynvml
+
+        self._nvml = pynvml
+        pynvml.nvmlInit()
+        self._handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+
+    def device_count(self):
+        return len(self._handles)
+
+    def read(self, device_id):
+        handle = self._handles[device_id]
+        memory = self._nvml.nvmlDeviceGetMemoryInfo(handle)
+        utilization = self._nvml.nvmlDeviceGetUtilizationRates(handle)
+        return GpuSample(memory.total, memory.free, utilization.gpu)
+
+    def close(self):
+        self._nvml.nvmlShutdown()
+
+
+class SyntheticProvider:
+    """
+    A provider with fixed, editable figures, for running on machines without an NVIDIA driver.
+
+    Args:
+        devices (list[tuple[int, int, int]]): (total bytes, free bytes, utilization %) for every fake device.
+    """
+    def __init__(self, devices=((24 * 1024**3, 24 * 1024**3, 0),)):
+        self.devices = [GpuSample(*device) for device in devices]
+
+    def device_count(self):
+        return len(self.devices)
+
+    def read(self, device_id):
+        return self.devices[device_id]
+
+    def set(self, device_id, free=None, utilization=None):
+        """
+        Changes the figures reported for a fake device from the next sample on.
+        """
+        sample = self.devices[device_id]
+        self.devices[device_id] = sample._replace(
+            free=sample.free if free is None else free,
+            utilization=sample.utilization if utilization is None else utilization,
+        )
+
+    def close(self):
+        pass
+
+
+class GpuTelemetry:
+    """
+    Samples every GPU on a background thread and serves the latest figures without touching the driver.
+
+    Each sample is an immutable `TelemetrySnapshot` that replaces the previous one in a single
+    assignment, so readers never take a lock and never wait on NVML. Figures are at most `interval`
+    seconds old.
+
+    Args:
+        provider: `NvmlProvider`, `SyntheticProvider` or anything with `device_count()` and `read(device_id)`.
+        interval (float): Seconds between samples.
+    """
+    def __init__(self, provider, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.provider = provider
+        self.interval = interval
+        self._snapshot = self._sample()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        return TelemetrySnapshot(time.time(), tuple(self.provider.read(i) for i in range(self.provider.device_count())))
+
+    def refresh(self):
+        """
+        Takes a sample now instead of waiting for the next interval.
+        """
+        self._snapshot = self._sample()
+        return self._snapshot
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the last good sample
+                print(f"GPU telemetry sample failed: {e}")
+
+    def start(self):
+        """
+        Starts the sampling thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gpu-telemetry", daemon=True)
+            self._thread.start()
+        return self
+
+    def snapshot(self):
+        """
+        Returns the latest `TelemetrySnapshot`.
+        """
+        return self._snapshot
+
+    def device_count(self):
+        return len(self._snapshot.devices)
+
+    def memory_info(self, device_id):
+        """
+        Returns (total, free) memory in bytes for a device from the latest sample.
+        """
+        sample = self._snapshot.devices[device_id]
+        return sample.total, sample.free
+
+    def summary(self):
+        """
+        Formats the latest sample as one line for logging.
+        """
+        return ", ".join(
+            f"GPU {i}: {sample.free / 1024**3:.1f}/{sample.total / 1024**3:.1f} GB free, {sample.utilization}% busy"
+            for i, sample in enumerate(self._snapshot.devices)
+        )
+
+    def close(self):
+        """
+        Stops sampling and releases the provider.
+        """
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.provider.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
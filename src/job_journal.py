@@ -0,0 +1,305 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import threading
+import sqlite3
+import errno
+import shutil
+import time
+import re
+import os
+
+
+DEFAULT_JOURNAL_PATH = "batch_journal.sqlite3"
+# Private working directories of the jobs in flight
+DEFAULT_SCRATCH_DIR = "Processing"
+
+QUEUED = "queued"
+RUNNING = "running"
+TRANSCRIBED = "transcribed"
+CONVERTED = "converted"
+FAILED = "failed"
+
+
+class JobJournal:
+    """
+    A persistent record of every file a batch run has seen and how far it got.
+
+    A file is known by its name together with its size and modification time. A different file
+    dropped in later under a name the journal has already seen is therefore queued afresh instead
+    of being skipped as done.
+
+    Every state change is committed to SQLite before the call returns. A run that is killed
+    part-way therefore leaves an accurate journal behind. The next run can skip what is finished,
+    retry what failed and pick up what was in flight.
+
+    Args:
+        path (str): The SQLite database file.
+    """
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY, source TEXT UNIQUE, state TEXT, folder TEXT, json_path TEXT, "
+                "srt_path TEXT, error TEXT, attempts INTEGER DEFAULT 0, updated REAL, size INTEGER, mtime REAL)"
+            )
+            # Journals written before files were told apart by size and modification time
+            columns = {row['name'] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("size", "INTEGER"), ("mtime", "REAL")):
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def add(self, source, size=None, mtime=None):
+        """
+        Records a source file, unless it is already in the journal.
+
+        If the journal knows the name but with another size or modification time, the file has been
+        replaced: its entry is reset to queued, with no outputs, error or attempts. The outputs of the
+        earlier file are left where they are.
+
+        Args:
+            source (str): The name of the source file.
+            size (int, optional): The file's size in bytes.
+            mtime (float, optional): The file's modification time.
+
+        Returns:
+            dict: The job, with its id, state and any output paths from an earlier run.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO jobs (source, state, updated, size, mtime) VALUES (?, ?, ?, ?, ?)", (source, QUEUED, now, size, mtime)
+            )
+            job = dict(self._db.execute("SELECT * FROM jobs WHERE source = ?", (source,)).fetchone())
+            if size is None or (job['size'], job['mtime']) == (size, mtime):
+                return job
+            if job['size'] is None:
+                # Recorded before sizes were kept, so take it to be the same file
+                self._db.execute("UPDATE jobs SET size = ?, mtime = ? WHERE id = ?", (size, mtime, job['id']))
+            else:
+                self._db.execute(
+                    "UPDATE jobs SET state = ?, folder = NULL, json_path = NULL, srt_path = NULL, error = NULL, attempts = 0, "
+                    "updated = ?, size = ?, mtime = ? WHERE id = ?",
+                    (QUEUED, now, size, mtime, job['id'])
+                )
+            return dict(self._db.execute("SELECT * FROM jobs WHERE id = ?", (job['id'],)).fetchone())
+
+    def recover(self):
+        """
+        Returns jobs left running by a run that did not finish to the queue.
+
+        Returns:
+            list[dict]: The jobs that were in flight.
+        """
+        with self._lock, self._db:
+            rows = [dict(row) for row in self._db.execute("SELECT * FROM jobs WHERE state = ?", (RUNNING,))]
+            self._db.execute("UPDATE jobs SET state = ?, updated = ? WHERE state = ?", (QUEUED, time.time(), RUNNING))
+        return rows
+
+    def mark_running(self, job_id, folder):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, folder = ?, error = NULL, attempts = attempts + 1, updated = ? WHERE id = ?",
+                (RUNNING, folder, time.time(), job_id)
+            )
+
+    def mark_transcribed(self, job_id, folder, json_path):
+        self._update(job_id, state=TRANSCRIBED, folder=folder, json_path=json_path)
+
+    def mark_converted(self, job_id, srt_path):
+        self._update(job_id, state=CONVERTED, srt_path=srt_path)
+
+    def mark_failed(self, job_id, error):
+        self._update(job_id, state=FAILED, error=str(error))
+
+    def jobs(self, state=None):
+        """
+        Returns every job, or only the jobs in one state.
+        """
+        with self._lock:
+            if state is None:
+                rows = self._db.execute("SELECT * FROM jobs ORDER BY id")
+            else:
+                rows = self._db.execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,))
+            return [dict(row) for row in rows]
+
+    def counts(self):
+        """
+        Returns the number of jobs in each state.
+        """
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def scratch_folder(job, scratch_dir=DEFAULT_SCRATCH_DIR):
+    """
+    Returns the private working directory of a job.
+    """
+    return os.path.join(scratch_dir, f"job-{job['id']}")
+
+
+def commit_outputs(scratch_path, name, output_dir="Videos"):
+    """
+    Publishes a finished job's working directory as its output folder in a single rename.
+
+    The folder is named after the input. If that name is taken, a number is added rather than
+    merging into or replacing the existing folder.
+
+    Args:
+        scratch_path (str): The job's working directory. Must be on the same file system as `output_dir`.
+        name (str): The name the output folder should have.
+        output_dir (str): Where output folders live.
+
+    Returns:
+        str: The path of the output folder.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    candidate = name
+    number = 1
+    while True:
+        folder = os.path.join(output_dir, candidate)
+        if not os.path.exists(folder):
+            try:
+                os.rename(scratch_path, folder)
+                return folder
+            except OSError as e:
+                # Another job took the name between the check and the rename
+                if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+        number += 1
+        candidate = f"{name} ({number})"
+
+
+def restore_source(source, folder, input_dir="Input-Videos"):
+    """
+    Puts a source file whose processing did not finish back into the input folder and removes its partial outputs.
+
+    Only the job's own working directory is removed, so the results of every other job are left untouched.
+
+    Args:
+        source (str): The name of the source file.
+        folder (str): The working directory the job was given, if any.
+        input_dir (str): The folder batch runs read new files from.
+    """
+    for location in (os.path.join(folder, source) if folder else None, source):
+        if location and os.path.exists(location):
+            shutil.move(location, os.path.join(input_dir, source))
+            break
+    if folder and os.path.exists(folder):
+        shutil.rmtree(folder)
+
+
+def find_published(job, output_dir="Videos"):
+    """
+    Finds the output folder of a job whose outputs were published by `commit_outputs`, in case the journal never recorded it.
+
+    That is a folder `commit_outputs` could have named for the job, holding the job's source file
+    with the size and modification time the journal recorded for it.
+
+    Args:
+        job (dict): The journal entry of the job.
+        output_dir (str): Where output folders live.
+
+    Returns:
+        str: The folder, or None if the job's outputs were never published.
+    """
+    if job['size'] is None or not os.path.isdir(output_dir):
+        return None
+    name = re.compile(re.escape(os.path.splitext(job['source'])[0]) + r"( \(\d+\))?")
+    for entry in sorted(os.listdir(output_dir)):
+        if not name.fullmatch(entry):
+            continue
+        try:
+            stat = os.stat(os.path.join(output_dir, entry, job['source']))
+        except OSError:
+            continue
+        if (stat.st_size, stat.st_mtime) == (job['size'], job['mtime']):
+            return os.path.join(output_dir, entry)
+    return None
+
+
+def recover_jobs(journal, input_dir="Input-Videos", output_dir="Videos"):
+    """
+    Returns files left in flight by a run that was killed to the input folder, so they are picked up again.
+
+    A job killed between publishing its outputs and recording that in the journal has no working
+    directory left. It is recorded as transcribed with its published folder instead.
+    """
+    for job in journal.recover():
+        published = None if job['folder'] and os.path.exists(job['folder']) else find_published(job, output_dir)
+        if published:
+            print(f"Recovering published job: {job['source']} in {published}")
+            journal.mark_transcribed(job['id'], published, os.path.join(published, f"{os.path.splitext(job['source'])[0]}.json"))
+            continue
+        print(f"Resuming interrupted job: {job['source']}")
+        restore_source(job['source'], job['folder'], input_dir)
+
+
+def pending_job(journal, source, max_attempts=None, input_dir="Input-Videos"):
+    """
+    Adds a source file to the journal and returns its entry if it still needs transcribing.
+
+    A file that replaced an earlier one of the same name always needs transcribing.
+
+    Args:
+        journal (JobJournal): The journal of this and earlier runs.
+        source (str): The name of the source file.
+        max_attempts (int, optional): Give up on a file that has failed this many times.
+        input_dir (str): The folder the source file is in.
+
+    Returns:
+        dict: The journal entry, or None if the file should be skipped.
+    """
+    try:
+        stat = os.stat(os.path.join(input_dir, source))
+    except FileNotFoundError:
+        job = journal.add(source)
+    else:
+        job = journal.add(source, stat.st_size, stat.st_mtime)
+    if job['state'] in (TRANSCRIBED, CONVERTED) and job['json_path'] and os.path.exists(job['json_path']):
+        print(f"Skipping {source}: already transcribed to {job['json_path']}")
+        return None
+    if job['state'] == FAILED and max_attempts is not None and job['attempts'] >= max_attempts:
+        print(f"Skipping {source}: failed {job['attempts']} times ({job['error']})")
+        return None
+    return job
+
+
+def queue_pending_jobs(journal, input_dir="Input-Videos"):
+    """
+    Adds every file in the input folder to the journal and returns the ones that still need transcribing.
+
+    Files left in flight by a run that was killed are returned to the input folder first. Files that
+    were already transcribed, and whose transcript still exists, are skipped.
+
+    Args:
+        journal (JobJournal): The journal of this and earlier runs.
+        input_dir (str): The folder batch runs read new files from.
+
+    Returns:
+        list[dict]: The journal entries of the files to process.
+    """
+    recover_jobs(journal, input_dir)
+    pending = [pending_job(journal, source, input_dir=input_dir) for source in sorted(os.listdir(input_dir))]
+    return [job for job in pending if job is not None]
@@ -0,0 +1,272 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import collections
+import threading
+import uuid
+import time
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Finished jobs are forgotten this long after they end
+DEFAULT_RETENTION_SECONDS = 24 * 3600
+
+
+class Job:
+    """
+    One submitted piece of work and how far it has got.
+
+    Steps update `progress` through `report()`; everything else is set by the `JobManager`. Jobs
+    attached to this one as followers (see `JobManager.submit`) see every change as well.
+    """
+    def __init__(self, job_id, steps, info, on_done=None):
+        self.id = job_id
+        self.info = info
+        self.state = QUEUED
+        self.stage = None
+        self.progress = ""
+        self.result = None
+        self.error = None
+        self.created = self.updated = time.time()
+        self.finished = threading.Event()
+        self.leader_id = None
+        self._steps = list(steps)
+        self._on_done = on_done
+        self._flight_key = None
+        self._followers = []
+
+    def _update(self, **fields):
+        fields['updated'] = time.time()
+        for job in [self, *self._followers]:
+            for name, value in fields.items():
+                setattr(job, name, value)
+
+    def report(self, message):
+        """
+        Records a progress message for pollers. Called from the step that is running.
+        """
+        self._update(progress=message)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'stage': self.stage,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'updated': self.updated,
+            'leader_id': self.leader_id,
+            **self.info,
+        }
+
+
+class JobManager:
+    """
+    Runs multi-step jobs in the background on one bounded thread pool per stage.
+
+    A job is a list of (stage, function) steps. Each function is called as `function(job, value)`
+    with the previous step's return value (None for the first) and runs on its stage's pool. The
+    last return value becomes the job's result. Submitting returns at once, so a request handler
+    never waits for the work itself. Each stage's pool size caps how many jobs are in that stage
+    at once, e.g. many downloads but only a few transcriptions.
+
+    Jobs submitted with the same `flight_key` while one of them is still running share its work
+    ("single flight"). Only the first job runs its steps. The others follow it: they get its
+    progress, its result or its error, each under its own job ID.
+
+    With `prefetch_depth` set, at most that many jobs are let in ahead of the `prefetch_until` stage:
+    a job is admitted to its first step only while fewer jobs are between their first step and the
+    start of that stage. The rest wait, in order, without holding a worker. This keeps the early
+    stages a fixed number of jobs ahead of a slow one (e.g. downloading and decoding the next few
+    files while the GPU transcribes), instead of fetching the whole queue. `admit` can hold jobs
+    back further, e.g. while a disk budget is used up. It is asked each time a job could be admitted,
+    without the manager's lock held, so it may take its time; a job is always admitted when nothing
+    else is ahead.
+
+    Args:
+        stages (dict[str, int]): The number of workers for each stage name.
+        retention_seconds (float): How long finished jobs can still be looked up.
+        prefetch_depth (int, optional): How many jobs may be ahead of `prefetch_until`. None admits every job at once.
+        prefetch_until (str, optional): The stage a job must start before it stops counting against `prefetch_depth`.
+        admit (callable, optional): Called as `admit()`; returning False holds the next job back.
+    """
+    def __init__(self, stages, retention_seconds=DEFAULT_RETENTION_SECONDS, prefetch_depth=None, prefetch_until=None, admit=None):
+        if prefetch_until is not None and prefetch_until not in stages:
+            raise KeyError(f"No worker pool for stage '{prefetch_until}'")
+        self.retention_seconds = retention_seconds
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_until = prefetch_until
+        self._admit = admit
+        self._executors = {
+            stage: concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{stage}")
+            for stage, workers in stages.items()
+        }
+        self._jobs = {}
+        self._flights = {}  # flight key -> the job doing the work
+        self._waiting = collections.deque()  # jobs not admitted yet, oldest first
+        self._ahead = set()  # admitted jobs that have not started `prefetch_until` yet
+        self._lock = threading.Lock()
+
+    def submit(self, steps, flight_key=None, on_done=None, **info):
+        """
+        Queues a job, or attaches it to a running job with the same `flight_key`.
+
+        Args:
+            steps (list[tuple[str, callable]]): The stage and function of every step, in order.
+            flight_key (hashable, optional): Identifies identical work. None never shares.
+            on_done (callable, optional): Called as `on_done(job)` once the job has succeeded, for the
+                                          leader and every follower alike, e.g. to bill each submitter.
+            **info: Extra fields reported with the job's status, e.g. the file or URL it is for.
+
+        Returns:
+            str: The job ID.
+
+        Raises:
+            KeyError: If a step names a stage the manager has no pool for.
+        """
+        for stage, _ in steps:
+            if stage not in self._executors:
+                raise KeyError(f"No worker pool for stage '{stage}'")
+        job = Job(uuid.uuid4().hex, steps, info, on_done)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            leader = self._flights.get(flight_key) if flight_key is not None else None
+            if leader is not None:
+                job._steps = []
+                job.leader_id = leader.id
+                job.state, job.stage, job.progress = leader.state, leader.stage, leader.progress
+                leader._followers.append(job)
+                return job.id
+            if flight_key is not None:
+                job._flight_key = flight_key
+                self._flights[flight_key] = job
+            held = self.prefetch_depth is not None and bool(job._steps)
+            if held:
+                self._waiting.append(job)
+                job.progress = "Waiting for a prefetch slot"
+        if held:
+            self._admit_waiting()
+        else:
+            self._advance(job, None)
+        return job.id
+
+    def get(self, job_id):
+        """
+        Returns a job, or None if the ID is unknown or the job has been forgotten.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """
+        Blocks until a job has finished, up to `timeout` seconds.
+
+        Returns:
+            Job: The job, or None if the ID is unknown.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            job.finished.wait(timeout)
+        return job
+
+    def waiting(self):
+        """
+        Returns the number of jobs not yet admitted because of `prefetch_depth` or `admit`.
+        """
+        with self._lock:
+            return len(self._waiting)
+
+    def counts(self):
+        """
+        Returns the number of known jobs in each state.
+        """
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.state] = counts.get(job.state, 0) + 1
+            return counts
+
+    def close(self, wait=True):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished.is_set() and job.updated < cutoff]:
+            del self._jobs[job_id]
+
+    def _admit_waiting(self):
+        while True:
+            with self._lock:
+                if not self._waiting or len(self._ahead) >= self.prefetch_depth:
+                    return
+                ask = bool(self._ahead) and self._admit is not None
+            # `admit` may be slow (e.g. it sizes a directory), so it runs without the lock
+            if ask and not self._admit():
+                return  # Asked again when the next job is released
+            with self._lock:
+                # Another thread may have filled the slot in the meantime
+                if not self._waiting or len(self._ahead) >= self.prefetch_depth:
+                    return
+                job = self._waiting.popleft()
+                self._ahead.add(job)
+            self._advance(job, None)
+
+    def _release(self, job):
+        # The job no longer counts against the prefetch depth, so the next one may start
+        with self._lock:
+            if job not in self._ahead:
+                return
+            self._ahead.discard(job)
+        self._admit_waiting()
+
+    def _finish(self, job, **fields):
+        # Detach the flight first, so a job submitted from now on starts its own work
+        with self._lock:
+            if job._flight_key is not None:
+                del self._flights[job._flight_key]
+                job._flight_key = None
+            followers = list(job._followers)
+        job._update(**fields)
+        for finished in [job, *followers]:
+            if finished.state == DONE and finished._on_done is not None:
+                try:
+                    finished._on_done(finished)
+                except Exception as e:
+                    print(f"Job {finished.id}: completion callback failed: {e}")
+            finished.finished.set()
+        self._release(job)
+
+    def _advance(self, job, value):
+        if not job._steps:
+            self._finish(job, result=value, state=DONE, progress="Finished")
+            return
+        stage, function = job._steps.pop(0)
+        job._update(state=QUEUED, stage=stage, progress=f"Waiting for a {stage} worker")
+        self._executors[stage].submit(self._run, job, function, value)
+
+    def _run(self, job, function, value):
+        job._update(state=RUNNING, progress=f"Started {job.stage}")
+        if job.stage == self.prefetch_until:
+            self._release(job)
+        try:
+            value = function(job, value)
+        except Exception as e:
+            # Every follower gets the same error
+            self._finish(job, error=str(e), state=FAILED, progress=f"Failed during {job.stage}")
+            return
+        self._advance(job, value)
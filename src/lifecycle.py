@@ -0,0 +1,212 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import collections
+import threading
+import sqlite3
+import shutil
+import time
+import os
+
+
+DEFAULT_LIFECYCLE_DB_PATH = "artifacts.sqlite3"
+DEFAULT_ORPHAN_SECONDS = 6 * 3600
+DEFAULT_INTERVAL_SECONDS = 300
+
+
+class LifecycleManager:
+    """
+    Keeps directories of generated files within a byte budget each, deleting the least recently used files first.
+
+    Every file under a managed directory is tracked in a SQLite index with its size and last access.
+    The last access is the later of the file's modification time and the last `touch()`. Files
+    the server writes or serves are touched, and files that appear some other way are picked up
+    on the next pass. A background thread runs `collect()` every `interval_seconds`. Each pass
+    refreshes the index one directory at a time, then deletes the oldest files until the
+    directory fits its budget. Requests are never blocked by a pass.
+
+    Files of jobs in flight are `pin()`ned and are never deleted. In the `scratch_dirs` (e.g.
+    temp/), anything unpinned and untouched for `orphan_seconds` is also removed, whatever the
+    budget. That covers the leftovers of failed or crashed jobs, including directories.
+
+    Args:
+        budgets (dict[str, int]): The byte budget of each managed directory.
+        path (str): The SQLite index file.
+        scratch_dirs (iterable[str]): Managed directories whose stale contents are orphans.
+        orphan_seconds (float): How long an unpinned scratch file may go untouched.
+        interval_seconds (float): The time between two background passes.
+    """
+    def __init__(self, budgets, path=DEFAULT_LIFECYCLE_DB_PATH, scratch_dirs=(), orphan_seconds=DEFAULT_ORPHAN_SECONDS,
+                 interval_seconds=DEFAULT_INTERVAL_SECONDS):
+        self.budgets = {os.path.abspath(directory): budget for directory, budget in budgets.items()}
+        self.scratch_dirs = [os.path.abspath(directory) for directory in scratch_dirs]
+        self.orphan_seconds = orphan_seconds
+        self.interval_seconds = interval_seconds
+        self._pins = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS artifacts (path TEXT PRIMARY KEY, directory TEXT, size INTEGER, last_access REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS artifacts_by_access ON artifacts (directory, last_access)")
+
+    def _directory(self, path):
+        for directory in self.budgets:
+            if path.startswith(directory + os.sep):
+                return directory
+        return None
+
+    def touch(self, *paths):
+        """
+        Records that files were just written or read. Files outside the managed directories and missing files are ignored.
+        """
+        now = time.time()
+        rows = []
+        for path in paths:
+            path = os.path.abspath(path)
+            directory = self._directory(path)
+            if directory is None:
+                continue
+            try:
+                rows.append((path, directory, os.path.getsize(path), now))
+            except OSError:
+                continue
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)", rows)
+
+    def pin(self, path):
+        """
+        Protects a file from deletion until it is unpinned as many times as it was pinned.
+        """
+        with self._lock:
+            self._pins[os.path.abspath(path)] += 1
+
+    def unpin(self, path):
+        with self._lock:
+            path = os.path.abspath(path)
+            self._pins[path] -= 1
+            if self._pins[path] <= 0:
+                del self._pins[path]
+
+    def _pinned(self, path):
+        with self._lock:
+            return path in self._pins
+
+    def usage(self, directory):
+        """
+        Returns the tracked bytes under a managed directory, as of the last pass or touch.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE directory = ?", (os.path.abspath(directory),)
+            ).fetchone()[0]
+
+    def scan(self, directory):
+        """
+        Brings the index of one directory up to date with the disk: new files are added, sizes refreshed and vanished files dropped.
+        """
+        found = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed while walking
+                found[path] = (stat.st_size, stat.st_mtime)
+        with self._lock, self._db:
+            known = dict(self._db.execute("SELECT path, last_access FROM artifacts WHERE directory = ?", (directory,)).fetchall())
+            self._db.executemany("DELETE FROM artifacts WHERE path = ?", [(path,) for path in known if path not in found])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
+                [(path, directory, size, max(mtime, known.get(path, 0))) for path, (size, mtime) in found.items()]
+            )
+
+    def _evict(self, directory, budget):
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE directory = ?", (directory,)).fetchone()[0]
+            rows = self._db.execute("SELECT path, size FROM artifacts WHERE directory = ? ORDER BY last_access", (directory,)).fetchall()
+        removed = 0
+        for path, size in rows:
+            if total <= budget:
+                break
+            if self._pinned(path):
+                continue
+            if self._remove(path):
+                total -= size
+                removed += 1
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove {path}: {e}")
+            return False
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+        return True
+
+    def _remove_orphans(self, directory):
+        cutoff = time.time() - self.orphan_seconds
+        with self._lock:
+            rows = self._db.execute("SELECT path FROM artifacts WHERE directory = ? AND last_access < ?", (directory, cutoff)).fetchall()
+        removed = sum(self._remove(path) for (path,) in rows if not self._pinned(path))
+        # Directories left empty by failed jobs (e.g. separation output)
+        for root, dirs, files in os.walk(directory, topdown=False):
+            if root != directory and not dirs and not files and os.path.getmtime(root) < cutoff:
+                shutil.rmtree(root, ignore_errors=True)
+        return removed
+
+    def collect(self):
+        """
+        Runs one pass over every managed directory.
+
+        Returns:
+            int: The number of files deleted.
+        """
+        removed = 0
+        for directory, budget in self.budgets.items():
+            if not os.path.isdir(directory):
+                continue
+            self.scan(directory)
+            if directory in self.scratch_dirs:
+                removed += self._remove_orphans(directory)
+            removed += self._evict(directory, budget)
+        return removed
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                removed = self.collect()
+                if removed:
+                    print(f"Disk lifecycle: removed {removed} files")
+            except Exception as e:
+                print(f"Disk lifecycle pass failed: {e}")
+            self._stopped.wait(self.interval_seconds)
+
+    def start(self):
+        """
+        Starts the background thread. The first pass runs straight away.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="disk-lifecycle")
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        with self._lock:
+            self._db.close()
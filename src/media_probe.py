@@ -0,0 +1,267 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import collections
+import subprocess
+import threading
+import sqlite3
+import hashlib
+import heapq
+import json
+import time
+import os
+
+
+DEFAULT_PROBE_CACHE_PATH = "probe_cache.sqlite3"
+DEFAULT_PROBE_WORKERS = 8
+# Audio seconds one worker slot transcribes per wall-clock second, used until a run has been measured
+DEFAULT_SPEED = 10.0
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Bit rate and sample rate are of the first audio stream; older cache rows leave them None
+MediaInfo = collections.namedtuple(
+    'MediaInfo', ['duration', 'audio_codec', 'video_codec', 'size', 'audio_bit_rate', 'sample_rate'], defaults=(None, None)
+)
+
+
+def file_fingerprint(file_path):
+    """
+    Hashes the raw bytes of a file. Byte-identical uploads get the same fingerprint whatever their name.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def probe_media(file_path):
+    """
+    Reads the duration, codecs and size of a media file with ffprobe.
+
+    Returns:
+        MediaInfo: The file's metadata. `duration` is None if ffprobe could not read the file.
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration:stream=codec_type,codec_name,bit_rate,sample_rate", "-of", "json", file_path],
+        capture_output=True, text=True
+    )
+    size = os.path.getsize(file_path)
+    try:
+        data = json.loads(result.stdout)
+        duration = float(data['format']['duration'])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return MediaInfo(None, None, None, size)
+    streams = {}
+    for stream in data.get('streams', []):
+        streams.setdefault(stream.get('codec_type'), stream)
+    audio, video = streams.get('audio', {}), streams.get('video', {})
+    return MediaInfo(
+        duration, audio.get('codec_name'), video.get('codec_name'), size,
+        # Compressed streams in some containers (e.g. opus in webm) report no bit rate
+        _int_or_none(audio.get('bit_rate')), _int_or_none(audio.get('sample_rate'))
+    )
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProbeCache:
+    """
+    Remembers probe results keyed on path, modification time and size, so unchanged files are never probed twice.
+    Results can also be keyed on content hash (see `inspect_media`), which finds the same file under any name.
+
+    It also stores the transcription speed measured on the last run of each backend, which calibrates
+    the makespan prediction of the next run.
+
+    Args:
+        path (str): The SQLite database file.
+    """
+    def __init__(self, path=DEFAULT_PROBE_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS probes (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, info TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS speeds (backend TEXT PRIMARY KEY, speed REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS hashes (content_hash TEXT PRIMARY KEY, info TEXT)")
+
+    def get(self, file_path, stat):
+        with self._lock:
+            row = self._db.execute("SELECT mtime_ns, size, info FROM probes WHERE path = ?", (file_path,)).fetchone()
+        if row is None or row[:2] != (stat.st_mtime_ns, stat.st_size):
+            return None
+        return MediaInfo(*json.loads(row[2]))
+
+    def put(self, file_path, stat, info):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)", (file_path, stat.st_mtime_ns, stat.st_size, json.dumps(info)))
+
+    def get_by_hash(self, content_hash):
+        with self._lock:
+            row = self._db.execute("SELECT info FROM hashes WHERE content_hash = ?", (content_hash,)).fetchone()
+        return MediaInfo(*json.loads(row[0])) if row else None
+
+    def put_by_hash(self, content_hash, info):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?)", (content_hash, json.dumps(info)))
+
+    def get_speed(self, backend_name):
+        with self._lock:
+            row = self._db.execute("SELECT speed FROM speeds WHERE backend = ?", (backend_name,)).fetchone()
+        return row[0] if row else DEFAULT_SPEED
+
+    def put_speed(self, backend_name, speed):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO speeds VALUES (?, ?)", (backend_name, speed))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def inspect_media(file_path, cache=None, content_hash=None):
+    """
+    Hashes a file's content and probes it, unless a file with the same content has been probed before.
+
+    The hash can be handed on to later stages (e.g. `CachingTranscriber.transcribe`), so one request
+    reads the file for hashing once and runs ffprobe at most once.
+
+    Args:
+        file_path (str): The media file.
+        cache (ProbeCache, optional): Where to look up and store results by content hash.
+        content_hash (str, optional): The file's `file_fingerprint`, if it is already known (e.g. from
+                                      `RangedDownload.content_hash`). The file is then not read for hashing.
+
+    Returns:
+        tuple: A tuple containing:
+            - info (MediaInfo): The file's metadata. `duration` is None if ffprobe could not read the file.
+            - content_hash (str): The fingerprint of the file's bytes.
+    """
+    content_hash = content_hash or file_fingerprint(file_path)
+    info = cache.get_by_hash(content_hash) if cache else None
+    if info is None:
+        info = probe_media(file_path)
+        if cache and info.duration is not None:
+            cache.put_by_hash(content_hash, info)
+    return info, content_hash
+
+
+def probe_all(file_paths, cache=None, max_workers=DEFAULT_PROBE_WORKERS):
+    """
+    Probes many files in parallel, reusing cached results for files that have not changed.
+
+    Args:
+        file_paths (list[str]): The files to probe.
+        cache (ProbeCache, optional): Where to look up and store results.
+        max_workers (int): How many ffprobe processes to run at once.
+
+    Returns:
+        dict[str, MediaInfo]: The metadata of every file, keyed by the path given.
+    """
+    def probe(file_path):
+        key = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        info = cache.get(key, stat) if cache else None
+        if info is None:
+            info = probe_media(file_path)
+            if cache and info.duration is not None:
+                cache.put(key, stat, info)
+        return info
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(file_paths, executor.map(probe, file_paths)))
+
+
+def plan_longest_first(items, file_paths, cache=None):
+    """
+    Probes the files behind some work items and orders the items longest first, with unreadable files last.
+
+    Args:
+        items (list): The work items.
+        file_paths (list[str]): The file behind each item.
+        cache (ProbeCache, optional): Reused and filled by the probe pass.
+
+    Returns:
+        tuple: A tuple containing:
+            - items (list): The items in dispatch order.
+            - durations (list[float | None]): The duration of each item, in the same order.
+    """
+    infos = probe_all(file_paths, cache)
+    durations = [infos[file_path].duration for file_path in file_paths]
+    order = sorted(range(len(items)), key=lambda i: (durations[i] is None, -(durations[i] or 0)))
+    return [items[i] for i in order], [durations[i] for i in order]
+
+
+def predict_makespan(durations, slots):
+    """
+    Predicts the busiest slot's load when work is dispatched longest first to whichever slot frees up first.
+
+    Args:
+        durations (list[float]): The cost of every item, in dispatch order.
+        slots (int): The number of items that run at once.
+
+    Returns:
+        float: The load of the busiest slot, in the units of `durations`.
+    """
+    loads = [0.0] * max(1, slots)
+    for duration in durations:
+        heapq.heapreplace(loads, loads[0] + duration)
+    return max(loads)
+
+
+class MakespanReport:
+    """
+    Compares the predicted and actual length of a batch run, and measures the speed that calibrates the next prediction.
+
+    Args:
+        durations (list[float | None]): The audio duration of every file, in dispatch order.
+        slots (int): How many files are transcribed at once.
+        speed (float): Audio seconds one slot transcribes per wall-clock second.
+    """
+    def __init__(self, durations, slots, speed):
+        known = [duration for duration in durations if duration is not None]
+        self.predicted = predict_makespan(known, slots) / speed
+        self._lock = threading.Lock()
+        self._audio_seconds = 0.0
+        self._busy_seconds = 0.0
+        self._started = time.time()
+
+    def job_done(self, duration, seconds):
+        """
+        Records one finished file. Thread-safe.
+        """
+        if duration is None:
+            return
+        with self._lock:
+            self._audio_seconds += duration
+            self._busy_seconds += seconds
+
+    @property
+    def speed(self):
+        """
+        The measured audio seconds per slot-second, or None before any file has finished.
+        """
+        with self._lock:
+            return self._audio_seconds / self._busy_seconds if self._busy_seconds else None
+
+    def finish(self):
+        """
+        Prints the predicted and actual makespan.
+
+        Returns:
+            float: The actual makespan in seconds.
+        """
+        actual = time.time() - self._started
+        print(f"Makespan: predicted {self.predicted:.1f} s, actual {actual:.1f} s")
+        return actual
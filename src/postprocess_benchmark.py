@@ -0,0 +1,130 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+import argparse
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.subtitle_postprocess import postprocess
+from src.subtitles import format_timestamps
+
+
+def make_chunks(count, seed=0):
+    """
+    Builds a synthetic transcript with the defects the post-processing fixes: overlapping timestamps and repeated lines.
+
+    Some entries lie wholly inside the one before them, so the end of an entry is moved past its start.
+    """
+    rng = random.Random(seed)
+    words = "the of and to in is you that it he was for on are as with his they at be this".split()
+    chunks = []
+    time_point = 0.0
+    text = ""
+    for _ in range(count):
+        if chunks and rng.random() < 0.05:
+            # A short entry nested in the previous one
+            start = round(chunks[-1]['timestamp'][0] + rng.uniform(0.0, 0.2), 2)
+            end = round(start + rng.uniform(0.05, 0.2), 2)
+        else:
+            start = round(time_point + rng.uniform(-0.3, 0.4), 2)
+            end = round(start + rng.uniform(0.5, 2.5), 2)
+        if not text or rng.random() > 0.1:
+            text = " " + " ".join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+        chunks.append({'timestamp': (max(start, 0.0), end), 'text': text})
+        time_point = max(time_point, end)
+    return chunks
+
+
+def legacy_postprocess(chunks):
+    """
+    The string-based post-processing `server.convert_to_srt` used before, kept as the baseline.
+    """
+    def adjust_timestamps(subtitles):
+        adjusted_subtitles = []
+        for i, subtitle in enumerate(subtitles):
+            if i > 0:
+                prev_end = datetime.strptime(subtitles[i-1]['end'], '%H:%M:%S,%f')
+                curr_start = datetime.strptime(subtitle['start'], '%H:%M:%S,%f')
+                if prev_end >= curr_start:
+                    curr_start = prev_end + timedelta(milliseconds=1)
+                    subtitle['start'] = curr_start.strftime('%H:%M:%S,%f')[:-3]
+            adjusted_subtitles.append(subtitle)
+        return adjusted_subtitles
+
+    def is_similar(a, b, threshold=0.8):
+        return SequenceMatcher(None, a, b).ratio() > threshold
+
+    def remove_duplicates(subtitles, min_time_diff=1.0):
+        unique_subtitles = []
+        for i, subtitle in enumerate(subtitles):
+            if i > 0:
+                previous_subtitle = unique_subtitles[-1]
+                prev_start = datetime.strptime(previous_subtitle['start'], '%H:%M:%S,%f')
+                curr_start = datetime.strptime(subtitle['start'], '%H:%M:%S,%f')
+                start_time_diff = (curr_start - prev_start).total_seconds()
+                if is_similar(subtitle['text'], previous_subtitle['text']) and start_time_diff < min_time_diff:
+                    continue
+            unique_subtitles.append(subtitle)
+        return unique_subtitles
+
+    subtitles = []
+    for chunk in chunks:
+        start, end = chunk['timestamp']
+        subtitles.append({'start': start, 'end': end, 'text': chunk['text']})
+    starts = format_timestamps([subtitle['start'] for subtitle in subtitles])
+    ends = format_timestamps([subtitle['end'] for subtitle in subtitles])
+    for subtitle, start_format, end_format in zip(subtitles, starts, ends):
+        subtitle['start'], subtitle['end'] = start_format, end_format
+    subtitles = remove_duplicates(adjust_timestamps(subtitles))
+    return [(subtitle['start'], subtitle['end'], subtitle['text']) for subtitle in subtitles]
+
+
+def numeric_postprocess(chunks):
+    timeline = postprocess(chunks)
+    starts = format_timestamps([start / 1000 for start in timeline.starts])
+    ends = format_timestamps([end / 1000 for end in timeline.ends])
+    return list(zip(starts, ends, timeline.texts))
+
+
+def best_of(function, chunks, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        # The legacy code edits its input, so every run gets a fresh copy
+        copy = [dict(chunk) for chunk in chunks]
+        started = time.perf_counter()
+        result = function(copy)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the string-based and the integer millisecond subtitle post-processing.")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000, 40000], help="Transcript sizes to time (default: 1000 10000 40000)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per size; the fastest is reported (default: 3)")
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'legacy s':>10} {'numeric s':>10} {'speed-up':>9} {'kept':>7}")
+    for count in args.chunks:
+        chunks = make_chunks(count)
+        legacy_time, legacy_result = best_of(legacy_postprocess, chunks, args.repeats)
+        numeric_time, numeric_result = best_of(numeric_postprocess, chunks, args.repeats)
+        if legacy_result != numeric_result:
+            sys.exit(f"Outputs differ for {count} chunks")
+        print(f"{count:>8} {legacy_time:>10.3f} {numeric_time:>10.3f} {legacy_time / numeric_time:>8.1f}x {len(numeric_result):>7}")
+
+if __name__ == "__main__":
+    # Example Usage:
+    # python src/postprocess_benchmark.py
+    # python src/postprocess_benchmark.py --chunks 100000 --repeats 1
+    main()
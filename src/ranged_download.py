@@ -0,0 +1,275 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import urllib.request
+import urllib.error
+import threading
+import argparse
+import hashlib
+import time
+import re
+import os
+
+
+DEFAULT_PART_SIZE = 4 * 1024 * 1024
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_TIMEOUT = 30
+READ_SIZE = 256 * 1024
+
+_CONTENT_RANGE = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+class RangedDownload:
+    """
+    Downloads one HTTP resource as concurrent byte ranges, and lets a consumer read it in order while it downloads.
+
+    The file is split into parts of `part_size` bytes. Workers fetch the parts lowest first, so the
+    start of the file arrives first. `iter_bytes()` yields the file front to back as soon as each
+    part is complete, e.g. to pipe it into ffmpeg while the rest is still downloading. The file
+    also ends up complete at `output_path`.
+
+    Servers that ignore range requests are downloaded with a single plain GET instead.
+
+    Args:
+        url (str): The resource to download.
+        output_path (str): Where to save it.
+        headers (dict, optional): Extra request headers, e.g. the ones yt-dlp reports for a format.
+        workers (int): How many parts are fetched at once.
+        part_size (int): The size of each range request in bytes.
+        timeout (float): The socket timeout of each request in seconds.
+    """
+    def __init__(self, url, output_path, headers=None, workers=DEFAULT_DOWNLOAD_WORKERS, part_size=DEFAULT_PART_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.output_path = output_path
+        self.headers = dict(headers or {})
+        self.workers = workers
+        self.part_size = part_size
+        self.timeout = timeout
+        self.total_bytes = None
+        self.bytes_done = 0
+        self.content_hash = None
+        self._parts = []
+        self._done = []
+        self._next_part = 0
+        self._error = None
+        self._stopped = False
+        self._file = None
+        self._threads = []
+        self._condition = threading.Condition()
+
+    def _request(self, byte_range=None):
+        headers = dict(self.headers)
+        if byte_range:
+            headers['Range'] = "bytes=%d-%d" % byte_range
+        return urllib.request.urlopen(urllib.request.Request(self.url, headers=headers), timeout=self.timeout)
+
+    def start(self):
+        """
+        Finds the size of the resource and starts the workers. Called automatically by `iter_bytes()` and `wait()`.
+
+        Raises:
+            urllib.error.URLError: If the resource cannot be reached.
+        """
+        if self._file is not None:
+            return self
+        # Unbuffered, so a finished part can be read back through another handle straight away
+        self._file = open(self.output_path, 'w+b', buffering=0)
+        try:
+            response = self._request((0, self.part_size - 1))
+        except Exception:
+            self._file.close()
+            raise
+        match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+        if response.status == 206 and match:
+            self.total_bytes = int(match.group(1))
+            self._parts = [(start, min(start + self.part_size, self.total_bytes) - 1) for start in range(0, self.total_bytes, self.part_size)]
+            self._done = [False] * len(self._parts)
+            # The probe request already carries the first part
+            self._threads = [threading.Thread(target=self._save_part, args=(0, response), daemon=True)]
+            self._next_part = 1
+            self._threads += [threading.Thread(target=self._work, daemon=True) for _ in range(min(self.workers, len(self._parts)))]
+        else:
+            # No range support: one sequential download, reported as parts of whatever size arrives
+            self._threads = [threading.Thread(target=self._save_whole, args=(response,), daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _write(self, offset, data):
+        with self._condition:
+            self._file.seek(offset)
+            self._file.write(data)
+            self.bytes_done += len(data)
+
+    def _fail(self, error):
+        with self._condition:
+            if self._error is None:
+                self._error = error
+            self._condition.notify_all()
+
+    def _save_part(self, index, response):
+        start, end = self._parts[index]
+        offset = start
+        try:
+            with response:
+                while offset <= end:
+                    if self._stopped:
+                        return False  # Left unfinished, so it is never handed to a reader
+                    data = response.read(min(READ_SIZE, end + 1 - offset))
+                    if not data:
+                        raise IOError(f"Connection closed {end + 1 - offset} bytes before the end of part {index}")
+                    self._write(offset, data)
+                    offset += len(data)
+        except Exception as e:
+            self._fail(e)
+            return False
+        with self._condition:
+            self._done[index] = True
+            self._condition.notify_all()
+        return True
+
+    def _work(self):
+        while True:
+            with self._condition:
+                if self._stopped or self._error or self._next_part >= len(self._parts):
+                    return
+                index = self._next_part
+                self._next_part += 1
+            try:
+                response = self._request(self._parts[index])
+            except Exception as e:
+                self._fail(e)
+                return
+            if not self._save_part(index, response):
+                return
+
+    def _save_whole(self, response):
+        offset = 0
+        try:
+            with response:
+                while True:
+                    if self._stopped:
+                        return  # The length stays unknown, so a reader never takes the file as complete
+                    data = response.read(READ_SIZE)
+                    if not data:
+                        break
+                    self._write(offset, data)
+                    with self._condition:
+                        self._parts.append((offset, offset + len(data) - 1))
+                        self._done.append(True)
+                        self._condition.notify_all()
+                    offset += len(data)
+        except Exception as e:
+            self._fail(e)
+            return
+        with self._condition:
+            self.total_bytes = offset
+            self._condition.notify_all()
+
+    def iter_bytes(self):
+        """
+        Yields the file's bytes in order, each part as soon as it has fully arrived.
+
+        The content hash of everything yielded is kept in `content_hash` once the end is reached,
+        the same fingerprint `media_probe.file_fingerprint` gives the finished file.
+
+        Raises:
+            Exception: Whatever stopped the download.
+        """
+        self.start()
+        digest = hashlib.blake2b(digest_size=20)
+        index = 0
+        # Unbuffered too: a buffered reader can serve a later part from read-ahead taken before that part was written
+        with open(self.output_path, 'rb', buffering=0) as reader:
+            while True:
+                with self._condition:
+                    while not self._error and not (index < len(self._done) and self._done[index]) and not self._finished_locked(index):
+                        if self._stopped:
+                            raise IOError(f"Download of {self.url} was closed before part {index} arrived")
+                        self._condition.wait()
+                    if self._error:
+                        raise self._error
+                    if index >= len(self._done) or not self._done[index]:
+                        break
+                    start, end = self._parts[index]
+                reader.seek(start)
+                data = b""
+                while len(data) < end + 1 - start:
+                    chunk = reader.read(end + 1 - start - len(data))
+                    if not chunk:
+                        raise IOError(f"{self.output_path} ended inside part {index}")
+                    data += chunk
+                digest.update(data)
+                yield data
+                index += 1
+        self.content_hash = digest.hexdigest()
+
+    def _finished_locked(self, index):
+        return self.total_bytes is not None and index >= len(self._parts)
+
+    def wait(self):
+        """
+        Blocks until the whole file has been saved.
+
+        Returns:
+            str: `output_path`.
+
+        Raises:
+            Exception: Whatever stopped the download.
+        """
+        self.start()
+        for thread in self._threads:
+            thread.join()
+        with self._condition:
+            if self._error:
+                raise self._error
+            self._file.close()
+        return self.output_path
+
+    def close(self):
+        """
+        Stops the download early. The partial file is left in place, and a reader of `iter_bytes()` waiting for a part gets an error.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download a file over HTTP as concurrent byte ranges.")
+    parser.add_argument("url", help="The file to download, e.g. one served by `python -m http.server`")
+    parser.add_argument("output_file", help="Where to save it")
+    parser.add_argument("--workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS, help=f"Concurrent range requests (default: {DEFAULT_DOWNLOAD_WORKERS})")
+    parser.add_argument("--part-size", type=int, default=DEFAULT_PART_SIZE, help=f"Bytes per range request (default: {DEFAULT_PART_SIZE})")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    with RangedDownload(args.url, args.output_file, workers=args.workers, part_size=args.part_size) as download:
+        first_byte = None
+        for _ in download.iter_bytes():
+            first_byte = first_byte or time.time() - start_time
+        download.wait()
+    elapsed = time.time() - start_time
+    print(f"Downloaded {download.total_bytes} bytes in {elapsed:.2f} s ({download.total_bytes / max(elapsed, 1e-9) / 1024**2:.1f} MB/s), "
+          f"first part after {first_byte or 0:.2f} s, blake2b {download.content_hash}")
+
+if __name__ == "__main__":
+    # Example Usage:
+    # python src/ranged_download.py http://localhost:8000/talk.webm talk.webm --workers 8
+    main()
@@ -0,0 +1,150 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+from array import array
+import collections
+import json
+import re
+import os
+
+from src.subtitle_postprocess import Timeline
+
+
+DEFAULT_WINDOW_LINES = 30
+DEFAULT_WINDOW_MS = 5 * 60 * 1000
+DEFAULT_SHINGLE_SIZE = 3
+# Fraction of shared word shingles above which a line counts as a repeat
+DEFAULT_SIMILARITY_THRESHOLD = 0.7
+# Shorter lines ("Yes.", "Thank you.") repeat in real speech and are never flagged
+DEFAULT_MIN_WORDS = 4
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text, size=DEFAULT_SHINGLE_SIZE):
+    """
+    Returns the hashes of the overlapping word n-grams of a line, ignoring case and punctuation.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+class RepetitionDetector:
+    """
+    Finds lines that repeat a recent line, the way Whisper loops one phrase every few lines when it hallucinates.
+
+    Every kept line in the window is indexed by its word shingles. A new line looks up the lines that
+    share a shingle with it and scores each one by Jaccard similarity of their shingle sets. The work
+    per line depends on the line and the window, not on the length of the transcript, so a whole
+    transcript is checked in near-linear time.
+
+    Args:
+        window_lines (int): How many lines back a repeat is looked for.
+        window_ms (int): How far back in time a repeat is looked for, in milliseconds.
+        threshold (float): The Jaccard similarity, from 0 to 1, above which a line is a repeat.
+        shingle_size (int): Words per shingle.
+        min_words (int): Lines with fewer words are never flagged.
+    """
+    def __init__(self, window_lines=DEFAULT_WINDOW_LINES, window_ms=DEFAULT_WINDOW_MS, threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                 shingle_size=DEFAULT_SHINGLE_SIZE, min_words=DEFAULT_MIN_WORDS):
+        self.window_lines = window_lines
+        self.window_ms = window_ms
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+
+    @property
+    def settings(self):
+        return {
+            'window_lines': self.window_lines,
+            'window_ms': self.window_ms,
+            'threshold': self.threshold,
+            'shingle_size': self.shingle_size,
+            'min_words': self.min_words,
+        }
+
+    def collapse(self, timeline):
+        """
+        Removes the repeated lines from a timeline.
+
+        Args:
+            timeline (Timeline): The subtitles, e.g. from `subtitle_postprocess.postprocess`.
+
+        Returns:
+            tuple: A tuple containing:
+                - timeline (Timeline): The subtitles without the repeats.
+                - decisions (list[dict]): One entry per removed line, with its position, times and text,
+                  the line it repeats and their similarity.
+        """
+        starts, ends, texts = array('q'), array('q'), []
+        decisions = []
+        postings = collections.defaultdict(set)  # shingle -> positions of the window lines that contain it
+        window = collections.deque()  # (position, start, shingles) of the kept lines in the window
+        kept_shingles = {}
+
+        for position, (start, end, text) in enumerate(zip(timeline.starts, timeline.ends, timeline.texts)):
+            while window and (position - window[0][0] > self.window_lines or start - window[0][1] > self.window_ms):
+                old_position, _, old_shingles = window.popleft()
+                for shingle in old_shingles:
+                    postings[shingle].discard(old_position)
+                    if not postings[shingle]:
+                        del postings[shingle]
+                del kept_shingles[old_position]
+
+            line_shingles = shingles(text, self.shingle_size)
+            match = None
+            if line_shingles and len(_WORD.findall(text)) >= self.min_words:
+                shared = collections.Counter()
+                for shingle in line_shingles:
+                    shared.update(postings.get(shingle, ()))
+                best = 0.0
+                for other, count in shared.items():
+                    similarity = count / (len(line_shingles) + len(kept_shingles[other]) - count)
+                    if similarity > best:
+                        best, match = similarity, other
+                if best < self.threshold:
+                    match = None
+
+            if match is not None:
+                decisions.append({
+                    'line': position,
+                    'start': start / 1000,
+                    'end': end / 1000,
+                    'text': text,
+                    'repeat_of': match,
+                    'similarity': round(best, 3),
+                })
+                continue
+
+            starts.append(start)
+            ends.append(end)
+            texts.append(text)
+            window.append((position, start, line_shingles))
+            kept_shingles[position] = line_shingles
+            for shingle in line_shingles:
+                postings[shingle].add(position)
+
+        return Timeline(starts, ends, texts), decisions
+
+
+def write_decisions(decisions, output_path, settings=None):
+    """
+    Saves the lines a detector removed as JSON, so a transcript can be checked without reprocessing it.
+
+    Args:
+        decisions (list[dict]): From `RepetitionDetector.collapse`.
+        output_path (str): The JSON file to write.
+        settings (dict, optional): The detector settings the decisions were made with.
+    """
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({'settings': settings or {}, 'collapsed': decisions}, file, ensure_ascii=False, indent=1)
+    os.replace(temp_path, output_path)
@@ -0,0 +1,256 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import itertools
+import threading
+import difflib
+import re
+
+import numpy as np
+
+from src.audio_decode import SAMPLE_RATE, StreamingDecoder
+from src.transcription_backends import write_transcript
+
+
+DEFAULT_SEGMENT_SECONDS = 600  # 10 minutes
+DEFAULT_OVERLAP_SECONDS = 5
+DEFAULT_MIN_SPLIT_SECONDS = 900  # files up to 15 minutes stay in one job
+
+
+def offset_timestamp(timestamp, offset):
+    """
+    Shifts a window-relative (start, end) pair onto the file timeline. A None end is kept as None.
+    """
+    start, end = timestamp
+    start = None if start is None else round(start + offset, 2)
+    end = None if end is None else round(end + offset, 2)
+    return [start, end]
+
+
+def overlapping_windows(blocks, window_samples, overlap_samples):
+    """
+    Re-cuts consecutive blocks of audio, of any length, into windows that overlap the previous window by `overlap_samples`.
+
+    Only the blocks of the window being filled are held, so a stream can be cut without decoding all of it first.
+
+    Yields:
+        tuple[int, numpy.ndarray]: The first sample of the window on the file timeline, and the window.
+                                   Every window is `window_samples` long except the last.
+    """
+    step = window_samples - overlap_samples
+    pending = []  # blocks not yet in a window, the first one starting at `start`
+    pending_samples = 0
+    start = 0
+    covered = 0  # first sample not yet in any window
+    for block in blocks:
+        pending.append(block)
+        pending_samples += len(block)
+        while pending_samples >= window_samples:
+            buffer = np.concatenate(pending)
+            yield start, buffer[:window_samples]
+            covered = start + window_samples
+            pending = [buffer[step:]]
+            pending_samples -= step
+            start += step
+    if start + pending_samples > covered:
+        yield start, np.concatenate(pending)
+
+
+def split_segments(audio, segment_seconds=DEFAULT_SEGMENT_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS, sample_rate=SAMPLE_RATE):
+    """
+    Cuts a recording into segments that overlap their neighbours by `overlap_seconds`.
+
+    Returns:
+        list[tuple[float, numpy.ndarray]]: (offset in seconds, samples) for every segment, in order.
+    """
+    segment_samples = int(segment_seconds * sample_rate)
+    step = segment_samples - int(overlap_seconds * sample_rate)
+    segments = []
+    start = 0
+    while True:
+        segments.append((start / sample_rate, audio[start:start + segment_samples]))
+        if start + segment_samples >= len(audio):
+            return segments
+        start += step
+
+
+def _normalise(text):
+    return re.sub(r"[^\w\s]", "", text.lower()).split()
+
+
+def _is_repeat(previous, current, threshold=0.8):
+    """
+    True when two chunks on either side of a segment boundary are the same words transcribed twice.
+    """
+    if previous['timestamp'][1] is not None and current['timestamp'][0] > previous['timestamp'][1]:
+        return False
+    return difflib.SequenceMatcher(None, _normalise(previous['text']), _normalise(current['text'])).ratio() >= threshold
+
+
+def stitch_segments(segments):
+    """
+    Joins per-segment transcripts into one transcript on the original timeline.
+
+    Each overlap is split at its midpoint. A segment keeps the chunks that start between the
+    midpoints on either side of it, so words in the overlap are taken from exactly one segment.
+    A chunk that was transcribed by both segments, and so straddles the midpoint in both, is
+    detected by its text and kept once.
+
+    Args:
+        segments (list[tuple[float, float, dict]]): (offset, duration, transcript) for every segment, in order,
+                                                    with chunk timestamps relative to the segment start.
+
+    Returns:
+        dict: The stitched transcript in the insanely-fast-whisper layout.
+    """
+    chunks = []
+    for index, (offset, duration, transcript) in enumerate(segments):
+        lower = None
+        upper = None
+        if index > 0:
+            previous_offset, previous_duration, _ = segments[index - 1]
+            lower = (offset + previous_offset + previous_duration) / 2
+        if index + 1 < len(segments):
+            next_offset = segments[index + 1][0]
+            upper = (next_offset + offset + duration) / 2
+
+        segment_end = round(offset + duration, 2)
+        boundary = len(chunks)
+        for chunk in transcript['chunks']:
+            start, end = offset_timestamp(chunk['timestamp'], offset)
+            if start is None:
+                continue
+            if (lower is not None and start < lower) or (upper is not None and start >= upper):
+                continue
+            if end is None and upper is not None:
+                # Whisper leaves the last timestamp open when speech runs to the end of the audio
+                end = segment_end
+            current = dict(chunk, timestamp=[start, end])
+            if len(chunks) == boundary and chunks and _is_repeat(chunks[-1], current):
+                continue
+            chunks.append(current)
+
+    return {"speakers": [], "chunks": chunks, "text": "".join(chunk['text'] for chunk in chunks)}
+
+
+class SegmentedTranscriber:
+    """
+    Transcribes long recordings as independent, overlapping segments spread over every device.
+
+    A file longer than `min_split_seconds` is cut into `segment_seconds` segments that overlap by
+    `overlap_seconds`. Each segment is submitted to the pool as its own job without a device pin,
+    so the pool sends it to whichever device has the least work in flight. The finished segments are
+    stitched back together with absolute timestamps. The slowest job in a batch is then one segment,
+    not the longest file.
+
+    `transcribe()` streams the file through the decoder and submits each segment as soon as it has
+    been decoded, so a file is never held in memory whole. At most `max_segments_in_flight`
+    segments, over all the files being transcribed, are decoded and waiting for or in inference at
+    once; a caller that would go over waits before decoding more. Peak memory is then bounded by
+    that number of segments, not by the number of files in progress.
+
+    Args:
+        pool (TranscriptionPool): A pool whose backend supports decoded audio.
+        segment_seconds (float): The length of each segment.
+        overlap_seconds (float): How much consecutive segments overlap, so no word is lost at a cut.
+        min_split_seconds (float): Files up to this length are transcribed as a single job.
+        task (str): Either "transcribe" or "translate".
+        language (str): The spoken language of the audio.
+        max_segments_in_flight (int, optional): Defaults to two per pool worker, so every worker has the next segment ready.
+    """
+    def __init__(self, pool, segment_seconds=DEFAULT_SEGMENT_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS, min_split_seconds=DEFAULT_MIN_SPLIT_SECONDS, task="transcribe", language="en",
+                 max_segments_in_flight=None):
+        self.pool = pool
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.min_split_seconds = min_split_seconds
+        self.task = task
+        self.language = language
+        self.max_segments_in_flight = max_segments_in_flight or 2 * len(pool.device_ids) * pool.workers_per_device
+        self._slots = threading.BoundedSemaphore(self.max_segments_in_flight)
+
+    def transcribe_audio(self, audio, device_id=None):
+        """
+        Transcribes decoded audio, splitting it first if it is long.
+
+        Args:
+            audio (numpy.ndarray): 16 kHz mono float32 samples.
+            device_id (int, optional): Device for a file short enough to stay in one job. Segments are never pinned.
+
+        Returns:
+            dict: The transcript on the original timeline.
+        """
+        if len(audio) <= self.min_split_seconds * SAMPLE_RATE:
+            return self.pool.submit_audio(audio, self.task, self.language, device_id=device_id).result()
+
+        segments = split_segments(audio, self.segment_seconds, self.overlap_seconds)
+        futures = [self.pool.submit_audio(samples, self.task, self.language) for _, samples in segments]
+        concurrent.futures.wait(futures)
+        return stitch_segments([
+            (offset, len(samples) / SAMPLE_RATE, future.result())
+            for (offset, samples), future in zip(segments, futures)
+        ])
+
+    def _submit(self, audio, device_id=None):
+        # Called with a slot held; the slot is freed once the segment's samples are no longer needed
+        try:
+            future = self.pool.submit_audio(audio, self.task, self.language, device_id=device_id)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def transcribe(self, audio_path, output_path=None, device_id=None):
+        """
+        Streams a file through the decoder and transcribes it, in segments if it is long. See `transcribe_audio()`.
+        """
+        segment_samples = int(self.segment_seconds * SAMPLE_RATE)
+        overlap_samples = int(self.overlap_seconds * SAMPLE_RATE)
+        min_split_samples = int(self.min_split_seconds * SAMPLE_RATE)
+        segments = []
+        self._slots.acquire()
+        held = True  # a slot for the audio about to be decoded
+        try:
+            with StreamingDecoder(audio_path) as decoder:
+                # Read up to the split threshold to find out whether the file is split at all
+                blocks = iter(decoder)
+                head = []
+                head_samples = 0
+                for block in blocks:
+                    head.append(block)
+                    head_samples += len(block)
+                    if head_samples > min_split_samples:
+                        break
+                if head_samples <= min_split_samples:
+                    audio = np.concatenate(head) if head else np.zeros(0, np.float32)
+                    held = False
+                    transcript = self._submit(audio, device_id).result()
+                else:
+                    windows = overlapping_windows(itertools.chain(head, blocks), segment_samples, overlap_samples)
+                    while True:
+                        if not held:
+                            # Wait for a slot before decoding the next segment
+                            self._slots.acquire()
+                            held = True
+                        window = next(windows, None)
+                        if window is None:
+                            break
+                        start, samples = window
+                        held = False
+                        segments.append((start / SAMPLE_RATE, len(samples) / SAMPLE_RATE, self._submit(samples)))
+                    concurrent.futures.wait([future for _, _, future in segments])
+                    transcript = stitch_segments([(offset, duration, future.result()) for offset, duration, future in segments])
+        finally:
+            if held:
+                self._slots.release()
+        if output_path:
+            write_transcript(transcript, output_path)
+        return transcript
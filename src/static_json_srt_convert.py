@@ -7,54 +7,60 @@
 #-------------------------------------------------------------------#
 
 
-import json
 import argparse
+import time
+import sys
+import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.subtitles import DEFAULT_FORMATS, convert_files, convert_transcript, convert_to_srt, find_transcripts, parse_formats
 
-def format_seconds(seconds):
-    if seconds is None:
-        return "00:00:00,000"
-    whole_seconds = int(seconds)
-    milliseconds = int((seconds - whole_seconds) * 1000)
 
-    hours = whole_seconds // 3600
-    minutes = (whole_seconds % 3600) // 60
-    seconds = whole_seconds % 60
+def convert_directory(root, workers=None, overwrite=False, verbose=False, formats=DEFAULT_FORMATS):
+    """
+    Converts every transcript JSON under a directory tree to subtitles, in parallel on a process pool.
 
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+    Args:
+        root (str): The directory to search recursively.
+        workers (int, optional): The number of processes. Defaults to the number of CPUs.
+        overwrite (bool): If False, transcripts whose subtitle files are already up to date are skipped.
+        verbose (bool): If True, prints each entry as it is written.
+        formats (tuple[str]): The subtitle formats to write next to each JSON file.
 
-def convert_to_srt(input_path, output_path, verbose):
-    with open(input_path, 'r') as file:
-        data = json.load(file)
-
-    rst_string = ''
-    for index, chunk in enumerate(data['chunks'], 1):
-        text = chunk['text']
-        start, end = chunk.get('timestamp', [None, None])
-        if start is None or end is None:
-            print(f"Warning: Chunk {index} has missing timestamps. Skipping...")
-            continue
-        start_format, end_format = format_seconds(start), format_seconds(end)
-        srt_entry = f"{index}\n{start_format} --> {end_format}\n{text}\n\n"
-
-        if verbose:
-            print(srt_entry)
-
-        rst_string += srt_entry
-
-    with open(output_path, 'w', encoding='utf-8') as file:
-        file.write(rst_string)
+    Returns:
+        int: The number of files that failed to convert.
+    """
+    start_time = time.time()
+    json_paths = find_transcripts(root, formats, overwrite)
+    failed = 0
+    for json_path, _, error in convert_files(json_paths, formats, workers, verbose):
+        if error:
+            failed += 1
+            print(f"Failed to convert {json_path}: {error}")
+    print(f"Converted {len(json_paths) - failed} of {len(json_paths)} transcripts in {time.time() - start_time:.2f} seconds")
+    return failed
 
 def main():
     parser = argparse.ArgumentParser(description="Convert JSON to SRT format.")
-    parser.add_argument("input_file", help="Input JSON file path")
-    parser.add_argument("-o", "--output_file", default="output.srt", help="Output SRT file path (default: output.srt)")
+    parser.add_argument("input_file", help="Input JSON file path, or a directory to convert every transcript under")
+    parser.add_argument("-o", "--output_file", default="output.srt", help="Output SRT file path (default: output.srt). Ignored for a directory, where each SRT is written next to its JSON")
+    parser.add_argument("--workers", type=int, default=None, help="Directory mode: number of processes (default: one per CPU)")
+    parser.add_argument("--overwrite", action="store_true", help="Directory mode: also convert transcripts whose SRT file is up to date")
+    parser.add_argument("--formats", type=parse_formats, default=DEFAULT_FORMATS, help="Comma-separated subtitle formats to write: srt, vtt, tsv, txt (default: srt)")
     parser.add_argument("--verbose", action="store_true", help="Print each SRT entry as it's added")
 
     args = parser.parse_args()
-    convert_to_srt(args.input_file, args.output_file, args.verbose)
+    if os.path.isdir(args.input_file):
+        sys.exit(1 if convert_directory(args.input_file, args.workers, args.overwrite, args.verbose, args.formats) else 0)
+    if args.formats == ('srt',):
+        convert_to_srt(args.input_file, args.output_file, args.verbose)
+    else:
+        # One file per format, named after the output file
+        convert_transcript(args.input_file, args.formats, os.path.splitext(args.output_file)[0], args.verbose)
 
 if __name__ == "__main__":
     # Example Usage: 
     # python convert_srt.py output.json -o my_caption.srt
+    # python convert_srt.py output.json -o my_caption.srt --formats srt,vtt,txt
+    # python convert_srt.py Videos --workers 8
     main()
\ No newline at end of file
@@ -0,0 +1,119 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+from difflib import SequenceMatcher
+from array import array
+
+
+# A subtitle starts at least this long after the previous one ends
+DEFAULT_MIN_GAP_MS = 1
+# Similar subtitles starting closer together than this are treated as repeats
+DEFAULT_DUPLICATE_WINDOW_MS = 1000
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+
+
+class Timeline:
+    """
+    Subtitle timings as integer millisecond arrays, with the text of each entry alongside.
+
+    All post-processing rules work on these arrays. Times are only formatted as strings when the
+    subtitles are written, so nothing is parsed back and there is no limit at 24 hours.
+
+    Args:
+        starts (array): Start of every entry, in milliseconds.
+        ends (array): End of every entry, in milliseconds.
+        texts (list[str]): Text of every entry.
+    """
+    def __init__(self, starts, ends, texts):
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Builds a timeline from transcript chunks, skipping chunks without both timestamps.
+        """
+        starts, ends, texts = array('q'), array('q'), []
+        for index, chunk in enumerate(chunks, 1):
+            start, end = chunk.get('timestamp') or (None, None)
+            if start is None or end is None:
+                print(f"Warning: Chunk {index} has missing timestamps. Skipping...")
+                continue
+            starts.append(int(start * 1000 + 0.5))
+            ends.append(int(end * 1000 + 0.5))
+            texts.append(chunk['text'])
+        return cls(starts, ends, texts)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def chunks(self):
+        """
+        Yields the entries as transcript chunks, ready for `subtitles.write_formats`.
+        """
+        for start, end, text in zip(self.starts, self.ends, self.texts):
+            yield {'timestamp': (start / 1000, end / 1000), 'text': text}
+
+
+def fix_overlaps(timeline, min_gap_ms=DEFAULT_MIN_GAP_MS):
+    """
+    Moves the start of every entry to at least `min_gap_ms` after the end of the entry before it.
+
+    Ends are left as they are, like the server always did, so an entry that lies wholly inside the
+    one before it ends up ending before it starts. Works in place.
+    """
+    starts, ends = timeline.starts, timeline.ends
+    for i in range(1, len(starts)):
+        earliest = ends[i - 1] + min_gap_ms
+        if starts[i] < earliest:
+            starts[i] = earliest
+    return timeline
+
+
+def _similar(a, b, threshold):
+    matcher = SequenceMatcher(None, a, b)
+    return matcher.real_quick_ratio() > threshold and matcher.quick_ratio() > threshold and matcher.ratio() > threshold
+
+
+def remove_near_duplicates(timeline, window_ms=DEFAULT_DUPLICATE_WINDOW_MS, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """
+    Drops entries that repeat the text of the last kept entry and start within `window_ms` of it.
+
+    The cheap time check runs first, so text similarity is only computed for entries that are close together,
+    and the similarity upper bounds of `SequenceMatcher` rule out most pairs before the full comparison.
+
+    Returns:
+        Timeline: A new timeline with the repeats removed.
+    """
+    starts, ends, texts = array('q'), array('q'), []
+    for start, end, text in zip(timeline.starts, timeline.ends, timeline.texts):
+        if texts and start - starts[-1] < window_ms and _similar(text, texts[-1], threshold):
+            continue
+        starts.append(start)
+        ends.append(end)
+        texts.append(text)
+    return Timeline(starts, ends, texts)
+
+
+def postprocess(chunks, min_gap_ms=DEFAULT_MIN_GAP_MS, window_ms=DEFAULT_DUPLICATE_WINDOW_MS, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """
+    Applies the server's subtitle clean-up to transcript chunks: overlaps are fixed first, then near-duplicates removed.
+
+    Args:
+        chunks (iterable[dict]): Transcript chunks, e.g. from `subtitles.iter_chunks`.
+        min_gap_ms (int): The smallest gap between one entry's end and the next entry's start.
+        window_ms (int): Similar entries starting closer together than this are dropped.
+        threshold (float): The text similarity, from 0 to 1, above which two entries count as the same.
+
+    Returns:
+        Timeline: The cleaned-up subtitles.
+    """
+    timeline = fix_overlaps(Timeline.from_chunks(chunks), min_gap_ms)
+    return remove_near_duplicates(timeline, window_ms, threshold)
@@ -0,0 +1,404 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import json
+import re
+import os
+
+
+READ_BLOCK_SIZE = 64 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+# Entries formatted before each write
+WRITE_BATCH = 512
+
+FORMATS = ('srt', 'vtt', 'tsv', 'txt')
+DEFAULT_FORMATS = ('srt',)
+
+_SKIP = {'': re.compile(r'[ \t\r\n]*'), ',': re.compile(r'[ \t\r\n,]*')}
+# The characters that matter when skipping a value: inside a string, and outside one
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURE = re.compile(r'["\[\]{}]')
+# A number or literal ends at the first of these
+_SCALAR_END = re.compile(r'[,\]}\s]')
+_decoder = json.JSONDecoder()
+
+
+def format_timestamp(seconds, separator=','):
+    """
+    Formats a time in seconds as "HH:MM:SS,mmm", rounded to the millisecond. None formats as zero.
+    """
+    return format_timestamps([seconds], separator)[0]
+
+
+def format_timestamps(values, separator=','):
+    """
+    Formats many times at once. See `format_timestamp`.
+
+    Consecutive subtitle times mostly fall in the same few seconds, so the "HH:MM:SS" part is
+    formatted once per distinct second and reused.
+    """
+    prefixes = {}
+    formatted = []
+    for value in values:
+        whole, milliseconds = divmod(int(value * 1000 + 0.5) if value is not None else 0, 1000)
+        prefix = prefixes.get(whole)
+        if prefix is None:
+            prefix = prefixes[whole] = '%02d:%02d:%02d%s' % (whole // 3600, whole // 60 % 60, whole % 60, separator)
+        formatted.append('%s%03d' % (prefix, milliseconds))
+    return formatted
+
+
+class _JsonStream:
+    """
+    Decodes JSON values one at a time from a file, holding at most one block plus one value in memory.
+    """
+    def __init__(self, file, block_size=READ_BLOCK_SIZE):
+        self.file = file
+        self.block_size = block_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        data = self.file.read(self.block_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        return True
+
+    def peek(self, skip=''):
+        """
+        Skips whitespace (and any characters in `skip`) and returns the next character, or None at the end.
+        """
+        while True:
+            self.position = _SKIP[skip].match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return None
+
+    def expect(self, character, skip=''):
+        if self.peek(skip) != character:
+            raise ValueError(f"Expected '{character}' at offset {self.position} of the transcript")
+        self.position += 1
+
+    def value(self):
+        """
+        Decodes the next JSON value.
+        """
+        if self.peek() not in ('"', '[', '{'):
+            # A number may continue in the next block, and a prefix of it ("-0.") decodes as a shorter number
+            while not self.eof and not _SCALAR_END.search(self.buffer, self.position):
+                self._fill()
+        while True:
+            try:
+                value, self.position = _decoder.raw_decode(self.buffer, self.position)
+                return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def skip(self):
+        """
+        Steps over the next JSON value without decoding it.
+
+        Strings, arrays and objects are scanned a block at a time and never held whole, so a
+        value as long as the transcript itself (the top-level "text") costs one pass over it.
+        """
+        if self.peek() not in ('"', '[', '{'):
+            self.value()
+            return
+        depth = 0
+        in_string = False
+        while True:
+            if self.position >= len(self.buffer) and not self._fill():
+                raise ValueError("Unexpected end of the transcript")
+            if in_string:
+                match = _STRING_SPECIAL.search(self.buffer, self.position)
+                if match is None:
+                    self.position = len(self.buffer)
+                elif match.group() == '\\':
+                    if match.end() == len(self.buffer):
+                        # The escaped character is in the next block
+                        self.position = match.start()
+                        if not self._fill():
+                            raise ValueError("Unexpected end of the transcript")
+                    else:
+                        self.position = match.end() + 1
+                else:
+                    self.position = match.end()
+                    in_string = False
+                    if depth == 0:
+                        return
+            else:
+                match = _STRUCTURE.search(self.buffer, self.position)
+                if match is None:
+                    self.position = len(self.buffer)
+                    continue
+                self.position = match.end()
+                if match.group() == '"':
+                    in_string = True
+                elif match.group() in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return
+
+
+def iter_chunks(input_path, block_size=READ_BLOCK_SIZE):
+    """
+    Yields the entries of a transcript's "chunks" array one at a time, without loading the whole file.
+
+    Other top-level keys are skipped wherever they appear, so any key order works, and without
+    being decoded, so the full "text" is never held in memory.
+
+    Args:
+        input_path (str): A transcript JSON file in the insanely-fast-whisper layout.
+        block_size (int): How many characters are read at a time.
+
+    Yields:
+        dict: Each chunk, with "timestamp" and "text".
+    """
+    with open(input_path, 'r', encoding='utf-8') as file:
+        stream = _JsonStream(file, block_size)
+        stream.expect('{')
+        while stream.peek(',') not in ('}', None):
+            key = stream.value()
+            stream.expect(':')
+            if key != 'chunks':
+                stream.skip()
+                continue
+            stream.expect('[')
+            while stream.peek(',') != ']':
+                yield stream.value()
+            stream.expect(']')
+
+
+def _srt_entries(batch, stamps):
+    return [f"{index}\n{stamps[2 * i]} --> {stamps[2 * i + 1]}\n{text}\n\n" for i, (index, _, _, text) in enumerate(batch)]
+
+
+def _vtt_entries(batch, stamps):
+    return [
+        f"{stamps[2 * i].replace(',', '.')} --> {stamps[2 * i + 1].replace(',', '.')}\n{text.strip()}\n\n"
+        for i, (_, _, _, text) in enumerate(batch)
+    ]
+
+
+def _tsv_entries(batch, stamps):
+    return [
+        f"{int(start * 1000 + 0.5)}\t{int(end * 1000 + 0.5)}\t{' '.join(text.split())}\n"
+        for _, start, end, text in batch
+    ]
+
+
+def _txt_entries(batch, stamps):
+    return [f"{text.strip()}\n" for _, _, _, text in batch]
+
+
+# Format -> (header, entry formatter)
+_WRITERS = {
+    'srt': ('', _srt_entries),
+    'vtt': ('WEBVTT\n\n', _vtt_entries),
+    'tsv': ('start\tend\ttext\n', _tsv_entries),
+    'txt': ('', _txt_entries),
+}
+
+
+def subtitle_paths(output_base, formats=DEFAULT_FORMATS):
+    """
+    Returns the output path of every format, e.g. {'srt': 'talk.srt'} for the base 'talk'.
+
+    Raises:
+        ValueError: If a format is not one of `FORMATS`.
+    """
+    unknown = [fmt for fmt in formats if fmt not in _WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown subtitle format(s) {', '.join(unknown)}. Choose from {', '.join(FORMATS)}")
+    return {fmt: f"{output_base}.{fmt}" for fmt in formats}
+
+
+def write_formats(chunks, paths, verbose=False):
+    """
+    Writes chunks to several subtitle formats in one pass.
+
+    Each batch of chunks has its timestamps formatted once, and every format's entries are built from
+    that. Each file goes through its own buffered writer into a temp file, which is renamed into place
+    only when the whole transcript has been written. A failure therefore never leaves partial output.
+
+    Args:
+        chunks (iterable[dict]): Transcript chunks, e.g. from `iter_chunks`. Chunks without both timestamps are skipped.
+        paths (dict[str, str]): The output path of each format, see `subtitle_paths`.
+        verbose (bool): If True, prints each entry of the first format as it is written.
+
+    Returns:
+        int: The number of entries written to each file.
+    """
+    written = 0
+    batch = []
+    temp_paths = {fmt: f"{path}.tmp" for fmt, path in paths.items()}
+    files = {}
+
+    def flush():
+        stamps = format_timestamps([time for _, start, end, _ in batch for time in (start, end)]) if {'srt', 'vtt'} & set(files) else None
+        for position, (fmt, file) in enumerate(files.items()):
+            entries = _WRITERS[fmt][1](batch, stamps)
+            if verbose and position == 0:
+                for entry in entries:
+                    print(entry)
+            file.write(''.join(entries))
+        count = len(batch)
+        batch.clear()
+        return count
+
+    try:
+        for fmt, temp_path in temp_paths.items():
+            files[fmt] = open(temp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+            files[fmt].write(_WRITERS[fmt][0])
+        for index, chunk in enumerate(chunks, 1):
+            start, end = chunk.get('timestamp') or (None, None)
+            if start is None or end is None:
+                print(f"Warning: Chunk {index} has missing timestamps. Skipping...")
+                continue
+            batch.append((index, start, end, chunk['text']))
+            if len(batch) >= WRITE_BATCH:
+                written += flush()
+        written += flush()
+        for fmt, file in files.items():
+            file.close()
+            os.replace(temp_paths[fmt], paths[fmt])
+    finally:
+        for fmt, file in files.items():
+            file.close()
+            if os.path.exists(temp_paths[fmt]):
+                os.remove(temp_paths[fmt])
+    return written
+
+
+def write_subtitles(chunks, output_base, formats=DEFAULT_FORMATS, verbose=False):
+    """
+    Writes chunks as `<output_base>.<format>` for every requested format. See `write_formats`.
+
+    Returns:
+        dict[str, str]: The path written for each format.
+    """
+    paths = subtitle_paths(output_base, formats)
+    write_formats(chunks, paths, verbose)
+    return paths
+
+
+def write_srt(chunks, output_path, verbose=False):
+    """
+    Writes chunks as a single SRT file. See `write_formats`.
+
+    Returns:
+        int: The number of entries written.
+    """
+    return write_formats(chunks, {'srt': output_path}, verbose)
+
+
+def convert_transcript(input_path, formats=DEFAULT_FORMATS, output_base=None, verbose=False):
+    """
+    Parses a transcript JSON file once and writes every requested subtitle format from it.
+
+    Memory use does not grow with the length of the transcript.
+
+    Args:
+        input_path (str): The transcript JSON file.
+        formats (tuple[str]): Any of `FORMATS`.
+        output_base (str, optional): The output path without extension. Defaults to the JSON path without extension.
+        verbose (bool): If True, prints each entry of the first format as it is written.
+
+    Returns:
+        dict[str, str]: The path written for each format.
+    """
+    output_base = output_base or os.path.splitext(input_path)[0]
+    return write_subtitles(iter_chunks(input_path), output_base, formats, verbose)
+
+
+def convert_to_srt(input_path, output_path, verbose=False):
+    """
+    Converts a transcript JSON file to SRT. Memory use does not grow with the length of the transcript.
+
+    Returns:
+        int: The number of entries written.
+    """
+    return write_srt(iter_chunks(input_path), output_path, verbose)
+
+
+def _convert_task(task):
+    json_path, formats, verbose = task
+    try:
+        return json_path, convert_transcript(json_path, formats, verbose=verbose), None
+    except (OSError, ValueError, KeyError) as e:
+        return json_path, {}, str(e)
+
+
+def convert_files(json_paths, formats=DEFAULT_FORMATS, max_workers=None, verbose=False):
+    """
+    Converts many transcripts on a process pool, writing each requested format next to its JSON file.
+
+    Args:
+        json_paths (list[str]): The transcripts to convert.
+        formats (tuple[str]): Any of `FORMATS`.
+        max_workers (int, optional): The number of processes. Defaults to the number of CPUs.
+        verbose (bool): If True, prints each entry as it is written.
+
+    Yields:
+        tuple: (JSON path, {format: path}, error) for every file as it finishes. `error` is None on success.
+    """
+    subtitle_paths('', formats)  # Reject unknown formats before starting any work
+    tasks = [(json_path, tuple(formats), verbose) for json_path in json_paths]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if max_workers <= 1:
+        # Not worth starting processes for
+        yield from map(_convert_task, tasks)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(_convert_task, tasks, chunksize=max(1, len(tasks) // (max_workers * 4)))
+
+
+def find_transcripts(root, formats=DEFAULT_FORMATS, overwrite=False):
+    """
+    Finds every transcript JSON under a directory that is missing one of the requested formats.
+
+    Args:
+        root (str): The directory to search recursively.
+        formats (tuple[str]): Any of `FORMATS`.
+        overwrite (bool): If False, skip transcripts whose outputs are all newer than the JSON.
+
+    Returns:
+        list[str]: The transcripts to convert.
+    """
+    json_paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith('.json'):
+                continue
+            json_path = os.path.join(directory, name)
+            json_mtime = os.path.getmtime(json_path)
+            outputs = subtitle_paths(os.path.splitext(json_path)[0], formats).values()
+            if not overwrite and all(os.path.exists(path) and os.path.getmtime(path) >= json_mtime for path in outputs):
+                continue
+            json_paths.append(json_path)
+    return json_paths
+
+
+def parse_formats(value):
+    """
+    Parses a comma-separated format list from the command line, e.g. "srt,vtt".
+    """
+    formats = tuple(dict.fromkeys(fmt.strip().lower() for fmt in value.split(',') if fmt.strip()))
+    subtitle_paths('', formats)
+    return formats
@@ -0,0 +1,326 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+from src.audio_decode import SAMPLE_RATE, StreamingDecoder
+from src.media_probe import file_fingerprint
+from src.transcription_backends import DEFAULT_CHUNK_LENGTH, DEFAULT_MODEL_NAME, write_transcript
+
+
+DEFAULT_CACHE_DIR = "transcript_cache"
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024**3  # 2 GB of transcript JSON
+
+
+def fingerprinted(blocks, digest):
+    """
+    Passes decoded 16 kHz mono blocks through unchanged, hashing their samples into `digest` on the way.
+
+    The same audio in a different container, bit rate or file name decodes to the same samples and
+    therefore the same fingerprint. The hash does not depend on how the audio is cut into blocks.
+    """
+    for block in blocks:
+        digest.update(block.tobytes())
+        yield block
+
+
+def transcript_key(audio_hash, model_name, task, language, variant=""):
+    """
+    Builds the cache key for a transcript of some decoded audio under the given model settings.
+
+    `variant` separates transcripts of the same audio produced by different pipelines (e.g. with the VAD pre-pass).
+    """
+    return hashlib.sha256(f"{audio_hash}|{model_name}|{task}|{language}|{variant}".encode()).hexdigest()
+
+
+class TranscriptCache:
+    """
+    A size-bounded, least-recently-used store of transcript JSON, keyed by content.
+
+    Transcripts live as `<key>.json` files in `cache_dir`. A small SQLite index next to them records
+    each entry's size and last access time, so eviction never has to scan the directory. The index
+    also maps source file fingerprints to decoded-audio fingerprints, which lets a byte-identical
+    file hit the cache without being decoded at all.
+
+    Args:
+        cache_dir (str): The directory holding the transcripts and the index.
+        max_bytes (int): The total transcript size to keep before the least recently used entries are evicted.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, audio_hash TEXT, size INTEGER, last_access REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_by_access ON entries (last_access)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS aliases (source_hash TEXT PRIMARY KEY, audio_hash TEXT)")
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Returns the cached transcript for `key`, or None on a miss.
+        """
+        try:
+            with open(self._path(key), 'r', encoding='utf8') as file:
+                transcript = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        with self._lock, self._db:
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return transcript
+
+    def put(self, key, audio_hash, transcript):
+        """
+        Stores a transcript, then evicts least recently used entries until the cache fits `max_bytes`.
+        """
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        write_transcript(transcript, temp_path)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self._lock, self._db:
+            previous = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, audio_hash, size, time.time()))
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes:
+            row = self._db.execute("SELECT key, audio_hash, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            key, audio_hash, size = row
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if not self._db.execute("SELECT 1 FROM entries WHERE audio_hash = ? LIMIT 1", (audio_hash,)).fetchone():
+                self._db.execute("DELETE FROM aliases WHERE audio_hash = ?", (audio_hash,))
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get_alias(self, source_hash):
+        """
+        Returns the decoded-audio fingerprint recorded for a source file fingerprint, or None.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT audio_hash FROM aliases WHERE source_hash = ?", (source_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put_alias(self, source_hash, audio_hash):
+        """
+        Records that a source file decodes to the given audio.
+        """
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (source_hash, audio_hash))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachingTranscriber:
+    """
+    Puts a `TranscriptCache` in front of the worker pool.
+
+    A lookup first fingerprints the raw file. If that file has been seen before, the transcript
+    comes straight from the cache with no ffmpeg and no GPU work.
+
+    Otherwise, with a batcher, the file is decoded once and its blocks are streamed straight into
+    the batcher while the decoded samples are hashed, so inference starts on the first window and
+    no more of the file is held in memory than the batcher is waiting on. Once the decode ends the
+    audio hash is looked up, so the same audio under another name or in another container still
+    hits, and the windows already queued are cancelled. Backends that read the file themselves
+    are keyed on the raw-file fingerprint alone, so the file is never decoded just to be hashed.
+
+    Args:
+        cache (TranscriptCache): The cache to read and fill.
+        pool (TranscriptionPool): The pool that runs the model on a miss.
+        batcher (CrossFileBatcher, optional): Used on a miss when the backend accepts decoded windows.
+        task (str): Either "transcribe" or "translate".
+        language (str): The spoken language of the audio.
+    """
+    def __init__(self, cache, pool, batcher=None, task="transcribe", language="en"):
+        self.cache = cache
+        self.pool = pool
+        self.batcher = batcher
+        self.task = task
+        self.language = language
+        self.model_name = pool.backend_options.get('model_name', DEFAULT_MODEL_NAME)
+        self.variant = "vad" if batcher and batcher.vad else ""
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, audio_hash):
+        return transcript_key(audio_hash, self.model_name, self.task, self.language, self.variant)
+
+    def _stream(self, name, source):
+        """
+        Decodes `source` into the batcher, hashing the samples on the way.
+
+        Returns:
+            tuple: The batcher's future for the file and the audio hash.
+
+        Raises:
+            RuntimeError: If `source` could not be decoded. The windows already queued are dropped.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        decode_errors = []
+
+        def blocks(decoder):
+            try:
+                yield from fingerprinted(decoder, digest)
+            except Exception as e:
+                decode_errors.append(e)
+                raise
+
+        with StreamingDecoder(source, block_seconds=self.batcher.block_samples / SAMPLE_RATE) as decoder:
+            future = self.batcher.add_windows(name, blocks(decoder))
+        if decode_errors:
+            raise decode_errors[0]
+        return future, digest.hexdigest()
+
+    def _decode_into_batcher(self, audio_path, stream):
+        if stream is not None:
+            try:
+                return self._stream(audio_path, stream)
+            except RuntimeError as e:
+                # Some containers (e.g. MP4 with its index at the end) cannot be decoded front to back,
+                # so let the download finish and decode the file instead
+                print(f"Streaming decode of {audio_path} failed, decoding the finished file: {e}")
+                for _ in stream:
+                    pass
+        return self._stream(audio_path, audio_path)
+
+    def prepare(self, audio_path, use_cache=True, source_hash=None, stream=None):
+        """
+        Does everything a transcription needs before its result is collected: the cache lookups and, on a miss with a batcher, the decode.
+
+        The decoded windows are queued on the batcher as they are produced, so by the time this
+        returns the model is already working on them. Splitting this from `complete()` lets a server
+        decode the next files on other threads while it waits for the current one. Arguments are as
+        for `transcribe()`.
+
+        Returns:
+            dict: The prepared transcription, to pass to `complete()`. `transcript` is set on a cache hit.
+                  `needs_file` is False once `audio_path` will not be read again, so it can be deleted.
+        """
+        prepared = {'audio_path': audio_path, 'transcript': None, 'future': None, 'key': None, 'audio_hash': None, 'needs_file': False}
+
+        if not self.batcher:
+            # The pool decodes the file itself, so the raw file is the key
+            if stream is not None:
+                for _ in stream:
+                    pass
+            source_hash = source_hash or file_fingerprint(audio_path)
+            audio_hash = f"file:{source_hash}"
+            prepared.update(key=self._key(audio_hash), audio_hash=audio_hash, needs_file=True)
+            prepared['transcript'] = self.cache.get(prepared['key']) if use_cache else None
+            if prepared['transcript'] is not None:
+                self.hits += 1
+            return prepared
+
+        if stream is None:
+            source_hash = source_hash or file_fingerprint(audio_path)
+        audio_hash = self.cache.get_alias(source_hash) if use_cache and source_hash else None
+        if audio_hash:
+            prepared['transcript'] = self.cache.get(self._key(audio_hash))
+        if prepared['transcript'] is not None:
+            self.hits += 1
+            return prepared
+
+        future, audio_hash = self._decode_into_batcher(audio_path, stream)
+        key = self._key(audio_hash)
+        if source_hash:
+            self.cache.put_alias(source_hash, audio_hash)
+        prepared.update(key=key, audio_hash=audio_hash, transcript=self.cache.get(key) if use_cache else None)
+        if prepared['transcript'] is not None:
+            # The same audio under another name: drop the windows still queued for it
+            self.batcher.cancel(future)
+            self.hits += 1
+        else:
+            prepared['future'] = future
+        return prepared
+
+    def add_source(self, prepared, source_hash):
+        """
+        Records the raw-file fingerprint of a file that was prepared from a stream, once it is known.
+
+        The next copy of the same bytes is then served from the cache without being decoded.
+
+        Args:
+            prepared (dict): From `prepare()`.
+            source_hash (str): The file's `file_fingerprint`, e.g. `RangedDownload.content_hash`.
+        """
+        if self.batcher and prepared['audio_hash'] and source_hash:
+            self.cache.put_alias(source_hash, prepared['audio_hash'])
+
+    def complete(self, prepared, output_path=None):
+        """
+        Waits for the model on a prepared miss and stores the result, or just returns a prepared hit.
+
+        Args:
+            prepared (dict): From `prepare()`.
+            output_path (str, optional): Where to write the transcript JSON.
+
+        Returns:
+            dict: The transcript.
+        """
+        transcript = prepared['transcript']
+        if transcript is None:
+            self.misses += 1
+            if prepared['future'] is not None:
+                transcript = prepared['future'].result()
+            else:
+                transcript = self.pool.submit(prepared['audio_path'], task=self.task, language=self.language).result()
+            self.cache.put(prepared['key'], prepared['audio_hash'], transcript)
+
+        if output_path:
+            write_transcript(transcript, output_path)
+        return transcript
+
+    def transcribe(self, audio_path, output_path=None, use_cache=True, source_hash=None, stream=None):
+        """
+        Returns the transcript for a file, from the cache when possible.
+
+        Args:
+            audio_path (str): The audio or video file to transcribe.
+            output_path (str, optional): Where to write the transcript JSON.
+            use_cache (bool): If False, always run the model. The fresh result still refreshes the cache.
+            source_hash (str, optional): The file's `file_fingerprint`, if the caller has already computed it.
+            stream (iterable[bytes], optional): The file's bytes while it is still being written to `audio_path`, e.g.
+                                                `RangedDownload.iter_bytes()`. Decoding starts on the first bytes.
+                                                The raw-file lookup is skipped, since the file cannot be hashed yet.
+
+        Returns:
+            dict: The transcript.
+        """
+        return self.complete(self.prepare(audio_path, use_cache, source_hash, stream), output_path)
+
+    def add_file(self, audio_path, output_path=None):
+        """
+        Same call shape as `CrossFileBatcher.add_file`: transcribes (or looks up) a file and returns a done future.
+        """
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(self.transcribe(audio_path, output_path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
@@ -0,0 +1,276 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import subprocess
+import tempfile
+import time
+import json
+import os
+
+
+DEFAULT_MODEL_NAME = "openai/whisper-large-v3"
+DEFAULT_BATCH_SIZE = 24
+DEFAULT_CHUNK_LENGTH = 30
+
+
+class TranscriptionBackend:
+    """
+    Base class for a transcription backend.
+
+    A backend is owned by exactly one pool worker. The worker calls `load()` once when it
+    starts, then `transcribe()` for every job it takes from the queue, and `close()` on shutdown.
+
+    Args:
+        device_id (int): The CUDA device index the backend should run on.
+        model_name (str): The Hugging Face model identifier to load.
+        batch_size (int): The number of 30 second windows to run through the model at once.
+    """
+    name = "base"
+    supports_windows = False
+
+    def __init__(self, device_id=0, model_name=DEFAULT_MODEL_NAME, batch_size=DEFAULT_BATCH_SIZE):
+        self.device_id = device_id
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def load(self):
+        """
+        Loads the model. Called once by the owning worker before it takes any jobs.
+        """
+
+    def transcribe(self, audio_path, task="transcribe", language="en"):
+        """
+        Transcribes a single audio or video file.
+
+        Args:
+            audio_path (str): Path to the file to transcribe.
+            task (str): Either "transcribe" or "translate".
+            language (str): The spoken language of the audio.
+
+        Returns:
+            dict: A transcript in the insanely-fast-whisper layout with "speakers", "chunks" and "text" keys.
+        """
+        raise NotImplementedError
+
+    def transcribe_audio(self, audio, task="transcribe", language="en"):
+        """
+        Transcribes decoded audio of any length. Only available when `supports_windows` is True.
+
+        Args:
+            audio (numpy.ndarray): 16 kHz mono float32 samples.
+            task (str): Either "transcribe" or "translate".
+            language (str): The spoken language of the audio.
+
+        Returns:
+            dict: A transcript with timestamps relative to the start of `audio`.
+        """
+        raise NotImplementedError(f"The '{self.name}' backend cannot transcribe decoded audio")
+
+    def transcribe_windows(self, windows, task="transcribe", language="en"):
+        """
+        Transcribes a batch of decoded audio windows in a single forward pass.
+
+        Only available when `supports_windows` is True. Windows may come from different files,
+        so every returned timestamp is relative to the start of its own window.
+
+        Args:
+            windows (list[numpy.ndarray]): 16 kHz mono float32 windows, each at most 30 seconds long.
+            task (str): Either "transcribe" or "translate".
+            language (str): The spoken language of the audio.
+
+        Returns:
+            list[list[dict]]: The timestamped chunks of each window, in the same order as `windows`.
+        """
+        raise NotImplementedError(f"The '{self.name}' backend cannot transcribe decoded audio windows")
+
+    def close(self):
+        """
+        Releases any resources held by the backend.
+        """
+
+
+class CLIBackend(TranscriptionBackend):
+    """
+    Runs the `insanely-fast-whisper` command line tool once per job.
+
+    This is the behaviour the batch scripts and the server had before the worker pool existed.
+    The model is reloaded by every invocation, so it is only worth using when the CLI is installed
+    in an environment the pool cannot import from (e.g. through pipx).
+    """
+    name = "cli"
+
+    def transcribe(self, audio_path, task="transcribe", language="en"):
+        fd, transcript_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            subprocess.run(
+                f'insanely-fast-whisper --file-name "{audio_path}" --model-name {self.model_name} --task {task} --language {language} --device-id {self.device_id} --batch-size {self.batch_size} --transcript-path "{transcript_path}"',
+                shell=True,
+                check=True
+            )
+            with open(transcript_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        finally:
+            if os.path.exists(transcript_path):
+                os.remove(transcript_path)
+
+
+class TransformersBackend(TranscriptionBackend):
+    """
+    Keeps a Hugging Face ASR pipeline loaded on one device for the lifetime of the worker.
+
+    Uses the same pipeline settings as `insanely-fast-whisper` (fp16, SDPA attention, 30 second
+    chunks) so the transcripts match the CLI output.
+    """
+    name = "transformers"
+    supports_windows = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pipe = None
+
+    def load(self):
+        import torch
+        from transformers import pipeline
+
+        self.pipe = pipeline(
+            "automatic-speech-recognition",
+            model=self.model_name,
+            torch_dtype=torch.float16,
+            device=f"cuda:{self.device_id}",
+            model_kwargs={"attn_implementation": "sdpa"},
+        )
+
+    def _generate_kwargs(self, task, language):
+        if self.model_name.split(".")[-1] == "en":
+            return {}
+        return {"task": task, "language": language}
+
+    def transcribe(self, audio_path, task="transcribe", language="en"):
+        outputs = self.pipe(
+            audio_path,
+            chunk_length_s=DEFAULT_CHUNK_LENGTH,
+            batch_size=self.batch_size,
+            generate_kwargs=self._generate_kwargs(task, language),
+            return_timestamps=True,
+        )
+        return {"speakers": [], "chunks": outputs["chunks"], "text": outputs["text"]}
+
+    def transcribe_audio(self, audio, task="transcribe", language="en"):
+        from src.audio_decode import SAMPLE_RATE
+
+        return self.transcribe({"raw": audio, "sampling_rate": SAMPLE_RATE}, task=task, language=language)
+
+    def transcribe_windows(self, windows, task="transcribe", language="en"):
+        from src.audio_decode import SAMPLE_RATE
+
+        outputs = self.pipe(
+            [{"raw": window, "sampling_rate": SAMPLE_RATE} for window in windows],
+            batch_size=self.batch_size,
+            generate_kwargs=self._generate_kwargs(task, language),
+            return_timestamps=True,
+        )
+        return [output["chunks"] for output in outputs]
+
+    def close(self):
+        self.pipe = None
+        try:
+            import torch
+            torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+
+class StubBackend(TranscriptionBackend):
+    """
+    A CPU-only backend that returns a fixed transcript without loading any model.
+
+    Used to exercise the pool, the queueing and the result collection on machines without a GPU.
+
+    Args:
+        load_delay (float): Seconds to sleep in `load()`, to simulate model load time.
+        delay (float): Seconds to sleep in every `transcribe()` call, to simulate inference time.
+    """
+    name = "stub"
+    supports_windows = True
+
+    def __init__(self, *args, load_delay=0.0, delay=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.load_delay = load_delay
+        self.delay = delay
+        self.load_count = 0
+        self.jobs_done = 0
+
+    def load(self):
+        time.sleep(self.load_delay)
+        self.load_count += 1
+
+    def transcribe(self, audio_path, task="transcribe", language="en"):
+        time.sleep(self.delay)
+        self.jobs_done += 1
+        text = f" [{task}:{language}] {os.path.basename(str(audio_path))}"
+        return {"speakers": [], "chunks": [{"timestamp": [0.0, 1.0], "text": text}], "text": text}
+
+    def transcribe_audio(self, audio, task="transcribe", language="en"):
+        from src.audio_decode import SAMPLE_RATE
+
+        time.sleep(self.delay)
+        self.jobs_done += 1
+        text = f" [{task}:{language}] audio of {len(audio)} samples"
+        chunk = {"timestamp": [0.0, round(len(audio) / SAMPLE_RATE, 2)], "text": text}
+        return {"speakers": [], "chunks": [chunk], "text": text}
+
+    def transcribe_windows(self, windows, task="transcribe", language="en"):
+        from src.audio_decode import SAMPLE_RATE
+
+        time.sleep(self.delay)
+        self.jobs_done += 1
+        return [
+            [{"timestamp": [0.0, round(len(window) / SAMPLE_RATE, 2)], "text": f" [{task}:{language}] window of {len(window)} samples"}]
+            for window in windows
+        ]
+
+
+BACKENDS = {
+    CLIBackend.name: CLIBackend,
+    TransformersBackend.name: TransformersBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def create_backend(name, device_id=0, **options):
+    """
+    Creates a backend instance by its registered name.
+
+    Args:
+        name (str): One of the keys of `BACKENDS` ("cli", "transformers" or "stub").
+        device_id (int): The CUDA device index to bind the backend to.
+        **options: Extra keyword arguments passed to the backend constructor.
+
+    Returns:
+        TranscriptionBackend: The (not yet loaded) backend.
+
+    Raises:
+        ValueError: If no backend is registered under `name`.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name](device_id=device_id, **options)
+
+
+def write_transcript(transcript, output_path):
+    """
+    Writes a transcript dict to disk in the same layout as the `insanely-fast-whisper` CLI.
+
+    Args:
+        transcript (dict): The transcript returned by a backend.
+        output_path (str): The path of the JSON file to write.
+    """
+    with open(output_path, 'w', encoding='utf8') as file:
+        json.dump(transcript, file, ensure_ascii=False)
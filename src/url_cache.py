@@ -0,0 +1,173 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import contextlib
+import threading
+import sqlite3
+import json
+import time
+import re
+import os
+
+
+DEFAULT_RESULT_CACHE_PATH = "url_results.sqlite3"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 20 * 1024**3
+
+_YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com"}
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+# Query parameters that change where playback starts or who shared the link, not what is played
+_IGNORED_PARAMS = {"t", "start", "si", "feature", "pp", "list", "index", "ab_channel", "fbclid", "gclid"}
+
+
+def canonical_url(url):
+    """
+    Reduces the many spellings of a video's URL to one key, without any network access.
+
+    YouTube links in any form (youtu.be, watch, shorts, embed, live, with a start time or as part of a
+    playlist) become "youtube:<video id>", the same ID yt-dlp extracts. Other URLs are normalised: the
+    scheme, "www.", the fragment and tracking or start-time parameters are dropped and the remaining
+    query is sorted.
+
+    Args:
+        url (str): The URL as the user entered it.
+
+    Returns:
+        str: The canonical key.
+    """
+    url = url.strip()
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    path = parts.path.rstrip("/")
+
+    video_id = None
+    if host == "youtu.be":
+        video_id = path.lstrip("/").split("/")[0]
+    elif host in _YOUTUBE_HOSTS:
+        if path == "/watch":
+            video_id = dict(query).get("v")
+        elif path.split("/")[1:2] in (["shorts"], ["embed"], ["live"], ["v"]):
+            video_id = path.split("/")[2] if len(path.split("/")) > 2 else None
+    if video_id and _YOUTUBE_ID.match(video_id):
+        return f"youtube:{video_id}"
+
+    kept = sorted((name, value) for name, value in query if name not in _IGNORED_PARAMS and not name.startswith("utm_"))
+    return f"url:{host}{path}" + (f"?{urlencode(kept)}" if kept else "")
+
+
+def result_key(url, **options):
+    """
+    Returns the cache key of a URL processed with some options, e.g. `result_key(url, enhance_input=True)`.
+    """
+    return canonical_url(url) + "|" + json.dumps(options, sort_keys=True)
+
+
+class ResultCache:
+    """
+    Remembers the output files produced for each URL, so repeat requests are answered without any work.
+
+    An entry is only returned while every one of its files still exists unchanged, since the disk
+    lifecycle collector may delete outputs on its own schedule. Entries expire after `ttl_seconds`. `evict()` deletes the least recently used entries, and their files,
+    until the cached outputs fit in `max_bytes`.
+
+    Args:
+        path (str): The SQLite database file.
+        ttl_seconds (float): How long an entry stays valid.
+        max_bytes (int): The disk budget of the cached output files.
+    """
+    def __init__(self, path=DEFAULT_RESULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, url TEXT, result TEXT, files TEXT, bytes INTEGER, created REAL, last_used REAL)"
+            )
+
+    def get(self, key):
+        """
+        Returns the result stored for a key, or None if there is none, it has expired or its files have changed.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT result, files, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            result, files, created = json.loads(row[0]), json.loads(row[1]), row[2]
+            if now - created > self.ttl_seconds or not all(_unchanged(*file) for file in files):
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        return result
+
+    def put(self, key, url, result, files):
+        """
+        Stores the result of processing a URL.
+
+        Args:
+            key (str): From `result_key`.
+            url (str): The URL as requested, kept for reference.
+            result: What `get` returns, e.g. the paths shown to the user. Must be JSON serialisable.
+            files (list[str]): Every output file the result depends on. They are checked on `get` and deleted on eviction.
+        """
+        stats = [(path, os.stat(path)) for path in files]
+        files = [(path, stat.st_size, stat.st_mtime_ns) for path, stat in stats]
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, json.dumps(result), json.dumps(files), sum(file[1] for file in files), now, now)
+            )
+
+    def evict(self):
+        """
+        Drops expired entries, then the least recently used ones, until the cached outputs fit the disk budget.
+
+        Files of dropped entries are deleted unless a kept entry still refers to them.
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        with self._lock, self._db:
+            rows = self._db.execute("SELECT key, files, bytes, created FROM results ORDER BY last_used DESC").fetchall()
+            total = sum(row[2] for row in rows)
+            cutoff = time.time() - self.ttl_seconds
+            dropped = []
+            for row in reversed(rows):
+                if row[3] < cutoff or total > self.max_bytes:
+                    dropped.append(row)
+                    total -= row[2]
+            kept_files = {file[0] for row in rows if row not in dropped for file in json.loads(row[1])}
+            for key, files, _, _ in dropped:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                for path, size, mtime_ns in json.loads(files):
+                    if path not in kept_files and _unchanged(path, size, mtime_ns):
+                        # The disk lifecycle collector may have removed it since the check
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(path)
+        return len(dropped)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _unchanged(path, size, mtime_ns):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns)
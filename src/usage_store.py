@@ -0,0 +1,115 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import threading
+import sqlite3
+import json
+import os
+
+
+DEFAULT_USAGE_DB_PATH = "user_activity.sqlite3"
+
+
+class UsageStore:
+    """
+    An append-only log of every request per access key, with running totals kept alongside.
+
+    Recording a request inserts one log row and bumps one totals row in a single transaction, so
+    the cost of a write does not grow with the history, and a crash never leaves the two out of step.
+    Reading a key's stats reads only its totals row. The database runs in WAL mode, so readers do
+    not block the writer.
+
+    Args:
+        path (str): The SQLite database file.
+    """
+    def __init__(self, path=DEFAULT_USAGE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, key TEXT, timestamp TEXT, entry TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS totals ("
+                "key TEXT PRIMARY KEY, total_videos INTEGER, total_hours REAL, total_characters INTEGER, total_words INTEGER)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_by_key ON entries (key, id)")
+
+    def record(self, key, entry):
+        """
+        Appends one request to the log and adds it to the key's totals.
+
+        Args:
+            key (str): The access key the request was made with.
+            entry (dict): The request details. `duration_hours`, `total_characters` and `total_words` feed the totals.
+        """
+        with self._lock, self._db:
+            self._insert(key, entry)
+
+    def _insert(self, key, entry):
+        self._db.execute(
+            "INSERT INTO entries (key, timestamp, entry) VALUES (?, ?, ?)",
+            (key, entry.get('timestamp'), json.dumps(entry))
+        )
+        self._db.execute(
+            "INSERT INTO totals VALUES (?, 1, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "total_videos = total_videos + 1, total_hours = total_hours + excluded.total_hours, "
+            "total_characters = total_characters + excluded.total_characters, total_words = total_words + excluded.total_words",
+            (key, entry.get('duration_hours') or 0.0, entry.get('total_characters') or 0, entry.get('total_words') or 0)
+        )
+
+    def stats(self, key):
+        """
+        Returns the totals of one key, or None if it has never been used.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT * FROM totals WHERE key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def entries(self, key, limit=None):
+        """
+        Returns the logged requests of one key, newest first.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT entry FROM entries WHERE key = ? ORDER BY id DESC LIMIT ?", (key, -1 if limit is None else limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def import_json(self, json_path):
+        """
+        Loads the history of the old `user_activity.json` file into an empty store.
+
+        A file with any entries is renamed to `<name>.imported` afterwards, so it is only ever imported once.
+
+        Returns:
+            int: The number of entries imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r") as f:
+            user_activity = json.load(f)
+        imported = 0
+        with self._lock, self._db:
+            if self._db.execute("SELECT 1 FROM totals LIMIT 1").fetchone():
+                return 0
+            for key, record in user_activity.items():
+                for entry in record.get("entries", []):
+                    self._insert(key, entry)
+                    imported += 1
+        if imported:
+            os.replace(json_path, f"{json_path}.imported")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._db.close()
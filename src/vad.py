@@ -0,0 +1,194 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import bisect
+
+import numpy as np
+
+from src.audio_decode import SAMPLE_RATE
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+
+FRAME_MS = 30
+
+
+def _energy_speech_frames(audio, frame_samples, margin_db=12.0, min_db=-55.0):
+    """
+    Flags frames whose energy stands clear of the file's own noise floor.
+
+    The floor is the 10th percentile of frame energy. The threshold is capped 25 dB below the
+    loud frames, so continuous speech (where even the quietest frames are between words) is not cut.
+    """
+    num_frames = len(audio) // frame_samples
+    frames = audio[:num_frames * frame_samples].reshape(num_frames, frame_samples)
+    energy_db = 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+    floor = np.percentile(energy_db, 10)
+    loud = np.percentile(energy_db, 95)
+    threshold = max(min_db, min(floor + margin_db, loud - 25.0))
+    return energy_db > threshold
+
+
+def _webrtc_speech_frames(audio, frame_samples, sample_rate, aggressiveness):
+    vad = webrtcvad.Vad(aggressiveness)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+    frame_bytes = frame_samples * 2
+    num_frames = len(audio) // frame_samples
+    return np.array([
+        vad.is_speech(pcm[i * frame_bytes:(i + 1) * frame_bytes], sample_rate)
+        for i in range(num_frames)
+    ], dtype=bool)
+
+
+def detect_speech(audio, sample_rate=SAMPLE_RATE, padding=0.2, min_speech=0.25, min_silence=0.5, aggressiveness=2):
+    """
+    Finds the regions of a recording that contain speech.
+
+    Uses WebRTC's VAD when the optional `webrtcvad` package is installed, and a relative energy
+    detector otherwise. Both run on the CPU.
+
+    Args:
+        audio (numpy.ndarray): 16 kHz mono float32 samples.
+        sample_rate (int): The sample rate of `audio`.
+        padding (float): Seconds of context kept on either side of every region.
+        min_speech (float): Regions shorter than this are treated as noise and dropped.
+        min_silence (float): Gaps shorter than this are kept, so words are not split apart.
+        aggressiveness (int): WebRTC VAD aggressiveness, 0 (least) to 3 (most).
+
+    Returns:
+        list[tuple[int, int]]: Sorted, non-overlapping (start, end) sample ranges.
+    """
+    frame_samples = sample_rate * FRAME_MS // 1000
+    if len(audio) < frame_samples:
+        return [(0, len(audio))] if len(audio) else []
+
+    if webrtcvad is not None:
+        speech = _webrtc_speech_frames(audio, frame_samples, sample_rate, aggressiveness)
+    else:
+        speech = _energy_speech_frames(audio, frame_samples)
+
+    # Turn the frame flags into (start, end) frame runs
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    runs = [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])]
+
+    min_silence_frames = int(min_silence * 1000 / FRAME_MS)
+    min_speech_frames = int(min_speech * 1000 / FRAME_MS)
+    merged = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_silence_frames:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    pad = int(padding * sample_rate)
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech_frames:
+            continue
+        start = max(0, start * frame_samples - pad)
+        end = min(len(audio), end * frame_samples + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+class SpeechTimeline:
+    """
+    Maps times in the silence-stripped audio back to the original recording.
+
+    Args:
+        regions (list[tuple[int, int]]): The speech regions, as returned by `detect_speech`.
+        total_samples (int): The length of the original recording.
+        sample_rate (int): The sample rate both timelines are measured in.
+    """
+    def __init__(self, regions, total_samples, sample_rate=SAMPLE_RATE):
+        self.regions = regions
+        self.total_samples = total_samples
+        self.sample_rate = sample_rate
+        self.compact_starts = []
+        position = 0
+        for start, end in regions:
+            self.compact_starts.append(position)
+            position += end - start
+        self.speech_samples = position
+
+    @property
+    def total_seconds(self):
+        return self.total_samples / self.sample_rate
+
+    @property
+    def skipped_seconds(self):
+        return (self.total_samples - self.speech_samples) / self.sample_rate
+
+    def compact(self, audio):
+        """
+        Returns only the speech regions of `audio`, joined end to end.
+        """
+        if not self.regions:
+            return audio[:0]
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+    def to_original(self, seconds, is_end=False):
+        """
+        Converts a time in the compacted audio to the original timeline.
+
+        A time that falls exactly on the join between two regions is mapped to the end of the
+        earlier region when `is_end` is True, and to the start of the later region otherwise.
+        """
+        if seconds is None or not self.regions:
+            return seconds
+        sample = seconds * self.sample_rate
+        search = bisect.bisect_left if is_end else bisect.bisect_right
+        index = max(0, search(self.compact_starts, sample) - 1)
+        start, end = self.regions[index]
+        original = start + (sample - self.compact_starts[index])
+        return round(min(original, end) / self.sample_rate, 2)
+
+    def remap_chunks(self, chunks):
+        """
+        Rewrites the timestamps of transcript chunks from the compacted to the original timeline.
+        """
+        return [
+            dict(chunk, timestamp=[self.to_original(chunk['timestamp'][0]), self.to_original(chunk['timestamp'][1], is_end=True)])
+            for chunk in chunks
+        ]
+
+    def report(self):
+        """
+        Summarises how much audio the pre-pass removed, for the transcript metadata.
+        """
+        return {
+            "total_seconds": round(self.total_seconds, 2),
+            "speech_seconds": round(self.speech_samples / self.sample_rate, 2),
+            "skipped_seconds": round(self.skipped_seconds, 2),
+            "regions": len(self.regions),
+        }
+
+
+def strip_silence(audio, sample_rate=SAMPLE_RATE, **options):
+    """
+    Removes non-speech from a recording before it is sent to the model.
+
+    Args:
+        audio (numpy.ndarray): 16 kHz mono float32 samples.
+        sample_rate (int): The sample rate of `audio`.
+        **options: Passed to `detect_speech`.
+
+    Returns:
+        tuple: A tuple containing:
+            - compact (numpy.ndarray): The speech regions joined end to end.
+            - timeline (SpeechTimeline): Maps times in `compact` back to the original recording.
+    """
+    timeline = SpeechTimeline(detect_speech(audio, sample_rate, **options), len(audio), sample_rate)
+    return timeline.compact(audio), timeline
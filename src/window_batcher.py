@@ -0,0 +1,272 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+
+from src.audio_decode import SAMPLE_RATE, StreamingDecoder
+from src.segmenter import overlapping_windows, stitch_segments
+from src.transcription_backends import DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_LENGTH, write_transcript
+from src.vad import strip_silence
+
+
+# Each window repeats this much of the previous one, so a word on a window boundary is heard whole by one of them
+DEFAULT_WINDOW_OVERLAP_SECONDS = 5
+
+
+class _FileState:
+    """
+    Book-keeping for one file whose windows are spread over one or more batches.
+    """
+    def __init__(self, name, output_path):
+        self.name = name
+        self.output_path = output_path
+        self.window_chunks = []  # (offset, duration, window-relative chunks) per window
+        self.remaining = 0
+        self.complete = False
+        self.failed = False
+        self.timeline = None
+        self.future = concurrent.futures.Future()
+        self.future.set_running_or_notify_cancel()
+
+
+class CrossFileBatcher:
+    """
+    Packs fixed-length audio windows from many files into shared inference batches.
+
+    Every file added with `add_file()` is streamed through the decoder and cut into `window_seconds`
+    windows that overlap by `overlap_seconds`, the way the Hugging Face chunked pipeline strides
+    them. Each window is queued as soon as it has been decoded, so inference on the start of a file
+    overlaps with decoding the rest of it. Windows from all files go into one pending list, and a batch is sent to the pool as soon as
+    `batch_size` windows are waiting, or when the oldest waiting window has lingered for
+    `linger_seconds`. Results are routed back to their file and stitched like segments (see
+    `segmenter.stitch_segments`): each overlap is split at its midpoint and a chunk transcribed by
+    both windows is kept once. Every file still ends up with its own transcript in the usual JSON layout.
+
+    With `vad` enabled, each file is decoded in full, its silence and music are stripped by a CPU
+    voice-activity pass, and only the speech is windowed. Chunk timestamps are mapped back to the
+    original timeline before the transcript is written, and the amount skipped is recorded under
+    the transcript's "vad" key.
+
+    Args:
+        pool (TranscriptionPool): A started pool whose backend supports window batches.
+        batch_size (int): The number of windows per inference batch.
+        window_seconds (int): The window length. Whisper's receptive field is 30 seconds.
+        overlap_seconds (float): How much each window repeats of the one before it.
+        linger_seconds (float): How long a partial batch may wait for more windows before it is sent anyway.
+        task (str): Either "transcribe" or "translate".
+        language (str): The spoken language of the audio.
+        vad (bool): Strip non-speech before inference.
+    """
+    def __init__(self, pool, batch_size=DEFAULT_BATCH_SIZE, window_seconds=DEFAULT_CHUNK_LENGTH, linger_seconds=0.5, task="transcribe", language="en", vad=False,
+                 overlap_seconds=DEFAULT_WINDOW_OVERLAP_SECONDS):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.window_samples = int(window_seconds * SAMPLE_RATE)
+        self.overlap_samples = int(overlap_seconds * SAMPLE_RATE)
+        # Decoded blocks are as long as the new audio in each window
+        self.block_samples = self.window_samples - self.overlap_samples
+        self.linger_seconds = linger_seconds
+        self.task = task
+        self.language = language
+        self.vad = vad
+        self._pending = []
+        self._files = {}  # future -> _FileState of every file not yet finished
+        self._oldest_pending = None
+        self._lock = threading.RLock()  # re-entered when a batch completes before its callback is attached
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._flusher = threading.Thread(target=self._linger_loop, daemon=True)
+        self._flusher.start()
+
+    def add_file(self, audio_path, output_path=None):
+        """
+        Streams a file through ffmpeg and queues each window as soon as it is decoded.
+
+        Blocks until the whole file has been decoded, while earlier windows are already being
+        transcribed.
+
+        Args:
+            audio_path (str): The audio or video file to transcribe.
+            output_path (str, optional): Where to write the assembled transcript JSON.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the assembled transcript dict.
+        """
+        decoder = StreamingDecoder(audio_path, block_seconds=self.block_samples / SAMPLE_RATE)
+        with decoder:
+            return self.add_windows(audio_path, decoder, output_path)
+
+    def add_audio(self, name, audio, output_path=None):
+        """
+        Queues already decoded 16 kHz mono audio for batching. See `add_file()`.
+        """
+        return self.add_windows(name, [audio], output_path)
+
+    def add_windows(self, name, windows, output_path=None):
+        """
+        Queues the audio of one file as it is produced, cut into overlapping windows.
+
+        Args:
+            name (str): A label for the file, used in error messages.
+            windows (iterable[numpy.ndarray]): Consecutive, non-overlapping 16 kHz mono blocks of any length,
+                                               e.g. from a `StreamingDecoder`.
+            output_path (str, optional): Where to write the assembled transcript JSON.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the assembled transcript dict.
+        """
+        state = _FileState(name, output_path)
+        with self._lock:
+            self._files[state.future] = state
+        try:
+            if self.vad:
+                decoded = list(windows)
+                audio = np.concatenate(decoded) if decoded else np.zeros(0, np.float32)
+                compact, state.timeline = strip_silence(audio)
+                windows = [compact]
+
+            for offset, window in overlapping_windows(windows, self.window_samples, self.overlap_samples):
+                with self._lock:
+                    state.window_chunks.append(None)
+                    state.remaining += 1
+                    self._pending.append((state, len(state.window_chunks) - 1, offset / SAMPLE_RATE, window))
+                    if self._oldest_pending is None:
+                        self._oldest_pending = time.monotonic()
+                        self._wakeup.notify()
+                    if len(self._pending) >= self.batch_size:
+                        self._dispatch_locked(full_only=True)
+        except Exception as e:
+            with self._lock:
+                already_failed, state.failed = state.failed, True
+                self._files.pop(state.future, None)
+            if not already_failed:
+                state.future.set_exception(e)
+            return state.future
+
+        with self._lock:
+            state.complete = True
+            ready = state.remaining == 0 and not state.failed
+            if ready:
+                del self._files[state.future]
+        if ready:
+            self._finish(state)
+        return state.future
+
+    def cancel(self, future):
+        """
+        Gives up on a file queued with `add_windows()`, e.g. once its transcript turns out to be cached.
+
+        Its windows still waiting for a batch are dropped, and the results of batches already sent are ignored.
+
+        Args:
+            future (concurrent.futures.Future): The future `add_windows()` returned for the file.
+
+        Returns:
+            bool: False if the file had already finished or failed.
+        """
+        with self._lock:
+            state = self._files.pop(future, None)
+            if state is None:
+                return False
+            state.failed = True
+            self._pending = [entry for entry in self._pending if entry[0] is not state]
+            if not self._pending:
+                self._oldest_pending = None
+        future.set_exception(concurrent.futures.CancelledError(f"Transcription of {state.name} was cancelled"))
+        return True
+
+    def flush(self):
+        """
+        Sends any partially filled batch immediately.
+        """
+        with self._lock:
+            self._dispatch_locked()
+
+    def close(self):
+        """
+        Flushes the last partial batch and stops the linger thread.
+        """
+        with self._lock:
+            self._dispatch_locked()
+            self._closed = True
+            self._wakeup.notify()
+        self._flusher.join()
+
+    def _linger_loop(self):
+        with self._lock:
+            while not self._closed:
+                if self._oldest_pending is None:
+                    self._wakeup.wait()
+                    continue
+                remaining = self._oldest_pending + self.linger_seconds - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    continue
+                self._dispatch_locked()
+
+    def _dispatch_locked(self, full_only=False):
+        while self._pending and (len(self._pending) >= self.batch_size or not full_only):
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            try:
+                future = self.pool.submit_windows([window for _, _, _, window in batch], self.task, self.language)
+            except Exception as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda f, batch=batch: self._route(batch, f))
+        self._oldest_pending = time.monotonic() if self._pending else None
+
+    def _route(self, batch, future):
+        error = future.exception()
+        results = None if error else future.result()
+        finished = []
+        with self._lock:
+            for position, (state, index, offset, window) in enumerate(batch):
+                if state.failed:
+                    continue
+                if error:
+                    state.failed = True
+                    del self._files[state.future]
+                    finished.append((state, error))
+                    continue
+                state.window_chunks[index] = (offset, len(window) / SAMPLE_RATE, {'chunks': results[position]})
+                state.remaining -= 1
+                if state.remaining == 0 and state.complete:
+                    del self._files[state.future]
+                    finished.append((state, None))
+        for state, error in finished:
+            if error:
+                state.future.set_exception(error)
+            else:
+                self._finish(state)
+
+    def _finish(self, state):
+        chunks = stitch_segments(state.window_chunks)['chunks']
+        if state.timeline:
+            chunks = state.timeline.remap_chunks(chunks)
+        transcript = {"speakers": [], "chunks": chunks, "text": "".join(chunk['text'] for chunk in chunks)}
+        if state.timeline:
+            transcript["vad"] = state.timeline.report()
+            print(f"VAD skipped {transcript['vad']['skipped_seconds']:.1f}s of {transcript['vad']['total_seconds']:.1f}s in {state.name}")
+        try:
+            if state.output_path:
+                write_transcript(transcript, state.output_path)
+        except Exception as e:
+            state.future.set_exception(e)
+            return
+        state.future.set_result(transcript)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
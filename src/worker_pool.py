@@ -0,0 +1,264 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import threading
+import queue
+
+from src.transcription_backends import create_backend, write_transcript
+
+
+_STOP = object()
+
+
+class TranscriptionJob:
+    """
+    A single unit of work for the pool.
+
+    Args:
+        audio_path (str): Path to the file to transcribe.
+        output_path (str, optional): Where to write the transcript JSON. If None, the transcript is only returned.
+        task (str): Either "transcribe" or "translate".
+        language (str): The spoken language of the audio.
+    """
+    def __init__(self, audio_path, output_path=None, task="transcribe", language="en"):
+        self.audio_path = audio_path
+        self.output_path = output_path
+        self.task = task
+        self.language = language
+        self.future = concurrent.futures.Future()
+
+    def run(self, backend):
+        transcript = backend.transcribe(self.audio_path, task=self.task, language=self.language)
+        if self.output_path:
+            write_transcript(transcript, self.output_path)
+        return transcript
+
+
+class AudioJob:
+    """
+    Decoded audio of any length (e.g. one segment of a long recording), transcribed as a single job.
+
+    Args:
+        audio (numpy.ndarray): 16 kHz mono float32 samples.
+        task (str): Either "transcribe" or "translate".
+        language (str): The spoken language of the audio.
+    """
+    def __init__(self, audio, task="transcribe", language="en"):
+        self.audio = audio
+        self.task = task
+        self.language = language
+        self.future = concurrent.futures.Future()
+
+    def run(self, backend):
+        return backend.transcribe_audio(self.audio, task=self.task, language=self.language)
+
+
+class WindowBatchJob:
+    """
+    A batch of decoded audio windows, possibly from several files, transcribed in one forward pass.
+
+    Args:
+        windows (list[numpy.ndarray]): 16 kHz mono float32 windows, each at most 30 seconds long.
+        task (str): Either "transcribe" or "translate".
+        language (str): The spoken language of the audio.
+    """
+    def __init__(self, windows, task="transcribe", language="en"):
+        self.windows = windows
+        self.task = task
+        self.language = language
+        self.future = concurrent.futures.Future()
+
+    def run(self, backend):
+        return backend.transcribe_windows(self.windows, task=self.task, language=self.language)
+
+
+class TranscriptionPool:
+    """
+    A long-lived pool of transcription workers.
+
+    Each worker is a thread that creates its own backend, loads the model once, and then takes
+    jobs from its device's queue until the pool is shut down. Jobs are submitted with `submit()`
+    and their results are collected through `concurrent.futures.Future` objects. A device whose
+    workers have all exited (e.g. none could load the model) takes no more jobs: the jobs queued
+    on it fail, and unpinned jobs go to the other devices.
+
+    Args:
+        backend_name (str): The registered backend to use ("cli", "transformers" or "stub").
+        device_ids (list[int]): The CUDA devices to start workers on.
+        workers_per_device (int): How many workers (and model copies) to start on each device.
+        **backend_options: Extra keyword arguments passed to every backend constructor.
+    """
+    def __init__(self, backend_name="transformers", device_ids=(0,), workers_per_device=1, **backend_options):
+        self.backend_name = backend_name
+        self.device_ids = list(device_ids)
+        self.workers_per_device = workers_per_device
+        self.backend_options = backend_options
+        self.backends = []
+        self._queues = {device_id: queue.Queue() for device_id in self.device_ids}
+        self._in_flight = {device_id: 0 for device_id in self.device_ids}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._alive = {device_id: 0 for device_id in self.device_ids}  # live workers on each device
+        self._load_errors = []
+        self._started = False
+        self._closed = False
+
+    def start(self):
+        """
+        Starts the worker threads. Model loading happens on the workers, so this returns immediately.
+        """
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+            for device_id in self.device_ids:
+                for _ in range(self.workers_per_device):
+                    thread = threading.Thread(target=self._worker, args=(device_id,), daemon=True)
+                    self._alive[device_id] += 1
+                    self._threads.append(thread)
+                    thread.start()
+        return self
+
+    def _worker(self, device_id):
+        job_queue = self._queues[device_id]
+        try:
+            backend = create_backend(self.backend_name, device_id=device_id, **self.backend_options)
+            backend.load()
+        except Exception as e:
+            print(f"Worker on device {device_id} failed to load backend '{self.backend_name}': {e}")
+            self._worker_exited(device_id, e)
+            return
+
+        with self._lock:
+            self.backends.append(backend)
+
+        try:
+            while True:
+                job = job_queue.get()
+                if job is _STOP:
+                    break
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    job.future.set_result(job.run(backend))
+                except Exception as e:
+                    job.future.set_exception(e)
+        finally:
+            backend.close()
+            self._worker_exited(device_id, None)
+
+    def _worker_exited(self, device_id, error):
+        with self._lock:
+            self._alive[device_id] -= 1
+            if error is not None:
+                self._load_errors.append(error)
+            device_empty = self._alive[device_id] == 0
+        if device_empty:
+            # Nothing will take this device's jobs any more; new jobs are routed to the other devices
+            self._fail_pending(device_id, RuntimeError(f"No transcription workers are running on device {device_id}: {self._load_errors or 'pool shut down'}"))
+
+    def _fail_pending(self, device_id, error):
+        job_queue = self._queues[device_id]
+        while True:
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not _STOP and job.future.set_running_or_notify_cancel():
+                job.future.set_exception(error)
+
+    def _least_loaded_device_locked(self):
+        # Queued plus running jobs; the queue size alone reads 0 on every device until all workers are busy
+        return min((device_id for device_id in self.device_ids if self._alive[device_id]), key=lambda device_id: self._in_flight[device_id])
+
+    def _job_done(self, device_id):
+        with self._lock:
+            self._in_flight[device_id] -= 1
+
+    def submit(self, audio_path, output_path=None, task="transcribe", language="en", device_id=None):
+        """
+        Queues a file for transcription.
+
+        Args:
+            audio_path (str): Path to the file to transcribe.
+            output_path (str, optional): Where to write the transcript JSON.
+            task (str): Either "transcribe" or "translate".
+            language (str): The spoken language of the audio.
+            device_id (int, optional): Pin the job to a device. Defaults to the device with the shortest queue.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the transcript dict.
+
+        Raises:
+            RuntimeError: If the pool has been shut down, or no worker is running on `device_id` (on any device if None).
+        """
+        return self.submit_job(TranscriptionJob(audio_path, output_path, task, language), device_id)
+
+    def submit_audio(self, audio, task="transcribe", language="en", device_id=None):
+        """
+        Queues decoded audio of any length. Requires a backend with `supports_windows`.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a transcript with timestamps relative to the start of `audio`.
+        """
+        return self.submit_job(AudioJob(audio, task, language), device_id)
+
+    def submit_windows(self, windows, task="transcribe", language="en", device_id=None):
+        """
+        Queues a batch of decoded audio windows. Requires a backend with `supports_windows`.
+
+        Returns:
+            concurrent.futures.Future: Resolves to one list of window-relative chunks per window.
+        """
+        return self.submit_job(WindowBatchJob(windows, task, language), device_id)
+
+    def submit_job(self, job, device_id=None):
+        """
+        Queues an already constructed job. See `submit()`.
+        """
+        self.start()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit to a transcription pool that has been shut down")
+            if not any(self._alive.values()):
+                raise RuntimeError(f"No transcription workers are running: {self._load_errors}")
+            if device_id is None:
+                device_id = self._least_loaded_device_locked()
+            elif not self._alive[device_id]:
+                raise RuntimeError(f"No transcription workers are running on device {device_id}: {self._load_errors}")
+            self._in_flight[device_id] += 1
+            # Queued under the lock, so a worker exiting now either sees the job and fails it or was gone before the check
+            self._queues[device_id].put(job)
+        job.future.add_done_callback(lambda _, device_id=device_id: self._job_done(device_id))
+        return job.future
+
+    def shutdown(self, wait=True):
+        """
+        Stops the workers once the jobs already queued have finished.
+
+        Args:
+            wait (bool): If True, block until every worker thread has exited.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for device_id in self.device_ids:
+            for _ in range(self.workers_per_device):
+                self._queues[device_id].put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
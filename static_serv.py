@@ -5,6 +5,8 @@ import json
 import gradio as gr
 import yt_dlp
 
+from src.subtitles import convert_to_srt
+
 # Define global variables and paths
 TEMP_DIR = "temp"
 OUTPUT_DIR = "output"
@@ -84,38 +86,6 @@ def process_video(file_path):
 
     return output_json, output_srt
 
-# Function to convert JSON to SRT
-def convert_to_srt(input_path, output_path):
-    def format_seconds(seconds):
-        if seconds is None:
-            return "00:00:00,000"
-        whole_seconds = int(seconds)
-        milliseconds = int((seconds - whole_seconds) * 1000)
-
-        hours = whole_seconds // 3600
-        minutes = (whole_seconds % 3600) // 60
-        seconds = whole_seconds % 60
-
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-
-    with open(input_path, 'r') as file:
-        data = json.load(file)
-
-    rst_string = ''
-    for index, chunk in enumerate(data['chunks'], 1):
-        text = chunk['text']
-        start, end = chunk.get('timestamp', [None, None])
-        if start is None or end is None:
-            print(f"Warning: Chunk {index} has missing timestamps. Skipping...")
-            continue
-        start_format, end_format = format_seconds(start), format_seconds(end)
-        srt_entry = f"{index}\n{start_format} --> {end_format}\n{text}\n\n"
-
-        rst_string += srt_entry
-
-    with open(output_path, 'w', encoding='utf-8') as file:
-        file.write(rst_string)
-
 # Function to handle the Gradio interface
 def transcribe_video(url):
     check_ffmpeg()  # Ensure ffmpeg is installed
@@ -0,0 +1,51 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import collections
+
+import pytest
+
+from src.gpu_scheduler import GpuSlotScheduler
+from src.gpu_telemetry import GpuTelemetry, SyntheticProvider
+
+GB = 1024**3
+
+
+def fake_telemetry(*free_gb):
+    return GpuTelemetry(SyntheticProvider([(24 * GB, free * GB, 0) for free in free_gb]))
+
+
+def test_without_memory_check_jobs_spread_over_devices():
+    scheduler = GpuSlotScheduler(fake_telemetry(24, 24, 24, 24), max_jobs_per_device=7, memory_per_job=0)
+    devices = [scheduler.acquire(timeout=0) for _ in range(8)]
+    assert collections.Counter(devices) == {0: 2, 1: 2, 2: 2, 3: 2}
+
+
+def test_released_slot_is_reused_on_the_least_loaded_device():
+    scheduler = GpuSlotScheduler(fake_telemetry(24, 24), max_jobs_per_device=2, memory_per_job=0)
+    devices = [scheduler.acquire(timeout=0) for _ in range(3)]
+    assert sorted(devices) == [0, 0, 1]
+    scheduler.release(0)
+    scheduler.release(0)
+    assert scheduler.acquire(timeout=0) == 0
+    assert scheduler.jobs == {0: 1, 1: 1}
+
+
+def test_memory_gated_jobs_use_best_fit():
+    scheduler = GpuSlotScheduler(fake_telemetry(24, 12, 8), max_jobs_per_device=7, memory_per_job=11 * GB)
+    # Device 1 leaves the least memory over; device 2 cannot take a job at all
+    assert scheduler.acquire(timeout=0) == 1
+
+
+def test_full_devices_time_out():
+    scheduler = GpuSlotScheduler(fake_telemetry(24), max_jobs_per_device=1, memory_per_job=0, recheck_interval=0.01)
+    with scheduler.slot():
+        with pytest.raises(TimeoutError):
+            scheduler.acquire(timeout=0.05)
+    assert scheduler.acquire(timeout=0) == 0
@@ -0,0 +1,76 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import time
+
+from src.gpu_telemetry import GpuTelemetry, SyntheticProvider
+
+
+GB = 1024**3
+
+
+class CountingProvider(SyntheticProvider):
+    """
+    A `SyntheticProvider` that counts driver reads and can be made to fail.
+    """
+    def __init__(self, devices):
+        super().__init__(devices)
+        self.reads = 0
+        self.failing = False
+        self.closed = False
+
+    def read(self, device_id):
+        if self.failing:
+            raise RuntimeError("driver went away")
+        self.reads += 1
+        return super().read(device_id)
+
+    def close(self):
+        self.closed = True
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_queries_are_served_from_the_snapshot():
+    provider = CountingProvider([(24 * GB, 20 * GB, 10), (16 * GB, 4 * GB, 90)])
+    telemetry = GpuTelemetry(provider, interval=60)
+    reads = provider.reads
+    for _ in range(100):
+        assert telemetry.memory_info(1) == (16 * GB, 4 * GB)
+    assert telemetry.device_count() == 2
+    assert provider.reads == reads
+    assert telemetry.summary() == "GPU 0: 20.0/24.0 GB free, 10% busy, GPU 1: 4.0/16.0 GB free, 90% busy"
+
+
+def test_background_thread_picks_up_changes():
+    provider = CountingProvider([(24 * GB, 24 * GB, 0)])
+    with GpuTelemetry(provider, interval=0.01) as telemetry:
+        provider.set(0, free=2 * GB, utilization=75)
+        assert wait_for(lambda: telemetry.memory_info(0) == (24 * GB, 2 * GB))
+        assert telemetry.snapshot().devices[0].utilization == 75
+    assert provider.closed
+
+
+def test_failed_sample_keeps_the_last_good_one():
+    provider = CountingProvider([(24 * GB, 12 * GB, 0)])
+    with GpuTelemetry(provider, interval=0.01) as telemetry:
+        before = telemetry.snapshot()
+        provider.failing = True
+        time.sleep(0.05)
+        assert telemetry.snapshot() == before
+        provider.failing = False
+        provider.set(0, free=6 * GB)
+        assert wait_for(lambda: telemetry.memory_info(0)[1] == 6 * GB)
@@ -0,0 +1,123 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import sqlite3
+import os
+
+from src.job_journal import CONVERTED, FAILED, QUEUED, TRANSCRIBED, JobJournal, commit_outputs, pending_job, recover_jobs
+
+
+def drop(input_dir, name, data, mtime):
+    path = os.path.join(input_dir, name)
+    with open(path, 'wb') as file:
+        file.write(data)
+    os.utime(path, (mtime, mtime))
+
+
+def finish(journal, job, tmp_path):
+    json_path = tmp_path / f"{job['id']}.json"
+    json_path.write_text("{}")
+    journal.mark_transcribed(job['id'], str(tmp_path), str(json_path))
+    journal.mark_converted(job['id'], None)
+
+
+def test_finished_file_is_skipped(tmp_path):
+    input_dir = str(tmp_path)
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    drop(input_dir, "a.mp4", b"first", 1000)
+    finish(journal, pending_job(journal, "a.mp4", input_dir=input_dir), tmp_path)
+    assert pending_job(journal, "a.mp4", input_dir=input_dir) is None
+
+
+def test_new_file_under_a_finished_name_is_queued_again(tmp_path):
+    input_dir = str(tmp_path)
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    drop(input_dir, "a.mp4", b"first", 1000)
+    first = pending_job(journal, "a.mp4", input_dir=input_dir)
+    finish(journal, first, tmp_path)
+
+    drop(input_dir, "a.mp4", b"second", 2000)
+    job = pending_job(journal, "a.mp4", input_dir=input_dir)
+    assert job is not None
+    assert job['id'] == first['id']
+    assert (job['state'], job['json_path'], job['attempts']) == (QUEUED, None, 0)
+    assert journal.counts() == {QUEUED: 1}
+
+
+def test_failed_file_keeps_its_attempts_until_it_is_replaced(tmp_path):
+    input_dir = str(tmp_path)
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    drop(input_dir, "a.mp4", b"broken", 1000)
+    job = pending_job(journal, "a.mp4", input_dir=input_dir)
+    journal.mark_running(job['id'], None)
+    journal.mark_failed(job['id'], "bad file")
+    assert pending_job(journal, "a.mp4", max_attempts=1, input_dir=input_dir) is None
+
+    drop(input_dir, "a.mp4", b"fixed", 1000)
+    assert pending_job(journal, "a.mp4", max_attempts=1, input_dir=input_dir)['state'] == QUEUED
+
+
+def start(journal, job, input_dir, scratch_path):
+    journal.mark_running(job['id'], str(scratch_path))
+    scratch_path.mkdir()
+    os.rename(os.path.join(input_dir, job['source']), scratch_path / job['source'])
+    (scratch_path / "a.json").write_text("{}")
+
+
+def test_job_killed_after_publishing_is_recorded_as_transcribed(tmp_path):
+    input_dir, output_dir = tmp_path / "input", tmp_path / "output"
+    input_dir.mkdir()
+    (output_dir / "a").mkdir(parents=True)
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    drop(str(input_dir), "a.mp4", b"first", 1000)
+    job = pending_job(journal, "a.mp4", input_dir=str(input_dir))
+    start(journal, job, str(input_dir), tmp_path / "scratch")
+    folder = commit_outputs(str(tmp_path / "scratch"), "a", output_dir=str(output_dir))
+
+    # The run dies here, before the journal hears about the published folder
+    recover_jobs(JobJournal(str(tmp_path / "journal.sqlite3")), input_dir=str(input_dir), output_dir=str(output_dir))
+    assert os.listdir(input_dir) == []
+    [row] = journal.jobs(TRANSCRIBED)
+    assert (row['state'], row['folder'], row['json_path']) == (TRANSCRIBED, folder, os.path.join(folder, "a.json"))
+    assert pending_job(journal, "a.mp4", input_dir=str(input_dir)) is None
+
+
+def test_job_killed_before_publishing_is_queued_again(tmp_path):
+    input_dir, output_dir = tmp_path / "input", tmp_path / "output"
+    input_dir.mkdir()
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    drop(str(input_dir), "a.mp4", b"first", 1000)
+    job = pending_job(journal, "a.mp4", input_dir=str(input_dir))
+    start(journal, job, str(input_dir), tmp_path / "scratch")
+
+    recover_jobs(journal, input_dir=str(input_dir), output_dir=str(output_dir))
+    assert os.listdir(input_dir) == ["a.mp4"]
+    assert not (tmp_path / "scratch").exists()
+    assert pending_job(journal, "a.mp4", input_dir=str(input_dir))['state'] == QUEUED
+
+
+def test_journal_without_file_sizes_is_upgraded_in_place(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    db = sqlite3.connect(path)
+    with db:
+        db.execute(
+            "CREATE TABLE jobs (id INTEGER PRIMARY KEY, source TEXT UNIQUE, state TEXT, folder TEXT, json_path TEXT, "
+            "srt_path TEXT, error TEXT, attempts INTEGER DEFAULT 0, updated REAL)"
+        )
+        db.execute("INSERT INTO jobs (source, state, json_path, updated) VALUES (?, ?, ?, 0)", ("a.mp4", CONVERTED, str(tmp_path / "a.json")))
+    db.close()
+    (tmp_path / "a.json").write_text("{}")
+    drop(str(tmp_path), "a.mp4", b"first", 1000)
+
+    journal = JobJournal(path)
+    # An entry from before sizes were kept is taken to be the same file
+    assert pending_job(journal, "a.mp4", input_dir=str(tmp_path)) is None
+    drop(str(tmp_path), "a.mp4", b"second", 2000)
+    assert pending_job(journal, "a.mp4", input_dir=str(tmp_path))['state'] == QUEUED
+    assert FAILED not in journal.counts()
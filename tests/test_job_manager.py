@@ -0,0 +1,63 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import threading
+
+from src.job_manager import DONE, JobManager
+
+
+def submit_jobs(manager, count, gate, ahead, peak):
+    lock = threading.Lock()
+
+    def fetch(job, _):
+        with lock:
+            ahead.add(job.id)
+            peak.append(len(ahead))
+        return job.id
+
+    def infer(job, job_id):
+        with lock:
+            ahead.discard(job_id)
+        gate.wait(5)
+        return job_id
+
+    return [manager.submit([("download", fetch), ("inference", infer)]) for _ in range(count)]
+
+
+def test_prefetch_depth_bounds_the_jobs_ahead_of_inference():
+    manager = JobManager({"download": 4, "inference": 1}, prefetch_depth=2, prefetch_until="inference")
+    gate, ahead, peak = threading.Event(), set(), []
+    job_ids = submit_jobs(manager, 6, gate, ahead, peak)
+    gate.set()
+    assert all(manager.wait(job_id, 5).state == DONE for job_id in job_ids)
+    assert max(peak) <= 2
+    manager.close()
+
+
+def test_admit_can_query_the_manager_and_hold_jobs_back():
+    allowed, fetching = threading.Event(), threading.Event()
+    asked = []
+
+    def admit():
+        # Called without the manager's lock held, so it may use the manager itself
+        asked.append(manager.waiting())
+        return allowed.is_set()
+
+    def fetch(job, _):
+        fetching.wait(5)  # Keeps the first job ahead of inference while the others are submitted
+
+    manager = JobManager({"download": 4, "inference": 1}, prefetch_depth=3, prefetch_until="inference", admit=admit)
+    job_ids = [manager.submit([("download", fetch), ("inference", lambda job, _: None)]) for _ in range(4)]
+    assert asked == [1, 2, 3]
+    assert manager.waiting() == 3
+    allowed.set()
+    fetching.set()
+    assert all(manager.wait(job_id, 5).state == DONE for job_id in job_ids)
+    assert manager.waiting() == 0
+    manager.close()
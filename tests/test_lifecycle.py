@@ -0,0 +1,121 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import time
+import os
+
+import pytest
+
+from src import lifecycle
+from src.lifecycle import LifecycleManager
+
+
+HOUR = 3600
+
+
+class Clock:
+    """
+    Stands in for the `time` module with a clock the test moves by hand.
+    """
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Starts at the real time, so the modification times the file system sets itself are current
+    clock = Clock(time.time())
+    monkeypatch.setattr(lifecycle, "time", clock)
+    return clock
+
+
+def put(path, size, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def manager(tmp_path, budgets, **kwargs):
+    budgets = {str(tmp_path / directory): budget for directory, budget in budgets.items()}
+    return LifecycleManager(budgets, path=str(tmp_path / "artifacts.sqlite3"), **kwargs)
+
+
+def test_least_recently_used_files_are_evicted_first(tmp_path, clock):
+    out = tmp_path / "out"
+    a = put(str(out / "a.srt"), 100, clock.now - 300)
+    b = put(str(out / "b.srt"), 100, clock.now - 200)
+    c = put(str(out / "c.srt"), 100, clock.now - 100)
+    lifecycle_manager = manager(tmp_path, {"out": 250})
+
+    assert lifecycle_manager.collect() == 1
+    assert sorted(os.listdir(out)) == ["b.srt", "c.srt"]
+    assert lifecycle_manager.usage(str(out)) == 200
+
+    # Serving b makes c the oldest
+    clock.now += 10
+    lifecycle_manager.touch(b)
+    put(str(out / "d.srt"), 100, clock.now)
+    assert lifecycle_manager.collect() == 1
+    assert not os.path.exists(a) and not os.path.exists(c)
+    assert sorted(os.listdir(out)) == ["b.srt", "d.srt"]
+    lifecycle_manager.close()
+
+
+def test_pinned_files_survive_a_pass(tmp_path, clock):
+    out = tmp_path / "out"
+    a = put(str(out / "a.mp4"), 100, clock.now - 300)
+    put(str(out / "b.mp4"), 100, clock.now - 200)
+    lifecycle_manager = manager(tmp_path, {"out": 0})
+    lifecycle_manager.pin(a)
+    lifecycle_manager.pin(a)
+
+    assert lifecycle_manager.collect() == 1
+    assert os.listdir(out) == ["a.mp4"]
+    lifecycle_manager.unpin(a)
+    assert lifecycle_manager.collect() == 0
+    lifecycle_manager.unpin(a)
+    assert lifecycle_manager.collect() == 1
+    assert os.listdir(out) == []
+    lifecycle_manager.close()
+
+
+def test_scratch_files_untouched_for_the_orphan_age_are_removed(tmp_path, clock):
+    temp = tmp_path / "temp"
+    stale = put(str(temp / "job1" / "audio.wav"), 10, clock.now - 7 * HOUR)
+    running = put(str(temp / "job2" / "audio.wav"), 10, clock.now - 7 * HOUR)
+    recent = put(str(temp / "job3" / "audio.wav"), 10, clock.now - 1 * HOUR)
+    os.makedirs(temp / "empty")
+    os.utime(temp / "empty", (clock.now - 7 * HOUR, clock.now - 7 * HOUR))
+    lifecycle_manager = manager(tmp_path, {"temp": 10 ** 9}, scratch_dirs=[str(temp)], orphan_seconds=6 * HOUR)
+    lifecycle_manager.pin(running)
+
+    assert lifecycle_manager.collect() == 1
+    assert not os.path.exists(stale)
+    assert os.path.exists(running) and os.path.exists(recent)
+    assert not os.path.exists(temp / "empty")
+
+    clock.now += 6 * HOUR
+    assert lifecycle_manager.collect() == 1
+    assert not os.path.exists(recent)
+    assert os.path.exists(running)
+    lifecycle_manager.close()
+
+
+def test_orphan_age_does_not_apply_outside_scratch_directories(tmp_path, clock):
+    out = tmp_path / "out"
+    old = put(str(out / "a.srt"), 10, clock.now - 30 * 24 * HOUR)
+    lifecycle_manager = manager(tmp_path, {"out": 10 ** 9}, orphan_seconds=6 * HOUR)
+    assert lifecycle_manager.collect() == 0
+    assert os.path.exists(old)
+    lifecycle_manager.close()
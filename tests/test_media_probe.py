@@ -0,0 +1,28 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+from src.media_probe import MediaInfo, ProbeCache, file_fingerprint, inspect_media
+
+
+def test_known_content_hash_skips_hashing_and_probing(tmp_path):
+    cache = ProbeCache(str(tmp_path / "probe.sqlite3"))
+    info = MediaInfo(12.5, "opus", None, 100, 64000, 48000)
+    cache.put_by_hash("abc", info)
+    # The file is never opened: neither hashed nor probed
+    assert inspect_media(str(tmp_path / "missing.webm"), cache, content_hash="abc") == (info, "abc")
+
+
+def test_content_hash_matches_file_fingerprint(tmp_path, monkeypatch):
+    path = tmp_path / "a.webm"
+    path.write_bytes(b"x" * 1000)
+    info = MediaInfo(1.0, "opus", None, 1000, None, None)
+    monkeypatch.setattr("src.media_probe.probe_media", lambda file_path: info)
+    cache = ProbeCache(str(tmp_path / "probe.sqlite3"))
+    assert inspect_media(str(path), cache) == (info, file_fingerprint(str(path)))
+    assert cache.get_by_hash(file_fingerprint(str(path))) == info
@@ -0,0 +1,140 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import http.server
+import urllib.error
+import threading
+import time
+import re
+import os
+
+import pytest
+
+from src.media_probe import file_fingerprint
+from src.ranged_download import RangedDownload
+
+
+FILES = {
+    "/big.bin": os.urandom(1_000_003),
+    "/small.bin": os.urandom(1000),
+    "/norange.bin": os.urandom(300_000),
+    "/stall.bin": os.urandom(300_000),
+}
+# Parts of /stall.bin after the first are held back until this is set
+RELEASE_STALLED = threading.Event()
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves `FILES` from memory. Every path honours Range requests except /norange.bin.
+    """
+    ranges = []
+
+    def do_GET(self):
+        data = FILES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get('Range', ''))
+        if match and self.path != "/norange.bin":
+            start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+            RangeHandler.ranges.append((start, end))
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.path == "/stall.bin" and match and int(match.group(1)) > 0:
+            RELEASE_STALLED.wait(10)
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def download(url, path, **kwargs):
+    with RangedDownload(url, str(path), **kwargs) as ranged:
+        data = b"".join(ranged.iter_bytes())
+        ranged.wait()
+    return ranged, data
+
+
+def test_parts_are_fetched_concurrently_and_yielded_in_order(server, tmp_path):
+    RangeHandler.ranges = []
+    ranged, data = download(f"{server}/big.bin", tmp_path / "big.bin", workers=3, part_size=100_000)
+    assert data == FILES["/big.bin"]
+    assert (tmp_path / "big.bin").read_bytes() == FILES["/big.bin"]
+    assert sorted(RangeHandler.ranges) == [(start, min(start + 100_000, 1_000_003) - 1) for start in range(0, 1_000_003, 100_000)]
+    assert ranged.total_bytes == ranged.bytes_done == 1_000_003
+
+
+def test_content_hash_is_the_file_fingerprint(server, tmp_path):
+    ranged, _ = download(f"{server}/big.bin", tmp_path / "big.bin", part_size=250_000)
+    assert ranged.content_hash == file_fingerprint(str(tmp_path / "big.bin"))
+
+
+def test_file_smaller_than_a_part(server, tmp_path):
+    ranged, data = download(f"{server}/small.bin", tmp_path / "small.bin")
+    assert data == FILES["/small.bin"]
+    assert ranged.total_bytes == 1000
+
+
+def test_server_without_range_support_is_read_in_one_request(server, tmp_path):
+    ranged, data = download(f"{server}/norange.bin", tmp_path / "norange.bin", part_size=100_000)
+    assert data == FILES["/norange.bin"]
+    assert ranged.total_bytes == 300_000
+    assert ranged.content_hash == file_fingerprint(str(tmp_path / "norange.bin"))
+
+
+def test_missing_resource_raises(server, tmp_path):
+    with pytest.raises(urllib.error.HTTPError):
+        RangedDownload(f"{server}/missing.bin", str(tmp_path / "missing.bin")).start()
+
+
+def test_close_wakes_a_reader_waiting_for_a_part(server, tmp_path):
+    ranged = RangedDownload(f"{server}/stall.bin", str(tmp_path / "stall.bin"), part_size=100_000).start()
+    received, errors = [], []
+
+    def read():
+        try:
+            for data in ranged.iter_bytes():
+                received.append(data)
+        except IOError as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    closer = threading.Thread(target=ranged.close)
+    try:
+        deadline = time.time() + 5
+        while not received and time.time() < deadline:
+            time.sleep(0.01)
+        closer.start()
+        # Woken by close itself, while the stalled parts are still being waited for
+        reader.join(2)
+        assert not reader.is_alive()
+        assert "closed" in str(errors[0])
+        assert len(received) == 1 and ranged.content_hash is None
+    finally:
+        RELEASE_STALLED.set()
+        closer.join(5)
+        reader.join(5)
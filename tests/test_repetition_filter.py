@@ -0,0 +1,82 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+from array import array
+import json
+import os
+
+from src.repetition_filter import RepetitionDetector, write_decisions
+from src.subtitle_postprocess import Timeline
+
+
+def timeline(*texts, step_ms=2000):
+    starts = array('q', (i * step_ms for i in range(len(texts))))
+    ends = array('q', (start + step_ms - 1 for start in starts))
+    return Timeline(starts, ends, list(texts))
+
+
+def test_looped_line_is_collapsed_into_the_first():
+    kept, decisions = RepetitionDetector().collapse(timeline(
+        "and that is why we came here",
+        "to talk about the plan",
+        "And that is why we came here.",
+        "and that is why we came here",
+    ))
+    assert kept.texts == ["and that is why we came here", "to talk about the plan"]
+    assert [(d['line'], d['repeat_of'], d['similarity']) for d in decisions] == [(2, 0, 1.0), (3, 0, 1.0)]
+    assert (decisions[0]['start'], decisions[0]['end']) == (4.0, 5.999)
+
+
+def test_similarity_threshold_is_jaccard_of_word_shingles():
+    first = "one two three four five six"
+    # Shares 3 of 5 distinct shingles with the first line: 0.6
+    close = "one two three four five seven"
+    # Shares 4 of 5: 0.8
+    closer = "one two three four five six seven"
+    kept, _ = RepetitionDetector().collapse(timeline(first, close))
+    assert kept.texts == [first, close]
+    kept, decisions = RepetitionDetector().collapse(timeline(first, closer))
+    assert kept.texts == [first]
+    assert decisions[0]['similarity'] == 0.8
+    kept, _ = RepetitionDetector(threshold=0.5).collapse(timeline(first, close))
+    assert kept.texts == [first]
+
+
+def test_lines_that_share_words_but_not_phrases_are_kept():
+    texts = (
+        "we went to the store today",
+        "today the store went to us",
+        "we went to the park today",
+        "Thank you.",
+        "Thank you.",
+    )
+    kept, decisions = RepetitionDetector().collapse(timeline(*texts))
+    assert kept.texts == list(texts)
+    assert decisions == []
+
+
+def test_repeat_outside_the_window_is_kept():
+    line = "this line comes back much later"
+    fillers = [f"filler number {i} of the talk" for i in range(3)]
+    kept, _ = RepetitionDetector(window_lines=2).collapse(timeline(line, *fillers, line))
+    assert kept.texts.count(line) == 2
+    kept, _ = RepetitionDetector(window_ms=5000).collapse(timeline(line, fillers[0], fillers[1], line, step_ms=2000))
+    assert kept.texts.count(line) == 2
+
+
+def test_decisions_are_written_with_the_settings(tmp_path):
+    detector = RepetitionDetector(window_lines=10)
+    _, decisions = detector.collapse(timeline("say it one more time", "say it one more time"))
+    path = str(tmp_path / "talk.repetitions.json")
+    write_decisions(decisions, path, detector.settings)
+    with open(path, encoding='utf-8') as file:
+        saved = json.load(file)
+    assert saved['settings'] == detector.settings
+    assert saved['collapsed'] == decisions
+    assert os.listdir(tmp_path) == ["talk.repetitions.json"]
@@ -0,0 +1,111 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src import segmenter
+from src.audio_decode import SAMPLE_RATE
+from src.segmenter import SegmentedTranscriber
+
+
+FILES = {}
+
+
+class FakeDecoder:
+    """
+    Stands in for `StreamingDecoder`: yields the audio registered in `FILES` under the path, in 2 second blocks.
+    """
+    def __init__(self, source, **kwargs):
+        self.audio = FILES[source]
+
+    def __iter__(self):
+        for start in range(0, len(self.audio), 2 * SAMPLE_RATE):
+            yield self.audio[start:start + 2 * SAMPLE_RATE]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class SlowPool:
+    """
+    Transcribes audio on background threads after a short delay and records how many jobs were outstanding at most.
+
+    Each transcript is one chunk per second of audio, named after the second of the file it came from.
+    """
+    device_ids = [0, 1]
+    workers_per_device = 1
+
+    def __init__(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.peak = 0
+        self.devices = []
+
+    def submit_audio(self, audio, task="transcribe", language="en", device_id=None):
+        with self.lock:
+            self.outstanding += 1
+            self.peak = max(self.peak, self.outstanding)
+            self.devices.append(device_id)
+        return self.executor.submit(self._transcribe, audio)
+
+    def _transcribe(self, audio):
+        time.sleep(0.01)
+        chunks = [
+            {"timestamp": [float(second), second + 0.5], "text": f" s{int(audio[second * SAMPLE_RATE])}"}
+            for second in range(int(len(audio) / SAMPLE_RATE))
+        ]
+        with self.lock:
+            self.outstanding -= 1
+        return {"speakers": [], "chunks": chunks, "text": "".join(chunk['text'] for chunk in chunks)}
+
+
+@pytest.fixture(autouse=True)
+def fake_decoder(monkeypatch):
+    monkeypatch.setattr(segmenter, "StreamingDecoder", FakeDecoder)
+
+
+def seconds_audio(seconds):
+    # Every second of audio holds its own index, so a transcript shows where each chunk came from
+    return np.repeat(np.arange(seconds, dtype=np.float32), SAMPLE_RATE)
+
+
+def test_short_file_is_one_job_on_the_given_device():
+    FILES["short.wav"] = seconds_audio(12)
+    pool = SlowPool()
+    transcript = SegmentedTranscriber(pool, segment_seconds=10, overlap_seconds=2, min_split_seconds=15).transcribe("short.wav", device_id=1)
+    assert pool.devices == [1]
+    assert transcript["text"] == "".join(f" s{second}" for second in range(12))
+
+
+def test_long_file_is_streamed_in_segments_with_a_bounded_number_in_flight():
+    FILES["long.wav"] = seconds_audio(95)
+    pool = SlowPool()
+    transcriber = SegmentedTranscriber(pool, segment_seconds=10, overlap_seconds=2, min_split_seconds=15, max_segments_in_flight=3)
+    transcript = transcriber.transcribe("long.wav", device_id=1)
+    assert len(pool.devices) == 12
+    assert set(pool.devices) == {None}  # segments go to whichever device is free
+    assert pool.peak <= 3
+    assert transcript["text"] == "".join(f" s{second}" for second in range(95))
+    # Every slot is given back
+    assert all(transcriber._slots.acquire(blocking=False) for _ in range(3))
+
+
+def test_streaming_matches_in_memory_segmenting():
+    FILES["long.wav"] = seconds_audio(47)
+    transcriber = SegmentedTranscriber(SlowPool(), segment_seconds=10, overlap_seconds=2, min_split_seconds=15)
+    assert transcriber.transcribe("long.wav") == transcriber.transcribe_audio(FILES["long.wav"])
@@ -0,0 +1,33 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+from src.postprocess_benchmark import legacy_postprocess, make_chunks, numeric_postprocess
+from src.subtitle_postprocess import postprocess
+
+
+def chunk(start, end, text):
+    return {'timestamp': (start, end), 'text': text}
+
+
+def test_overlapping_start_moves_past_the_previous_end():
+    timeline = postprocess([chunk(0.0, 2.0, "one"), chunk(1.5, 3.0, "two"), chunk(3.0, 4.0, "three")])
+    assert list(timeline.starts) == [0, 2001, 3001]
+    assert list(timeline.ends) == [2000, 3000, 4000]
+
+
+def test_entry_inside_the_previous_one_keeps_its_end():
+    timeline = postprocess([chunk(0.0, 5.0, "a long line"), chunk(1.0, 2.0, "short"), chunk(6.0, 7.0, "after")])
+    assert list(timeline.starts) == [0, 5001, 6000]
+    # The server never moved ends, and the next entry is still measured from the original one
+    assert list(timeline.ends) == [5000, 2000, 7000]
+
+
+def test_output_matches_the_legacy_post_processing():
+    chunks = make_chunks(2000, seed=3)
+    assert numeric_postprocess([dict(c) for c in chunks]) == legacy_postprocess([dict(c) for c in chunks])
@@ -0,0 +1,59 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import io
+import json
+
+import pytest
+
+from src.subtitles import _JsonStream, iter_chunks
+
+
+CHUNKS = [
+    {'timestamp': [0.0, 1.5], 'text': " Hello, \"world\"."},
+    {'timestamp': [1.5, None], 'text': " Back\\slash, tab\\t and café — \U0001f600"},
+    {'timestamp': [2, 3.25e1], 'text': "", 'words': [{'word': "x", 'score': 0.5}]},
+]
+
+
+def transcript(tmp_path, document):
+    path = tmp_path / "talk.json"
+    path.write_text(json.dumps(document, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 7, 64, 64 * 1024])
+@pytest.mark.parametrize("document", [
+    {'text': "".join(chunk['text'] for chunk in CHUNKS) * 50, 'chunks': CHUNKS},
+    {'chunks': CHUNKS, 'text': "ends with a backslash \\", 'speakers': [], 'meta': {'nested': [{"a": "}]\\\""}, 1, None, True]}},
+    {'count': 3, 'chunks': CHUNKS, 'ratio': -0.125, 'done': False},
+    {'text': "", 'chunks': []},
+])
+def test_chunks_match_json_load(tmp_path, document, block_size):
+    path = transcript(tmp_path, document)
+    with open(path, encoding='utf-8') as file:
+        expected = json.load(file)['chunks']
+    assert list(iter_chunks(path, block_size)) == expected
+
+
+def test_skipped_text_is_not_held_in_memory():
+    block_size = 1024
+    text = "so it goes \\\"on\\\" and on " * 40000
+    stream = _JsonStream(io.StringIO(f'"{text}", "next"'), block_size)
+    stream.skip()
+    assert len(stream.buffer) <= 2 * block_size
+    stream.expect(',')
+    assert stream.value() == "next"
+
+
+def test_truncated_transcript_is_an_error(tmp_path):
+    path = tmp_path / "talk.json"
+    path.write_text('{"text": "cut off here', encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_chunks(str(path), 4))
@@ -0,0 +1,152 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+from src import transcript_cache
+from src.audio_decode import SAMPLE_RATE
+from src.media_probe import file_fingerprint
+from src.transcript_cache import CachingTranscriber, TranscriptCache
+from src.window_batcher import CrossFileBatcher
+from tests.test_window_batcher import WordPool, audio_with_words
+
+
+class FakeDecoder:
+    """
+    Stands in for `StreamingDecoder` without ffmpeg: a "container" is one header line followed by raw float32 samples.
+    """
+    opened = []
+
+    def __init__(self, source, block_seconds=30, **kwargs):
+        self.source = source
+        self.block_samples = int(block_seconds * SAMPLE_RATE)
+        FakeDecoder.opened.append(source)
+
+    def __iter__(self):
+        if isinstance(self.source, str):
+            with open(self.source, 'rb') as file:
+                data = file.read()
+        else:
+            data = b"".join(self.source)
+        audio = np.frombuffer(data[data.index(b"\n") + 1:], np.float32)
+        for start in range(0, len(audio), self.block_samples):
+            yield audio[start:start + self.block_samples]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class FilePool(WordPool):
+    """
+    A `WordPool` that also transcribes whole files, like a backend that reads the file itself.
+    """
+    backend_options = {}
+
+    def __init__(self):
+        super().__init__()
+        self.files = []
+
+    def submit(self, file_path, output_path=None, task="transcribe", language="en"):
+        self.files.append(file_path)
+        future = concurrent.futures.Future()
+        future.set_result({"speakers": [], "chunks": [], "text": f" {len(self.files)}"})
+        return future
+
+
+@pytest.fixture(autouse=True)
+def fake_decoder(monkeypatch):
+    FakeDecoder.opened = []
+    monkeypatch.setattr(transcript_cache, "StreamingDecoder", FakeDecoder)
+
+
+def write_media(path, header, audio):
+    with open(path, 'wb') as file:
+        file.write(header + b"\n" + audio.tobytes())
+    return str(path)
+
+
+AUDIO = audio_with_words(70, [(10, 10.5, 0.1), (40, 41, 0.2)])
+
+
+def test_miss_streams_into_the_batcher_and_a_repeat_skips_the_decode(tmp_path):
+    pool = FilePool()
+    path = write_media(tmp_path / "a.mp4", b"mp4", AUDIO)
+    with CrossFileBatcher(pool, batch_size=4, linger_seconds=0.01) as batcher:
+        caching = CachingTranscriber(TranscriptCache(str(tmp_path / "cache")), pool, batcher)
+        prepared = caching.prepare(path)
+        assert prepared['future'] is not None and not prepared['needs_file']
+        first = caching.complete(prepared)
+        assert caching.transcribe(path) == first
+    assert first["text"] == " word10 word20"
+    assert FakeDecoder.opened == [path]
+    assert (caching.hits, caching.misses) == (1, 1)
+
+
+def test_same_audio_in_another_container_hits_and_cancels_its_windows(tmp_path):
+    pool = FilePool()
+    first_path = write_media(tmp_path / "a.mp4", b"mp4", AUDIO)
+    second_path = write_media(tmp_path / "b.mkv", b"mkv", AUDIO)
+    with CrossFileBatcher(pool, batch_size=8, linger_seconds=60) as batcher:
+        caching = CachingTranscriber(TranscriptCache(str(tmp_path / "cache")), pool, batcher)
+        prepared = caching.prepare(first_path)
+        batcher.flush()
+        first = caching.complete(prepared)
+        batches = len(pool.batches)
+        prepared = caching.prepare(second_path)
+        assert prepared['transcript'] == first and prepared['future'] is None
+    # The second file's windows were still waiting for a batch when the hit was found
+    assert len(pool.batches) == batches
+    assert (caching.hits, caching.misses) == (1, 1)
+
+
+def test_streamed_bytes_are_decoded_as_they_arrive(tmp_path):
+    pool = FilePool()
+    path = write_media(tmp_path / "a.mp4", b"mp4", AUDIO)
+    with open(path, 'rb') as file:
+        data = file.read()
+    with CrossFileBatcher(pool, batch_size=4, linger_seconds=0.01) as batcher:
+        caching = CachingTranscriber(TranscriptCache(str(tmp_path / "cache")), pool, batcher)
+        transcript = caching.transcribe(path, stream=iter([data[:1000], data[1000:]]))
+        assert caching.transcribe(path) == transcript
+    assert transcript["text"] == " word10 word20"
+    assert caching.hits == 1
+
+
+def test_file_backend_is_keyed_on_the_raw_file_without_decoding(tmp_path):
+    pool = FilePool()
+    path = write_media(tmp_path / "a.mp4", b"mp4", AUDIO)
+    caching = CachingTranscriber(TranscriptCache(str(tmp_path / "cache")), pool)
+    prepared = caching.prepare(path)
+    assert prepared['needs_file']
+    first = caching.complete(prepared)
+    assert caching.transcribe(path) == first
+    assert caching.transcribe(path, use_cache=False) != first
+    assert FakeDecoder.opened == []
+    assert pool.files == [path, path]
+
+
+def test_streamed_file_is_aliased_with_the_download_hash(tmp_path):
+    pool = FilePool()
+    path = write_media(tmp_path / "a.mp4", b"mp4", AUDIO)
+    with open(path, 'rb') as file:
+        data = file.read()
+    with CrossFileBatcher(pool, batch_size=4, linger_seconds=0.01) as batcher:
+        caching = CachingTranscriber(TranscriptCache(str(tmp_path / "cache")), pool, batcher)
+        prepared = caching.prepare(path, stream=iter([data]))
+        transcript = caching.complete(prepared)
+        caching.add_source(prepared, file_fingerprint(path))
+        assert caching.transcribe(path) == transcript
+    # The repeat was served through the alias, without a second decode
+    assert len(FakeDecoder.opened) == 1
@@ -0,0 +1,111 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import os
+
+import pytest
+
+from src import url_cache
+from src.url_cache import ResultCache, canonical_url, result_key
+
+
+class Clock:
+    """
+    Stands in for the `time` module with a clock the test moves by hand.
+    """
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(url_cache, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "youtube.com/watch?v=dQw4w9WgXcQ&t=42s",
+    "https://youtu.be/dQw4w9WgXcQ?si=abc",
+    "https://m.youtube.com/watch?list=PL123&v=dQw4w9WgXcQ&index=3",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ",
+    "  https://www.youtube.com/live/dQw4w9WgXcQ/  ",
+])
+def test_youtube_spellings_share_one_key(url):
+    assert canonical_url(url) == "youtube:dQw4w9WgXcQ"
+
+
+def test_other_urls_drop_tracking_and_sort_the_query():
+    assert canonical_url("http://www.Example.com/talk/?b=2&utm_source=x&a=1#intro") == "url:example.com/talk?a=1&b=2"
+    assert canonical_url("https://example.com/talk?id=1") != canonical_url("https://example.com/talk?id=2")
+
+
+def test_invalid_youtube_id_is_not_a_youtube_key():
+    assert canonical_url("https://youtube.com/watch?v=short").startswith("url:")
+
+
+def test_result_key_separates_options():
+    url = "https://youtu.be/dQw4w9WgXcQ"
+    assert result_key(url, enhance_input=True) != result_key(url, enhance_input=False)
+    assert result_key(url, a=1, b=2) == result_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ", b=2, a=1)
+
+
+def write(path, size):
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_entry_expires_after_its_ttl(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), ttl_seconds=60)
+    srt = write(tmp_path / "a.srt", 10)
+    cache.put("k", "url", [srt], [srt])
+    clock.now += 59
+    assert cache.get("k") == [srt]
+    clock.now += 2
+    assert cache.get("k") is None
+    assert os.path.exists(srt)  # expiry on lookup forgets the entry, the collector owns the file
+
+
+def test_changed_or_missing_file_invalidates_the_entry(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"))
+    first, second = write(tmp_path / "a.srt", 10), write(tmp_path / "b.srt", 10)
+    cache.put("changed", "url", "a", [first])
+    cache.put("missing", "url", "b", [second])
+    write(tmp_path / "a.srt", 11)
+    os.remove(second)
+    assert cache.get("changed") is None
+    assert cache.get("missing") is None
+
+
+def test_eviction_drops_least_recently_used_but_keeps_shared_files(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), max_bytes=250)
+    shared = write(tmp_path / "shared.json", 100)
+    old, new = write(tmp_path / "old.srt", 100), write(tmp_path / "new.srt", 100)
+    cache.put("old", "url", "old", [shared, old])
+    clock.now += 1
+    cache.put("new", "url", "new", [shared, new])
+    assert cache.evict() == 1
+    assert cache.get("old") is None and cache.get("new") == "new"
+    assert not os.path.exists(old)
+    assert os.path.exists(shared) and os.path.exists(new)
+
+
+def test_eviction_tolerates_files_removed_meanwhile(tmp_path, clock, monkeypatch):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), ttl_seconds=10)
+    srt = write(tmp_path / "a.srt", 10)
+    cache.put("k", "url", "a", [srt])
+    clock.now += 11
+    # The lifecycle collector deletes the file between the unchanged check and the removal
+    monkeypatch.setattr(url_cache, "_unchanged", lambda *file: os.remove(srt) or True)
+    assert cache.evict() == 1
@@ -0,0 +1,73 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import numpy as np
+import pytest
+
+from src import vad
+from src.vad import SAMPLE_RATE, SpeechTimeline, strip_silence
+
+
+# At 10 samples a second, sample counts read as tenths of a second. Speech runs 1-3 s, 5-7 s and
+# 10-11 s of the original, which is 0-2 s, 2-4 s and 4-5 s of the compacted audio
+REGIONS = [(10, 30), (50, 70), (100, 110)]
+
+
+@pytest.fixture
+def timeline():
+    return SpeechTimeline(REGIONS, 120, sample_rate=10)
+
+
+@pytest.mark.parametrize("seconds, original", [(0.0, 1.0), (0.5, 1.5), (2.5, 5.5), (4.5, 10.5)])
+def test_time_inside_a_region_is_shifted_by_the_silence_before_it(timeline, seconds, original):
+    assert timeline.to_original(seconds) == original
+    assert timeline.to_original(seconds, is_end=True) == original
+
+
+@pytest.mark.parametrize("seconds, start, end", [(2.0, 5.0, 3.0), (4.0, 10.0, 7.0)])
+def test_time_on_a_join_maps_to_either_side_of_the_removed_gap(timeline, seconds, start, end):
+    assert timeline.to_original(seconds) == start
+    assert timeline.to_original(seconds, is_end=True) == end
+
+
+def test_time_past_the_speech_is_held_at_the_end_of_the_last_region(timeline):
+    assert timeline.to_original(6.0, is_end=True) == 11.0
+
+
+def test_missing_times_and_empty_timelines_are_left_alone(timeline):
+    assert timeline.to_original(None) is None
+    assert SpeechTimeline([], 120, sample_rate=10).to_original(1.5) == 1.5
+
+
+def test_chunk_spanning_a_removed_gap_keeps_the_gap_inside_it(timeline):
+    chunks = [
+        {'timestamp': [0.0, 2.0], 'text': "first"},
+        {'timestamp': [1.5, 2.5], 'text': "across", 'speaker': 1},
+        {'timestamp': [2.5, None], 'text': "open"},
+    ]
+    remapped = timeline.remap_chunks(chunks)
+    assert [chunk['timestamp'] for chunk in remapped] == [[1.0, 3.0], [2.5, 5.5], [5.5, None]]
+    assert remapped[1]['speaker'] == 1
+    assert chunks[1]['timestamp'] == [1.5, 2.5]
+
+
+def test_stripped_tones_map_back_to_where_they_were(monkeypatch):
+    monkeypatch.setattr(vad, "webrtcvad", None)
+    audio = np.random.default_rng(0).normal(0, 1e-4, 6 * SAMPLE_RATE).astype(np.float32)
+    # Tones on 30 ms frame boundaries: 2.1-3.0 s and 4.2-5.1 s
+    tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(int(0.9 * SAMPLE_RATE)) / SAMPLE_RATE)
+    for start in (2.1, 4.2):
+        audio[int(start * SAMPLE_RATE):int(start * SAMPLE_RATE) + len(tone)] += tone
+
+    compact, timeline = strip_silence(audio, padding=0.2)
+    assert timeline.regions == [(int(1.9 * SAMPLE_RATE), int(3.2 * SAMPLE_RATE)), (int(4.0 * SAMPLE_RATE), int(5.3 * SAMPLE_RATE))]
+    assert len(compact) == timeline.speech_samples == int(2.6 * SAMPLE_RATE)
+    assert timeline.to_original(1.3) == 4.0
+    assert timeline.to_original(1.3, is_end=True) == 3.2
+    assert timeline.report()['skipped_seconds'] == 3.4
@@ -0,0 +1,109 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import concurrent.futures
+
+import numpy as np
+
+from src.audio_decode import SAMPLE_RATE
+from src.segmenter import overlapping_windows, stitch_segments
+from src.window_batcher import CrossFileBatcher
+
+
+class WordPool:
+    """
+    Stands in for a pool: every burst of non-zero samples in a window is one "word", named after its amplitude.
+
+    Like Whisper, a word cut off by either edge of the window is not recognised.
+    """
+    def __init__(self):
+        self.batches = []
+
+    def submit_windows(self, windows, task="transcribe", language="en"):
+        self.batches.append(len(windows))
+        future = concurrent.futures.Future()
+        future.set_result([self._words(window) for window in windows])
+        return future
+
+    @staticmethod
+    def _words(window):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], (window != 0).astype(np.int8), [0]))))
+        chunks = []
+        for start, end in zip(edges[::2], edges[1::2]):
+            if start == 0 or end == len(window):
+                continue
+            chunks.append({"timestamp": [round(start / SAMPLE_RATE, 2), round(end / SAMPLE_RATE, 2)], "text": f" word{int(round(window[start] * 100))}"})
+        return chunks
+
+
+def audio_with_words(seconds, words):
+    audio = np.zeros(int(seconds * SAMPLE_RATE), np.float32)
+    for start, end, amplitude in words:
+        audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = amplitude
+    return audio
+
+
+def transcribe(audio, blocks=1):
+    pool = WordPool()
+    with CrossFileBatcher(pool, batch_size=4, linger_seconds=0.01) as batcher:
+        return batcher.add_windows("test", np.array_split(audio, blocks)).result(timeout=5)
+
+
+def test_windows_overlap_and_cover_the_audio():
+    audio = np.arange(70, dtype=np.float32)
+    windows = list(overlapping_windows(np.array_split(audio, 7), 30, 5))
+    assert [start for start, _ in windows] == [0, 25, 50]
+    assert [len(window) for _, window in windows] == [30, 30, 20]
+    for start, window in windows:
+        assert np.array_equal(window, audio[start:start + len(window)])
+
+
+def test_last_window_is_not_repeated_when_the_audio_ends_on_a_window():
+    windows = list(overlapping_windows([np.ones(55, np.float32)], 30, 5))
+    assert [(start, len(window)) for start, window in windows] == [(0, 30), (25, 30)]
+
+
+def test_word_on_a_window_boundary_is_kept_once():
+    # 29.6-30.4 s straddles where a hard 30 s cut would split it
+    audio = audio_with_words(70, [(10, 10.5, 0.1), (29.6, 30.4, 0.2), (50.2, 50.9, 0.3), (65, 65.5, 0.4)])
+    transcript = transcribe(audio, blocks=5)
+    assert transcript["text"] == " word10 word20 word30 word40"
+    assert [chunk["timestamp"] for chunk in transcript["chunks"]] == [[10.0, 10.5], [29.6, 30.4], [50.2, 50.9], [65.0, 65.5]]
+
+
+def test_word_inside_an_overlap_is_kept_once():
+    # Heard whole by both the first and the second window
+    audio = audio_with_words(40, [(26, 27, 0.5), (28.5, 29, 0.6)])
+    assert transcribe(audio)["text"] == " word50 word60"
+
+
+def test_stitching_matches_block_size():
+    audio = audio_with_words(95, [(5, 6, 0.1), (24.9, 25.3, 0.2), (49.8, 50.4, 0.3), (74.7, 75.6, 0.4), (90, 91, 0.5)])
+    assert transcribe(audio, blocks=1) == transcribe(audio, blocks=13)
+
+
+def test_stitch_segments_drops_a_chunk_transcribed_twice():
+    first = {"chunks": [{"timestamp": [20.0, 28.0], "text": " the same sentence here"}]}
+    second = {"chunks": [{"timestamp": [1.0, 3.0], "text": " the same sentence here"}, {"timestamp": [6.0, 7.0], "text": " next"}]}
+    stitched = stitch_segments([(0.0, 30.0, first), (25.0, 30.0, second)])
+    assert stitched["text"] == " the same sentence here next"
+
+
+def test_cancel_drops_the_windows_still_waiting():
+    pool = WordPool()
+    with CrossFileBatcher(pool, batch_size=8, linger_seconds=60) as batcher:
+        future = batcher.add_windows("test", [audio_with_words(70, [(10, 11, 0.1)])])
+        assert batcher.cancel(future)
+        assert not batcher.cancel(future)
+        try:
+            future.result(timeout=5)
+            assert False, "a cancelled file must not resolve"
+        except concurrent.futures.CancelledError:
+            pass
+    assert pool.batches == []
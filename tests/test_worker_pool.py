@@ -0,0 +1,95 @@
+#-------------------------------------------------------------------#
+# BatchLMT2 - LOCAL                                                 #
+#-------------------------------------------------------------------#
+# Author: TTESSERACTT                                               #
+# License: Apache License                                           #
+# Version: 1.0.1                                                    #
+#-------------------------------------------------------------------#
+
+
+import time
+
+import pytest
+
+from src.fast_multi_batch import warm_workers_per_device
+from src.gpu_telemetry import GpuTelemetry, SyntheticProvider
+from src.transcription_backends import StubBackend
+from src.worker_pool import TranscriptionJob, TranscriptionPool
+
+GB = 1024**3
+
+
+class DeviceJob(TranscriptionJob):
+    # Reports which worker ran it instead of transcribing
+    def run(self, backend):
+        return backend.device_id, id(backend)
+
+
+def test_models_load_once_and_are_reused():
+    with TranscriptionPool("stub", device_ids=[0, 1], workers_per_device=1) as pool:
+        transcripts = [pool.submit(f"file{i}.mp4").result(timeout=5) for i in range(20)]
+    assert len(transcripts) == 20
+    assert len(pool.backends) == 2
+    assert all(backend.load_count == 1 for backend in pool.backends)
+    assert sum(backend.jobs_done for backend in pool.backends) == 20
+
+
+def test_jobs_pinned_to_a_device_run_there():
+    with TranscriptionPool("stub", device_ids=[0, 1, 2], workers_per_device=2) as pool:
+        for device_id in (0, 1, 2):
+            results = [pool.submit_job(DeviceJob("x"), device_id=device_id).result(timeout=5) for _ in range(6)]
+            assert {result[0] for result in results} == {device_id}
+
+
+def test_unpinned_jobs_use_every_device():
+    with TranscriptionPool("stub", device_ids=[0, 1], workers_per_device=1, delay=0.02) as pool:
+        futures = [pool.submit_job(DeviceJob("x")) for _ in range(8)]
+        devices = [future.result(timeout=5)[0] for future in futures]
+    # Both workers pull from the shared queue; the split depends on timing
+    assert set(devices) == {0, 1}
+
+
+def test_submit_after_shutdown_fails():
+    pool = TranscriptionPool("stub").start()
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.submit("file.mp4")
+
+
+@pytest.mark.parametrize("free_gb, expected", [((24, 24), 2), ((80, 12), 1), ((8, 8), 1), ((200, 200), 7)])
+def test_warm_workers_fit_the_tightest_device(free_gb, expected):
+    telemetry = GpuTelemetry(SyntheticProvider([(total * GB, total * GB, 0) for total in free_gb]))
+    assert warm_workers_per_device(telemetry, [0, 1]) == expected
+
+
+def broken_device(broken_id, delay=0.0):
+    load = StubBackend.load
+
+    def load_or_fail(backend):
+        time.sleep(delay)
+        if backend.device_id == broken_id:
+            raise RuntimeError("out of memory")
+        load(backend)
+    return load_or_fail
+
+
+def test_jobs_avoid_a_device_whose_workers_failed(monkeypatch):
+    monkeypatch.setattr(StubBackend, "load", broken_device(1))
+    with TranscriptionPool("stub", device_ids=[0, 1], workers_per_device=2) as pool:
+        # Let device 1's workers give up first
+        deadline = time.time() + 5
+        while pool._alive[1] and time.time() < deadline:
+            time.sleep(0.01)
+        results = [pool.submit_job(DeviceJob("x")).result(timeout=5) for _ in range(6)]
+        assert {device_id for device_id, _ in results} == {0}
+        with pytest.raises(RuntimeError):
+            pool.submit_job(DeviceJob("x"), device_id=1)
+
+
+def test_jobs_queued_on_a_device_fail_when_its_last_worker_exits(monkeypatch):
+    monkeypatch.setattr(StubBackend, "load", broken_device(1, delay=0.1))
+    with TranscriptionPool("stub", device_ids=[0, 1], workers_per_device=1) as pool:
+        future = pool.submit_job(DeviceJob("x"), device_id=1)
+        with pytest.raises(RuntimeError, match="device 1"):
+            future.result(timeout=5)
+        assert pool.submit_job(DeviceJob("x")).result(timeout=5)[0] == 0